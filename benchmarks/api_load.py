@@ -0,0 +1,119 @@
+# Run from the repository root: python -m benchmarks.api_load
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+
+from coffeeshop.inventory import STORE_INVENTORY_DEFAULTS
+
+ORDER = json.dumps({"customer_name": "Kiosk", "store": "KLCC", "lines": [
+    {"coffee_type": "Latte", "size": "medium", "add_ons": ["Extra milk"], "quantity": 2},
+    {"coffee_type": "Americano", "size": "small"}
+]}).encode()
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+# The API process: a shop with stock that will not run out during the test, pinned
+# to one core where the OS allows it
+def serve(db_path, port, cpu):
+    import uvicorn
+
+    from coffeeshop import api, core
+
+    if cpu is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {cpu})
+    stock = {store: {item: 10 ** 9 for item in levels} for store, levels in STORE_INVENTORY_DEFAULTS.items()}
+    shop = core.Shop(db_path, stock)
+    try:
+        uvicorn.run(api.create_app(shop), host='127.0.0.1', port=port, log_level='warning')
+    finally:
+        shop.close()
+
+
+async def call(reader, writer, method, path, body=b''):
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = next(int(line.split(b':', 1)[1]) for line in head.split(b'\r\n') if line.lower().startswith(b'content-length:'))
+    return status, await reader.readexactly(length)
+
+
+async def wait_until_up(port, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            status, _ = await call(reader, writer, 'GET', '/menu')
+            writer.close()
+            if status == 200:
+                return
+        except OSError:
+            pass
+        if time.perf_counter() > deadline:
+            raise RuntimeError(f"The API did not come up on port {port}")
+        await asyncio.sleep(0.2)
+
+
+# One terminal on a keep-alive connection: place an order, mark it ready, hand it over
+async def terminal(port, stop, latencies, errors):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    while time.perf_counter() < stop:
+        start = time.perf_counter()
+        status, body = await call(reader, writer, 'POST', '/orders', ORDER)
+        if status != 201:
+            errors.append(status)
+            continue
+        number = json.loads(body)['order_number']
+        for step in ('ready', 'picked-up'):
+            status, _ = await call(reader, writer, 'POST', f'/orders/{number}/{step}')
+            if status != 200:
+                errors.append(status)
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+async def load(port, terminals, seconds):
+    await wait_until_up(port)
+    latencies, errors = [], []
+    stop = time.perf_counter() + seconds
+    await asyncio.gather(*(terminal(port, stop, latencies, errors) for _ in range(terminals)))
+    return sorted(latencies), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sustained orders per second through the order API")
+    parser.add_argument('--terminals', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--server-cpu', type=int, default=0, help="core to pin the API process to; -1 to leave it free")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        port = free_port()
+        server = multiprocessing.get_context('spawn').Process(
+            target=serve, args=(os.path.join(directory, 'coffee_shop.db'), port, None if args.server_cpu < 0 else args.server_cpu))
+        server.start()
+        try:
+            print(f"{'terminals':>9} {'orders':>7} {'orders/s':>9} {'p50 ms':>7} {'p99 ms':>7} {'errors':>6}")
+            for terminals in args.terminals:
+                latencies, errors = asyncio.run(load(port, terminals, args.seconds))
+                p50 = latencies[len(latencies) // 2] * 1e3 if latencies else float('nan')
+                p99 = latencies[int(len(latencies) * 0.99)] * 1e3 if latencies else float('nan')
+                print(f"{terminals:>9} {len(latencies):>7} {len(latencies) / args.seconds:9.0f} {p50:7.1f} {p99:7.1f} {len(errors):>6}")
+        finally:
+            server.terminate()
+            server.join()
+
+
+if __name__ == '__main__':
+    main()
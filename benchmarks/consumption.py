@@ -0,0 +1,87 @@
+# Run from the repository root: python -m benchmarks.consumption
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from coffeeshop import menu
+from coffeeshop.consumption import ConsumptionEngine
+from coffeeshop.ledger import OrderLedger
+from coffeeshop.pricing import SIZES
+
+START = datetime(2026, 1, 1, 7, 0)
+
+
+# A ledger of `size` random order lines, with the DataFrame view sales_report works on
+def random_frame(size, seed=0):
+    rng = np.random.default_rng(seed)
+    ledger = OrderLedger(menu.coffee_menu, SIZES, menu.add_on_prices, capacity=size)
+    coffees = rng.integers(len(ledger.coffee_types), size=size)
+    sizes = rng.integers(len(ledger.sizes), size=size)
+    masks = rng.integers(1 << len(ledger.add_ons), size=size)
+    quantities = rng.integers(1, 4, size=size)
+    add_on_lists = [[name for bit, name in enumerate(ledger.add_ons) if mask & (1 << bit)] for mask in range(1 << len(ledger.add_ons))]
+    for i in range(size):
+        ledger.append(1000 + i % 9000, 'guest', ledger.coffee_types[coffees[i]], int(quantities[i]), ledger.sizes[sizes[i]],
+                      add_on_lists[masks[i]], 5.0, START + timedelta(seconds=i))
+    return ledger.frame()
+
+
+# The per-row loop sales_report used before the engine
+def loop_totals(frame):
+    total_beans_used = 0
+    total_milk_used = 0
+    total_sugar_used = 0
+    total_cups_used = frame['Quantity'].sum()
+    for idx, order in frame.iterrows():
+        size = order['Size']
+        coffee_type = order['Coffee Type']
+        total_beans_used += menu.ingredient_usage[coffee_type][size]['coffee_beans'] * order['Quantity']
+        total_milk_used += menu.ingredient_usage[coffee_type][size]['milk'] * order['Quantity']
+        total_sugar_used += menu.ingredient_usage[coffee_type][size]['sugar'] * order['Quantity']
+        if 'Extra sugar' in order['Add-ons']:
+            total_sugar_used += menu.extra_usage['sugar'] * order['Quantity']
+        if 'Extra milk' in order['Add-ons']:
+            total_milk_used += menu.extra_usage['milk'] * order['Quantity']
+    return {'coffee_beans': total_beans_used, 'milk': total_milk_used, 'sugar': total_sugar_used, 'cups': total_cups_used}
+
+
+def best_of(repeats, run):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized ConsumptionEngine against the old iterrows loop")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--loop-max', type=int, default=1_000_000,
+                        help="skip the iterrows loop above this many rows; it takes about a minute at 1M")
+    args = parser.parse_args()
+
+    engine = ConsumptionEngine(list(menu.coffee_menu), SIZES, list(menu.add_on_prices), menu.ingredient_usage, {
+        'Extra sugar': {'sugar': menu.extra_usage['sugar']},
+        'Extra milk': {'milk': menu.extra_usage['milk']}
+    })
+
+    print(f"{'rows':>10} {'engine ms':>10} {'loop ms':>11} {'speedup':>8}")
+    for size in args.sizes:
+        frame = random_frame(size)
+        engine_s, totals = best_of(5, lambda: engine.frame_totals(frame))
+        if size > args.loop_max:
+            print(f"{size:>10,} {engine_s * 1e3:10.2f} {'-':>11} {'-':>8}")
+            continue
+        loop_s, expected = best_of(1, lambda: loop_totals(frame))
+        for ingredient, amount in expected.items():
+            assert np.isclose(totals[ingredient], amount), (ingredient, totals[ingredient], amount)
+        print(f"{size:>10,} {engine_s * 1e3:10.2f} {loop_s * 1e3:11.0f} {loop_s / engine_s:7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
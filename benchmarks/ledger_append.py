@@ -0,0 +1,64 @@
+# Run from the repository root: python -m benchmarks.ledger_append
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from coffeeshop import menu
+from coffeeshop.ledger import LEDGER_COLUMNS, OrderLedger
+from coffeeshop.pricing import SIZES
+
+START = datetime(2026, 1, 1, 7, 0)
+
+
+def append_line(ledger, i):
+    return ledger.append(1000 + i % 9000, f"guest {i}", 'Latte', 1, 'medium', ['Extra milk'], 5.5,
+                         START + timedelta(seconds=i))
+
+
+# What the app did before the ledger: copy the whole table for every new line
+def concat_line(frame, i):
+    line = pd.DataFrame([[1000 + i % 9000, f"guest {i}", 'Latte', 1, 'medium', 'Extra milk', 5.5,
+                          START + timedelta(seconds=i), 'Being Processed', None]], columns=LEDGER_COLUMNS)
+    return pd.concat([frame, line], ignore_index=True)
+
+
+# Cost of one more order line once the ledger already holds `size` lines.
+# It should stay flat from a thousand orders to a million.
+def ledger_append_us(size, repeats):
+    ledger = OrderLedger(menu.coffee_menu, SIZES, menu.add_on_prices)
+    for i in range(size):
+        append_line(ledger, i)
+    start = time.perf_counter()
+    for i in range(size, size + repeats):
+        append_line(ledger, i)
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def concat_append_us(size, repeats):
+    frame = pd.DataFrame({column: [None] * size for column in LEDGER_COLUMNS})
+    start = time.perf_counter()
+    for i in range(size, size + repeats):
+        frame = concat_line(frame, i)
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time one order-line append at growing ledger sizes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeats', type=int, default=10_000)
+    parser.add_argument('--concat-repeats', type=int, default=50,
+                        help="appends timed with pd.concat for comparison; 0 to skip")
+    args = parser.parse_args()
+
+    print(f"{'lines':>10} {'ledger µs/append':>17} {'pd.concat µs/append':>20}")
+    for size in args.sizes:
+        ledger_us = ledger_append_us(size, args.repeats)
+        concat_us = f"{concat_append_us(size, args.concat_repeats):20.1f}" if args.concat_repeats else f"{'-':>20}"
+        print(f"{size:>10,} {ledger_us:17.2f} {concat_us}")
+
+
+if __name__ == '__main__':
+    main()
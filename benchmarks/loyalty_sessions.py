@@ -0,0 +1,100 @@
+# Run from the repository root: python -m benchmarks.loyalty_sessions
+
+import argparse
+import hashlib
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from coffeeshop import loyalty, migrations
+from coffeeshop.db import ConnectionPool
+
+
+# One simulated customer session doing what the app's signup, login, loyalty
+# and "Loyalty Points" page do, all through the shared connection pool
+def session(pool, username, rounds, timings, errors):
+    password = hashlib.sha256(b'secret').hexdigest()
+    earned = redeemed = 0
+
+    def timed(name, step):
+        start = time.perf_counter()
+        try:
+            result = step()
+        except Exception as error:
+            errors.append(f"{name}: {error!r}")
+            return None
+        timings.setdefault(name, []).append(time.perf_counter() - start)
+        return result
+
+    def signup():
+        conn = pool.connection()
+        with conn:
+            conn.execute("INSERT INTO customers (username, password) VALUES (?, ?)", (username, password))
+
+    def login():
+        return pool.connection().execute("SELECT * FROM customers WHERE username=? AND password=?", (username, password)).fetchone()
+
+    def display():
+        conn = pool.connection()
+        conn.execute("SELECT loyalty_points FROM customers WHERE username=?", (username,)).fetchone()
+        loyalty.compact_summary(conn)
+        loyalty.summary(conn, username)
+        return loyalty.history_page(conn, username)
+
+    timed('signup', signup)
+    if timed('login', login) is None:
+        errors.append(f"login: {username} could not log in")
+    for _ in range(rounds):
+        if timed('credit', lambda: loyalty.credit_points(pool.connection(), username, 10)):
+            earned += 10
+        if timed('redeem', lambda: loyalty.redeem_points(pool.connection(), username, 4)):
+            redeemed += 4
+        timed('display', display)
+    return earned - redeemed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent customer sessions against the SQLite connection pool")
+    parser.add_argument('--sessions', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        pool = ConnectionPool(os.path.join(directory, 'coffee_shop.db'))
+        migrations.migrate(pool.connection())
+
+        timings, errors, balances = {}, [], {}
+        barrier = threading.Barrier(args.sessions)
+
+        def run(i):
+            username = f"customer {i}"
+            barrier.wait()
+            balances[username] = session(pool, username, args.rounds, timings, errors)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(args.sessions)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        # Every balance must be exactly what its session credited minus what it redeemed
+        stored = dict(pool.connection().execute("SELECT username, loyalty_points FROM customers").fetchall())
+        wrong = [username for username, balance in balances.items() if stored.get(username) != balance]
+
+    operations = sum(len(samples) for samples in timings.values())
+    print(f"{args.sessions} sessions, {operations} operations in {elapsed:.2f} s ({operations / elapsed:,.0f}/s)")
+    print(f"{'operation':>10} {'count':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, samples in timings.items():
+        samples.sort()
+        print(f"{name:>10} {len(samples):>7} {statistics.median(samples) * 1e3:8.2f} {samples[int(len(samples) * 0.99)] * 1e3:8.2f}")
+    print(f"errors: {len(errors)}, wrong balances: {len(wrong)}")
+    for error in errors[:10]:
+        print(f"  {error}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# Run from the repository root: python -m benchmarks.order_numbers
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from coffeeshop import migrations, order_numbers
+from coffeeshop.db import connect
+
+TOTAL = order_numbers.LAST_NUMBER - order_numbers.FIRST_NUMBER + 1
+
+
+# The rejection sampling generate_unique_order_number used before the pool;
+# returns None where it would have looped forever
+def sample_number(in_use, max_tries=10_000_000):
+    for _ in range(max_tries):
+        number = random.randint(order_numbers.FIRST_NUMBER, order_numbers.LAST_NUMBER)
+        if number not in in_use:
+            return number
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Order-number allocation cost as the shop fills up")
+    parser.add_argument('--occupancy', type=int, nargs='+', default=[0, 4500, 8000, 8990, TOTAL - 1],
+                        help="order numbers already in use when timing starts")
+    parser.add_argument('--repeats', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        conn = connect(os.path.join(directory, 'coffee_shop.db'))
+        migrations.migrate(conn)
+        in_use = set()
+
+        print(f"{'in use':>7} {'pool µs/issue+release':>22} {'sampling µs/issue':>18}")
+        for occupancy in sorted(args.occupancy):
+            while len(in_use) < occupancy:
+                in_use.add(order_numbers.allocate(conn))
+
+            # Issue a number and give it back, as a picked-up order does
+            start = time.perf_counter()
+            for _ in range(args.repeats):
+                order_numbers.release(conn, order_numbers.allocate(conn))
+            pool_us = (time.perf_counter() - start) / args.repeats * 1e6
+
+            start = time.perf_counter()
+            for _ in range(args.repeats):
+                sample_number(in_use)
+            sampling_us = (time.perf_counter() - start) / args.repeats * 1e6
+            print(f"{occupancy:>7} {pool_us:22.1f} {sampling_us:18.1f}")
+
+        # Every number taken: the pool says so at once, the old loop never returned
+        while len(in_use) < TOTAL:
+            in_use.add(order_numbers.allocate(conn))
+        start = time.perf_counter()
+        try:
+            order_numbers.allocate(conn)
+        except order_numbers.OrderNumbersExhausted as error:
+            print(f"{TOTAL:>7} {(time.perf_counter() - start) * 1e6:22.1f} {'never returns':>18}   ({error})")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# Run from the repository root: python -m benchmarks.startup
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'coffeeshopgroupupdate.py')
+MODULES = ['streamlit', 'pandas', 'matplotlib.pyplot', 'coffeeshop.core', 'coffeeshop.api']
+# Modules only the admin report pages should pull in
+LAZY_MODULES = ['pandas', 'matplotlib.pyplot']
+
+
+# Cumulative import time of `module` in a fresh interpreter, from `python -X importtime`.
+# Each line of its report is "import time: self [us] | cumulative | imported package".
+def import_time_ms(module):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True, cwd=os.path.dirname(APP))
+    for line in reversed(result.stderr.splitlines()):
+        _, _, fields = line.partition('import time:')
+        parts = [part.strip() for part in fields.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1e3
+    raise RuntimeError(f"-X importtime did not report {module}")
+
+
+def rerun_ms(app, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        app.run()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e3
+
+
+# Cold start and reruns of the app itself, on a scratch database in a scratch directory
+def app_timings(repeats):
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_ms = (time.perf_counter() - start) * 1e3
+
+    already_loaded = set(sys.modules)
+    app = AppTest.from_file(APP, default_timeout=120)
+    start = time.perf_counter()
+    app.run()
+    rows = [('streamlit import', streamlit_ms), ('first run (login page)', (time.perf_counter() - start) * 1e3),
+            ('rerun, login page', rerun_ms(app, repeats))]
+    loaded = [module for module in LAZY_MODULES if module in sys.modules and module not in already_loaded]
+    errors = len(app.exception)
+
+    app.session_state['user'] = 'bench'
+    app.session_state['is_admin'] = False
+    app.run()
+    rows.append(('rerun, customer menu', rerun_ms(app, repeats)))
+    app.session_state['is_admin'] = True
+    app.run()
+    rows.append(('rerun, admin page', rerun_ms(app, repeats)))
+    return rows, loaded, errors + len(app.exception)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time of the app's dependencies and app start/rerun time")
+    parser.add_argument('--modules', nargs='+', default=MODULES)
+    parser.add_argument('--repeats', type=int, default=20, help="reruns timed per page")
+    parser.add_argument('--no-app', action='store_true', help="only measure imports")
+    args = parser.parse_args()
+
+    print(f"{'module':>24} {'import ms':>10}")
+    for module in args.modules:
+        print(f"{module:>24} {import_time_ms(module):10.0f}")
+    if args.no_app:
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        rows, loaded, errors = app_timings(args.repeats)
+    print()
+    for name, ms in rows:
+        print(f"{name:>24} {ms:10.1f} ms")
+    print(f"loaded by the login page: {', '.join(loaded) or 'none of ' + ', '.join(LAZY_MODULES)}; app exceptions: {errors}")
+
+
+if __name__ == '__main__':
+    main()
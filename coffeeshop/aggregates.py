@@ -0,0 +1,174 @@
+import threading
+from datetime import date
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+_EPOCH = date(1970, 1, 1)
+
+
+# Bucket keys: days and months since 1970-01-01 on the ledger's wall-clock epoch
+def day_key(moment):
+    return (moment - _EPOCH).days
+
+
+def month_key(moment):
+    return (moment.year - 1970) * 12 + moment.month - 1
+
+
+# Which ledger rows have been folded in already, so record() is safe to call twice for a row.
+#
+# Sessions and API threads append ledger rows concurrently and record them in
+# whatever order they finish, so a row can arrive after a later one. Rows are
+# tracked as a contiguous prefix [0, next_row) plus the set of rows recorded
+# ahead of it; the set only holds rows whose predecessors are still in flight.
+class RecordedRows:
+    def __init__(self, next_row=0):
+        self.next_row = next_row
+        self._ahead = set()
+
+    # Mark `row` as recorded; False if it already was. Callers hold their own lock.
+    def add(self, row):
+        if row < self.next_row or row in self._ahead:
+            return False
+        self._ahead.add(row)
+        while self.next_row in self._ahead:
+            self._ahead.remove(self.next_row)
+            self.next_row += 1
+        return True
+
+    def __contains__(self, row):
+        return row < self.next_row or row in self._ahead
+
+    def __len__(self):
+        return self.next_row + len(self._ahead)
+
+
+# Totals for one day or one month
+class Bucket:
+    def __init__(self, n_coffee_types, n_ingredients):
+        self.revenue = 0.0
+        self.lines = 0
+        self.quantity = np.zeros(n_coffee_types)
+        self.ingredients = np.zeros(n_ingredients)
+
+    def add(self, other):
+        self.revenue += other.revenue
+        self.lines += other.lines
+        self.quantity += other.quantity
+        self.ingredients += other.ingredients
+
+    def matches(self, other):
+        return (self.lines == other.lines and np.isclose(self.revenue, other.revenue)
+                and np.allclose(self.quantity, other.quantity) and np.allclose(self.ingredients, other.ingredients))
+
+
+# Running sales totals per day and per month.
+#
+# Each order line is folded in once when it is committed, so the sales report
+# and analytics dashboard read a handful of buckets instead of re-filtering and
+# re-grouping every order ever placed. Lines priced at RM0.00 are left out of
+# the buckets, matching how the sales report has always treated them; the
+# all-time totals still count every line.
+class SalesAggregates:
+    def __init__(self, engine):
+        self.engine = engine
+        self.days = {}
+        self.months = {}
+        self.total_revenue = 0.0
+        self.total_lines = 0
+        self.recorded = RecordedRows()
+        self._lock = threading.Lock()
+
+    def _bucket(self, buckets, key):
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = Bucket(len(self.engine.coffee_types), len(self.engine.ingredients))
+        return bucket
+
+    # Fold one committed ledger row into the totals
+    def record(self, ledger, row):
+        line = ledger.codes(row, row + 1)
+        price = float(line['price'][0])
+        with self._lock:
+            if not self.recorded.add(row):
+                return
+            self.total_revenue += price
+            self.total_lines += 1
+            if price <= 0:
+                return
+            coffee = int(line['coffee'][0])
+            quantity = int(line['quantity'][0])
+            usage = self.engine.usage[self.engine.combination(line['coffee'], line['size'], line['add_ons'])[0]] * quantity
+            day = int(line['time'][0]) // SECONDS_PER_DAY
+            month = int(np.datetime64(int(line['time'][0]), 's').astype('datetime64[M]').astype(np.int64))
+            for bucket in (self._bucket(self.days, day), self._bucket(self.months, month)):
+                bucket.revenue += price
+                bucket.lines += 1
+                bucket.quantity[coffee] += quantity
+                bucket.ingredients += usage
+
+    # Build the totals from scratch with one vectorized pass over the ledger
+    @classmethod
+    def from_ledger(cls, ledger, engine):
+        aggregates = cls(engine)
+        columns = ledger.codes()
+        aggregates.total_revenue = float(columns['price'].sum())
+        aggregates.total_lines = len(columns['price'])
+        aggregates.recorded = RecordedRows(len(columns['price']))
+
+        paid = columns['price'] > 0
+        price = columns['price'][paid]
+        coffee = columns['coffee'][paid].astype(np.int64)
+        quantity = columns['quantity'][paid].astype(np.float64)
+        times = columns['time'][paid]
+        usage = engine.usage[engine.combination(coffee, columns['size'][paid], columns['add_ons'][paid])] * quantity[:, None]
+
+        n_coffee = len(engine.coffee_types)
+        day_keys = times // SECONDS_PER_DAY
+        month_keys = times.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+        for keys, buckets in ((day_keys, aggregates.days), (month_keys, aggregates.months)):
+            unique_keys, index = np.unique(keys, return_inverse=True)
+            n = len(unique_keys)
+            revenue = np.bincount(index, weights=price, minlength=n)
+            lines = np.bincount(index, minlength=n)
+            quantities = np.bincount(index * n_coffee + coffee, weights=quantity, minlength=n * n_coffee).reshape(n, n_coffee)
+            ingredients = np.stack([np.bincount(index, weights=usage[:, i], minlength=n) for i in range(usage.shape[1])], axis=1) \
+                if n else np.zeros((0, usage.shape[1]))
+            for i, key in enumerate(unique_keys):
+                bucket = aggregates._bucket(buckets, int(key))
+                bucket.revenue = float(revenue[i])
+                bucket.lines = int(lines[i])
+                bucket.quantity = quantities[i].copy()
+                bucket.ingredients = ingredients[i].copy()
+        return aggregates
+
+    # Combined totals over days first..last (dates, inclusive)
+    def days_between(self, first, last):
+        total = Bucket(len(self.engine.coffee_types), len(self.engine.ingredients))
+        with self._lock:
+            for key in range(day_key(first), day_key(last) + 1):
+                if key in self.days:
+                    total.add(self.days[key])
+        return total
+
+    def month(self, moment):
+        total = Bucket(len(self.engine.coffee_types), len(self.engine.ingredients))
+        with self._lock:
+            if month_key(moment) in self.months:
+                total.add(self.months[month_key(moment)])
+        return total
+
+    # Rebuild from the raw ledger and list every bucket that disagrees with the running totals
+    def verify(self, ledger):
+        rebuilt = SalesAggregates.from_ledger(ledger, self.engine)
+        empty = Bucket(len(self.engine.coffee_types), len(self.engine.ingredients))
+        mismatches = []
+        with self._lock:
+            if not np.isclose(self.total_revenue, rebuilt.total_revenue) or self.total_lines != rebuilt.total_lines:
+                mismatches.append(('total', None))
+            for kind, mine, theirs in (('day', self.days, rebuilt.days), ('month', self.months, rebuilt.months)):
+                for key in mine.keys() | theirs.keys():
+                    if not mine.get(key, empty).matches(theirs.get(key, empty)):
+                        mismatches.append((kind, key))
+        return mismatches
@@ -0,0 +1,207 @@
+import argparse
+import dataclasses
+import functools
+import json
+import logging
+import os
+import threading
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+
+from coffeeshop import core, db, menu
+from coffeeshop.pricing import SIZES
+
+logger = logging.getLogger(__name__)
+
+# Set COFFEESHOP_API_PORT to serve the order API from inside the Streamlit server process
+API_PORT_ENV = 'COFFEESHOP_API_PORT'
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8502
+
+
+def _encode(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def json_response(value, status_code=200):
+    from starlette.responses import Response
+
+    if dataclasses.is_dataclass(value):
+        value = dataclasses.asdict(value)
+    return Response(json.dumps(value, default=_encode, separators=(',', ':')), status_code, media_type='application/json')
+
+
+def error_response(status_code, message):
+    return json_response({'error': message}, status_code)
+
+
+# The menu as served to kiosks: prices, sizes, add-ons and the day's offer.
+# It only changes with the menu version or the weekday, so the encoded body is reused.
+@functools.lru_cache(maxsize=8)
+def menu_body(version, weekday):
+    return json.dumps({
+        'version': version,
+        'sizes': SIZES,
+        'coffees': menu.coffee_menu,
+        'add_ons': menu.add_on_prices,
+        'offer': menu.daily_offers.get(weekday),
+    }, separators=(',', ':')).encode('utf-8')
+
+
+# JSON types of the order fields; anything else is a malformed request
+ORDER_FIELDS = {'customer_name': str, 'store': str, 'coupon_code': (str, type(None)), 'redeem_points': int}
+LINE_FIELDS = {'coffee_type': str, 'size': str, 'add_ons': list, 'quantity': int}
+
+
+def _fields(body, types, what):
+    if not isinstance(body, dict):
+        raise ValueError(f"{what} must be an object")
+    for key, value in body.items():
+        if key not in types:
+            raise ValueError(f"Unknown field {key!r} in {what}")
+        if not isinstance(value, types[key]) or isinstance(value, bool):
+            raise ValueError(f"Field {key!r} in {what} has the wrong type")
+    return body
+
+
+# Build an OrderRequest from a request body like
+#   {"customer_name": "Amy", "store": "KLCC", "lines": [{"coffee_type": "Latte", "size": "medium",
+#    "add_ons": ["Extra milk"], "quantity": 2}], "coupon_code": "SAVE2", "redeem_points": 0}
+def parse_order(body):
+    lines = body.pop('lines', None) if isinstance(body, dict) else None
+    if not isinstance(lines, list):
+        raise ValueError("An order needs a list of lines")
+    lines = [core.OrderLine(**_fields(line, LINE_FIELDS, "a line")) for line in lines]
+    if not all(isinstance(add_on, str) for line in lines for add_on in line.add_ons):
+        raise ValueError("Add-ons must be names")
+    return core.OrderRequest(lines=lines, **_fields(body, ORDER_FIELDS, "the order"))
+
+
+async def read_order(request):
+    try:
+        return parse_order(json.loads(await request.body())), None
+    except (ValueError, TypeError) as problem:
+        return None, error_response(400, f"Malformed order: {problem}")
+
+
+# HTTP/JSON front end for POS terminals and self-order kiosks.
+#
+# Every endpoint runs the same coffeeshop.core.Shop as the Streamlit pages.
+# Shop methods block on SQLite, so they run in Starlette's worker threads;
+# each of those threads keeps its own connection from the shop's pool, and
+# the event loop only parses requests and encodes responses. Rejected orders
+# come back as 409 (422 when the order itself is invalid, 500 when it failed
+# on our side) with the same message the till would show.
+def create_app(shop):
+    # Starlette is only needed to serve the API, so importing this module stays cheap
+    from starlette.applications import Starlette
+    from starlette.concurrency import run_in_threadpool
+    from starlette.responses import Response
+    from starlette.routing import Route
+
+    async def get_menu(request):
+        body = menu_body(menu.version(), datetime.now().strftime("%A"))
+        return Response(body, media_type='application/json')
+
+    async def quote_order(request):
+        order, problem = await read_order(request)
+        if problem:
+            return problem
+        try:
+            return json_response(await run_in_threadpool(shop.quote, order))
+        except core.InvalidOrder as rejection:
+            return error_response(422, str(rejection))
+
+    async def place_order(request):
+        order, problem = await read_order(request)
+        if problem:
+            return problem
+        try:
+            return json_response(await run_in_threadpool(shop.place_order, order), 201)
+        except core.InvalidOrder as rejection:
+            return error_response(422, str(rejection))
+        except (core.OrderFailed, core.OrderIncomplete) as failure:
+            return error_response(500, str(failure))
+        except core.OrderRejected as rejection:
+            return error_response(409, str(rejection))
+
+    # Order statuses are answered from the in-memory ledger, straight from the event loop
+    async def order_status(request):
+        try:
+            return json_response(shop.order_status(request.path_params['order_number']))
+        except core.OrderNotFound as missing:
+            return error_response(404, str(missing))
+
+    def mark_order(status):
+        async def endpoint(request):
+            try:
+                return json_response(await run_in_threadpool(shop.mark_order, request.path_params['order_number'], status))
+            except core.OrderNotFound as missing:
+                return error_response(404, str(missing))
+            except core.InvalidStatusChange as refused:
+                return error_response(409, str(refused))
+        return endpoint
+
+    async def loyalty_balance(request):
+        balance = await run_in_threadpool(shop.loyalty_balance, request.path_params['username'])
+        if balance is None:
+            return error_response(404, f"No customer named {request.path_params['username']!r}.")
+        return json_response(balance)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # Load the ledger and inventory before the first order instead of during it
+        await run_in_threadpool(lambda: (shop.ledger, shop.inventory, shop.wait_times, shop.coupons))
+        yield
+
+    return Starlette(routes=[
+        Route('/menu', get_menu, methods=['GET']),
+        Route('/orders/quote', quote_order, methods=['POST']),
+        Route('/orders', place_order, methods=['POST']),
+        Route('/orders/{order_number:int}', order_status, methods=['GET']),
+        Route('/orders/{order_number:int}/ready', mark_order('Ready'), methods=['POST']),
+        Route('/orders/{order_number:int}/picked-up', mark_order('Picked Up'), methods=['POST']),
+        Route('/customers/{username}/points', loyalty_balance, methods=['GET']),
+    ], lifespan=lifespan)
+
+
+def api_port():
+    port = os.environ.get(API_PORT_ENV, '')
+    return int(port) if port else None
+
+
+# Serve the API for `shop` on a background thread of the current process, e.g. next to the
+# Streamlit pages so both share one order ledger. Returns the uvicorn server.
+def serve_in_thread(shop, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(create_app(shop), host=host, port=port, log_level='warning'))
+    threading.Thread(target=server.run, name='order-api', daemon=True).start()
+    logger.info("Order API listening on http://%s:%d", host, port)
+    return server
+
+
+# Headless entry point, e.g.
+#   python -m coffeeshop.api --port 8502
+# Only one process may take orders on a database, so this exits with db.DatabaseInUse next to a
+# running Streamlit app on the same file; set COFFEESHOP_API_PORT for the app to serve the API itself instead.
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the order API for POS terminals and kiosks.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--db', default=db.DB_PATH, help="database file")
+    args = parser.parse_args(argv)
+
+    shop = core.Shop(args.db)
+    try:
+        uvicorn.run(create_app(shop), host=args.host, port=args.port, log_level='warning')
+    finally:
+        shop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import numpy as np
+
+INGREDIENTS = ['coffee_beans', 'milk', 'sugar', 'cups']
+
+
+# Vectorized ingredient-consumption engine.
+#
+# The recipe tables are compiled once into a dense matrix with one row per
+# (coffee type, size, add-on mask) combination and one column per ingredient.
+# Totals for any number of order lines are then a single bincount over the
+# combination index followed by one matrix-vector product, instead of a
+# Python loop with dictionary lookups and substring checks per order line.
+# Category orders must match the OrderLedger the codes come from.
+class ConsumptionEngine:
+    def __init__(self, coffee_types, sizes, add_ons, ingredient_usage, add_on_usage, ingredients=INGREDIENTS):
+        self.coffee_types = list(coffee_types)
+        self.sizes = list(sizes)
+        self.add_ons = list(add_ons)
+        self.ingredients = list(ingredients)
+
+        n_ingredients = len(self.ingredients)
+        column = {name: i for i, name in enumerate(self.ingredients)}
+
+        # base[coffee, size, ingredient]: recipe for one cup; every cup also uses one cup
+        base = np.zeros((len(self.coffee_types), len(self.sizes), n_ingredients))
+        for c, coffee in enumerate(self.coffee_types):
+            for s, size in enumerate(self.sizes):
+                for ingredient, amount in ingredient_usage[coffee][size].items():
+                    base[c, s, column[ingredient]] = amount
+        if 'cups' in column:
+            base[:, :, column['cups']] = 1
+
+        # extras[mask, ingredient]: what every add-on combination adds to one cup
+        n_masks = 1 << len(self.add_ons)
+        extras = np.zeros((n_masks, n_ingredients))
+        for bit, add_on in enumerate(self.add_ons):
+            per_add_on = np.zeros(n_ingredients)
+            for ingredient, amount in add_on_usage.get(add_on, {}).items():
+                per_add_on[column[ingredient]] = amount
+            extras[[mask for mask in range(n_masks) if mask & (1 << bit)]] += per_add_on
+
+        # usage[(coffee * sizes + size) * masks + mask, ingredient]
+        self.n_masks = n_masks
+        self.usage = (base[:, :, None, :] + extras[None, None, :, :]).reshape(-1, n_ingredients)
+
+    def combination(self, coffee_codes, size_codes, add_on_masks):
+        coffee_codes = np.asarray(coffee_codes, dtype=np.int64)
+        size_codes = np.asarray(size_codes, dtype=np.int64)
+        add_on_masks = np.asarray(add_on_masks, dtype=np.int64)
+        return (coffee_codes * len(self.sizes) + size_codes) * self.n_masks + add_on_masks
+
+    # Total ingredient use for a batch of order lines given as parallel code arrays
+    def totals(self, coffee_codes, size_codes, add_on_masks, quantities):
+        cups_per_combination = np.bincount(
+            self.combination(coffee_codes, size_codes, add_on_masks),
+            weights=np.asarray(quantities, dtype=np.float64),
+            minlength=len(self.usage)
+        )
+        return dict(zip(self.ingredients, cups_per_combination @ self.usage))
+
+    # Same as totals() for a DataFrame view from OrderLedger.frame()
+    def frame_totals(self, frame):
+        return self.totals(
+            frame['Coffee Type'].cat.codes.to_numpy(),
+            frame['Size'].cat.codes.to_numpy(),
+            frame['Add-ons'].cat.codes.to_numpy(),
+            frame['Quantity'].to_numpy()
+        )
@@ -0,0 +1,597 @@
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+from coffeeshop import db, events, loyalty, menu, migrations, order_numbers, restock, shards
+from coffeeshop.aggregates import SalesAggregates
+from coffeeshop.consumption import ConsumptionEngine
+from coffeeshop.coupons import CouponService
+from coffeeshop.forecast import DemandForecast
+from coffeeshop.inventory import DEFAULT_STORE, STORE_INVENTORY_DEFAULTS, InsufficientStock, Reservation, StoreInventory
+from coffeeshop.ledger import ORDER_STATUSES, OrderLedger, to_epoch
+from coffeeshop.pricing import SIZES, PriceTable
+from coffeeshop.wait_times import WaitTimeEstimator, prep_seconds
+
+logger = logging.getLogger(__name__)
+
+# Redeemed loyalty points are worth RM1 per 10 points
+POINTS_PER_RINGGIT = 10
+# Most cups of one drink on a single order line
+MAX_LINE_QUANTITY = 10
+# The status an order line must be in to be moved to each later status
+PREVIOUS_STATUS = {'Ready': 'Being Processed', 'Picked Up': 'Ready'}
+
+
+# ---- Requests and responses ----
+
+@dataclass
+class OrderLine:
+    coffee_type: str
+    size: str
+    add_ons: list[str] = field(default_factory=list)
+    quantity: int = 1
+
+
+@dataclass
+class OrderRequest:
+    customer_name: str
+    lines: list[OrderLine]
+    store: str = DEFAULT_STORE
+    coupon_code: str | None = None
+    redeem_points: int = 0
+
+
+# What an order would cost if placed now. A valid coupon replaces the points discount
+# instead of adding to it; coupon_valid is None when no code was given.
+@dataclass
+class Quote:
+    line_prices: list[float]
+    subtotal: float
+    discount: float
+    total: float
+    coupon_valid: bool | None
+    points_earned: int
+    double_points: bool
+    wait_seconds: int
+
+
+@dataclass
+class OrderReceipt:
+    order_number: int
+    store: str
+    customer_name: str
+    lines: list[OrderLine]
+    line_prices: list[float]
+    discount: float
+    total: float
+    points_redeemed: int
+    points_earned: int
+    placed_at: datetime
+    wait_seconds: int
+    rows: list[int]
+
+
+# Where an order is now: the earliest status any of its lines is in
+@dataclass
+class OrderStatus:
+    order_number: int
+    status: str
+    customer_name: str
+    store: str
+    lines: list[OrderLine]
+    placed_at: datetime
+
+
+@dataclass
+class LoyaltyBalance:
+    username: str
+    points: int
+
+
+@dataclass
+class RestockReceipt:
+    order_id: int
+    store: str
+    levels: dict[str, int]
+    costs: dict[str, float]
+    total_cost: float
+
+
+# Sales for the days first_day..last_day (inclusive) and what the store's stock cost.
+# Lines priced at RM0.00 are left out of revenue, quantities and ingredient use.
+@dataclass
+class SalesReport:
+    first_day: date
+    last_day: date
+    store: str
+    revenue: float
+    lines: int
+    coffee_quantities: dict[str, int]
+    ingredients_used: dict[str, float]
+    stock: dict[str, int]
+    initial_inventory_value: float
+    restock_cost: float
+    inventory_cost: float
+    profit: float
+    store_totals: dict[str, dict] | None = None
+
+
+# An order that cannot be placed. The message is fit to show to the customer.
+class OrderRejected(Exception):
+    pass
+
+
+class InvalidOrder(OrderRejected):
+    pass
+
+
+class CouponUnavailable(OrderRejected):
+    def __init__(self, code):
+        super().__init__("Sorry, this coupon has just been used up or has expired.")
+        self.code = code
+
+
+class OutOfStock(OrderRejected):
+    def __init__(self, store, ingredient):
+        if ingredient == 'cups':
+            message = "Sorry, we are out of cups to serve your order."
+        else:
+            message = f"Sorry, your order is currently out of stock due to insufficient {ingredient.replace('_', ' ')}."
+        super().__init__(message)
+        self.store = store
+        self.ingredient = ingredient
+
+
+class NotEnoughPoints(OrderRejected):
+    def __init__(self, username, points):
+        super().__init__(f"{username} does not have {points} loyalty points to redeem.")
+        self.username = username
+        self.points = points
+
+
+class NoOrderNumbers(OrderRejected):
+    def __init__(self):
+        super().__init__("Every order number is in use right now. Please wait for some orders to be picked up.")
+
+
+# Something failed on our side before the order reached the kitchen; everything it took was given back
+class OrderFailed(OrderRejected):
+    def __init__(self):
+        super().__init__("Sorry, we could not place your order and nothing was charged. Please try again.")
+
+
+# Recording the order failed after some of its lines were queued in the kitchen, so the order
+# stands (with its stock, number and points) and staff need to check it
+class OrderIncomplete(OrderRejected):
+    def __init__(self, order_number):
+        super().__init__(f"Order #{order_number} was sent to the kitchen but could not be fully recorded. "
+                         "Please show this message to a member of staff.")
+        self.order_number = order_number
+
+
+class OrderNotFound(LookupError):
+    def __init__(self, order_number):
+        super().__init__(f"Order #{order_number} is not active.")
+        self.order_number = order_number
+
+
+class InvalidStatusChange(ValueError):
+    pass
+
+
+# ---- The shop ----
+
+# Order processing without any user interface.
+#
+# One Shop per server process owns everything the tills share: the connection
+# pool and write-behind queue, the order ledger with its running aggregates,
+# demand forecast and kitchen wait-time estimate, every store's inventory, the
+# coupon service, the order event bus and (in sharded mode) the shard router.
+# The heavy pieces are built on first use, so a caller that only needs, say,
+# loyalty balances never loads the ledger. Every method takes and returns
+# plain values or the dataclasses above, so the Streamlit pages, a POS
+# terminal or a benchmark all run the same code; nothing here touches
+# Streamlit. Methods are safe to call from many threads at once.
+class Shop:
+    def __init__(self, db_path=db.DB_PATH, inventory_defaults=STORE_INVENTORY_DEFAULTS, sharded=None,
+                 coupon_sweep_seconds=3600):
+        self.db_path = db_path
+        self.inventory_defaults = inventory_defaults
+        self.stores = list(inventory_defaults)
+        # Raises db.DatabaseInUse if another Shop already owns this database
+        self.writer_lock = db.WriterLock(db_path)
+        self.pool = db.ConnectionPool(db_path)
+        migrations.migrate(self.pool.connection())
+        self.write_queue = db.WriteBehindQueue(db_path)
+        self.events = events.EventBus()
+        if sharded is None:
+            sharded = shards.sharding_enabled()
+        # Each store's inventory and order books live in their own database file, served by that store's worker
+        self.router = shards.ShardRouter(inventory_defaults, db_path) if sharded else None
+        self.coupon_sweep_seconds = coupon_sweep_seconds
+        self._components = {}
+        self._build_lock = threading.RLock()
+
+    # Build a shared component once, even if several threads ask for it at the same time
+    def _component(self, name, build):
+        component = self._components.get(name)
+        if component is None:
+            with self._build_lock:
+                component = self._components.get(name)
+                if component is None:
+                    component = self._components[name] = build()
+        return component
+
+    # Every order line ever placed, loaded from the database once
+    @property
+    def ledger(self):
+        return self._component('ledger', lambda: db.load_orders(
+            self.pool.connection(), OrderLedger(menu.coffee_menu, SIZES, menu.add_on_prices, stores=self.stores)
+        ))
+
+    # Recipe tables compiled into a (coffee type x size x add-ons) by ingredient matrix
+    @property
+    def engine(self):
+        return self._component('engine', lambda: ConsumptionEngine(
+            list(menu.coffee_menu), SIZES, list(menu.add_on_prices), menu.ingredient_usage, {
+                'Extra sugar': {'sugar': menu.extra_usage['sugar']},
+                'Extra milk': {'milk': menu.extra_usage['milk']}
+            }
+        ))
+
+    @property
+    def aggregates(self):
+        return self._component('aggregates', lambda: SalesAggregates.from_ledger(self.ledger, self.engine))
+
+    @property
+    def forecast(self):
+        return self._component('forecast', lambda: DemandForecast.from_ledger(self.ledger, self.engine, self.stores))
+
+    @property
+    def wait_times(self):
+        return self._component('wait_times', self._load_wait_times)
+
+    def _load_wait_times(self):
+        ledger = self.ledger
+        estimator = WaitTimeEstimator()
+        for duration in db.load_ready_durations(self.pool.connection()):
+            estimator.record_duration(duration)
+        times = ledger.codes()['time']
+        for row in ledger.queued_rows('Being Processed'):
+            estimator.enter(int(row), self.line_prep_seconds(row), int(times[row]))
+        return estimator
+
+    @property
+    def inventory(self):
+        return self._component('inventory', self._load_inventory)
+
+    def _load_inventory(self):
+        if self.router:
+            levels = self.router.fan_out(shards.levels)
+        else:
+            levels = db.load_store_inventory(self.pool.connection(), self.inventory_defaults)
+        return StoreInventory(levels, self.engine)
+
+    # Coupons shared by every till; expired codes are swept on a background thread
+    @property
+    def coupons(self):
+        return self._component('coupons', self._load_coupons)
+
+    def _load_coupons(self):
+        service = CouponService(self.pool)
+        if self.coupon_sweep_seconds:
+            service.start_sweeper(self.coupon_sweep_seconds)
+        return service
+
+    # The menu and a weekday's offer compiled into a price table, built once per menu version and
+    # weekday so a price change reaches the tills on the next order
+    def price_table(self, weekday=None):
+        weekday = weekday or datetime.now().strftime("%A")
+        return self._component(('price_table', menu.version(), weekday),
+                               lambda: PriceTable(menu.coffee_menu, menu.add_on_prices, menu.daily_offers.get(weekday)))
+
+    # Preparation time of one ledger line from its size and number of add-ons
+    def line_prep_seconds(self, row):
+        line = self.ledger.row(row)
+        return prep_seconds(line['Size'], len(line['Add-ons'].split(", ")) if line['Add-ons'] else 0)
+
+    # ---- Stock ----
+
+    # Reserve the ingredients for basket `lines` at `store` in one step; raises OutOfStock
+    def reserve(self, store, lines):
+        inventory = self.inventory
+        needed = inventory.requirement((line.coffee_type, line.size, line.add_ons, line.quantity) for line in lines)
+        if self.router:
+            # The store's worker takes the stock out of its own shard in one transaction
+            reservation = Reservation(None, store, needed)
+            short, levels = self.router.call(store, shards.reserve, inventory.amounts(reservation))
+            inventory.set_levels(store, levels)
+            if short is not None:
+                raise OutOfStock(store, short)
+            return reservation
+        try:
+            return inventory.reserve(store, needed)
+        except InsufficientStock as shortage:
+            raise OutOfStock(store, shortage.ingredient) from None
+
+    # Give a basket's reserved stock back when the order could not go through
+    def release(self, reservation):
+        if self.router:
+            levels = self.router.call(reservation.store, shards.adjust, self.inventory.amounts(reservation))
+            self.inventory.set_levels(reservation.store, levels)
+        else:
+            self.inventory.release(reservation)
+
+    # The order went through: the reserved stock stays taken and the change is persisted
+    # (a shard has already written it)
+    def commit(self, reservation):
+        if not self.router:
+            for item, amount in self.inventory.commit(reservation).items():
+                self.write_queue.put(db.UPDATE_STORE_INVENTORY, (-amount, reservation.store, item))
+
+    # Add `amount` (negative to remove) of `item` to a store's stock; returns the new level
+    def adjust_stock(self, store, item, amount):
+        if self.router:
+            levels = self.router.call(store, shards.adjust, {item: amount})
+            self.inventory.set_levels(store, levels)
+            return levels[item]
+        new_total = self.inventory.adjust(store, item, amount)
+        self.write_queue.put(db.UPDATE_STORE_INVENTORY, (amount, store, item))
+        return new_total
+
+    # Restock several items at once and record them as one purchase order
+    def restock(self, store, amounts):
+        amounts = {item: amount for item, amount in amounts.items() if amount > 0}
+        costs = {item: restock.cost(item, amount, menu.restock_prices, menu.RESTOCK_UNITS) for item, amount in amounts.items()}
+        levels = {item: self.adjust_stock(store, item, amount) for item, amount in amounts.items()}
+        order_id = restock.record_purchase_order(self.pool.connection(), store,
+                                                 [(item, amount, costs[item]) for item, amount in amounts.items()])
+        return RestockReceipt(order_id, store, levels, costs, sum(costs.values()))
+
+    def store_levels(self, store):
+        return self.inventory.view(store)
+
+    # ---- Loyalty ----
+
+    # A customer's points, or None if there is no such customer
+    def loyalty_balance(self, username):
+        row = self.pool.connection().execute("SELECT loyalty_points FROM customers WHERE username=?", (username,)).fetchone()
+        return LoyaltyBalance(username, row[0] or 0) if row else None
+
+    # Credit points earned from a purchase (balance and history are written in one transaction)
+    def credit_points(self, username, points):
+        return loyalty.credit_points(self.pool.connection(), username, points)
+
+    # Spend points atomically; returns False if the balance does not cover them
+    def redeem_points(self, username, points):
+        return loyalty.redeem_points(self.pool.connection(), username, points)
+
+    # ---- Orders ----
+
+    def _validate(self, request):
+        if not request.customer_name:
+            raise InvalidOrder("Please enter your name to proceed.")
+        if not request.lines:
+            raise InvalidOrder("The order has no items.")
+        if request.store not in self.inventory_defaults:
+            raise InvalidOrder(f"Unknown store {request.store!r}.")
+        if request.redeem_points < 0:
+            raise InvalidOrder("Points to redeem cannot be negative.")
+        for line in request.lines:
+            if line.coffee_type not in menu.coffee_menu or line.size not in SIZES:
+                raise InvalidOrder(f"{line.coffee_type} ({line.size}) is not on the menu.")
+            if any(add_on not in menu.add_on_prices for add_on in line.add_ons):
+                raise InvalidOrder(f"Unknown add-on in {', '.join(line.add_ons)}.")
+            if not 1 <= line.quantity <= MAX_LINE_QUANTITY:
+                raise InvalidOrder(f"Quantity must be between 1 and {MAX_LINE_QUANTITY}.")
+
+    # Price an order without placing it; raises InvalidOrder for items that are not on the menu
+    def quote(self, request, now=None):
+        self._validate(request)
+        now = now or datetime.now()
+        table = self.price_table(now.strftime("%A"))
+        line_prices, subtotal = table.price_lines(
+            (line.coffee_type, line.size, line.add_ons, line.quantity) for line in request.lines
+        )
+        discount = request.redeem_points // POINTS_PER_RINGGIT
+        coupon_valid = None
+        if request.coupon_code:
+            coupon_discount = self.coupons.discount(request.coupon_code, now)
+            coupon_valid = coupon_discount is not None
+            if coupon_valid:
+                discount = coupon_discount
+        total = max(subtotal - discount, 0.0)
+        # 1 point for every whole RM paid, doubled on double-points days
+        points_earned = int(total) * (2 if table.double_points else 1)
+        # The kitchen's outstanding work split across the baristas, plus this order
+        wait_seconds = self.wait_times.estimate(sum(prep_seconds(line.size, len(line.add_ons)) for line in request.lines))
+        return Quote([float(price) for price in line_prices], subtotal, float(discount), total, coupon_valid,
+                     points_earned, table.double_points, wait_seconds)
+
+    # Take payment for an order and send it to the kitchen.
+    #
+    # The coupon use, the stock, an order number, the redeemed points and the
+    # earned points are taken in that order, and each is given back if a later
+    # step fails, so a rejected order leaves nothing behind. Raises an
+    # OrderRejected subclass saying why; an unexpected failure becomes
+    # OrderFailed. Once the first line is queued in the kitchen the order will
+    # be made, so nothing is given back after that: a failure while recording
+    # the rest keeps the stock, number and points and raises OrderIncomplete.
+    def place_order(self, request, now=None):
+        quote = self.quote(request, now)
+        placed_at = (now or datetime.now()).replace(microsecond=0)
+        conn = self.pool.connection()
+        customer = request.customer_name
+        coupon = request.coupon_code if quote.coupon_valid else None
+        rollback, rows = [], []
+        committing = False
+        try:
+            if coupon:
+                if not self.coupons.redeem(coupon, placed_at):
+                    raise CouponUnavailable(coupon)
+                rollback.append(lambda: self.coupons.release(coupon))
+            reservation = self.reserve(request.store, request.lines)
+            rollback.append(lambda: self.release(reservation))
+
+            try:
+                order_number = order_numbers.allocate(conn)
+            except order_numbers.OrderNumbersExhausted:
+                raise NoOrderNumbers() from None
+            rollback.append(lambda: order_numbers.release(conn, order_number))
+            if request.redeem_points:
+                if not self.redeem_points(customer, request.redeem_points):
+                    raise NotEnoughPoints(customer, request.redeem_points)
+                rollback.append(lambda: loyalty.credit_points(conn, customer, request.redeem_points,
+                                                              "Points refunded for a cancelled order"))
+            if quote.points_earned > 0 and self.credit_points(customer, quote.points_earned):
+                rollback.append(lambda: loyalty.redeem_points(conn, customer, quote.points_earned,
+                                                              "Points reversed for a cancelled order"))
+
+            self._record_order(order_number, request, quote.line_prices, placed_at, rows)
+            committing = True
+            self.commit(reservation)
+        except Exception as error:
+            if rows:
+                logger.exception("Order #%s is in the kitchen but was not fully recorded", order_number)
+                if not committing:
+                    self.commit(reservation)
+                raise OrderIncomplete(order_number) from error
+            for undo in reversed(rollback):
+                undo()
+            if isinstance(error, OrderRejected):
+                raise
+            logger.exception("Placing an order failed; everything it took was given back")
+            raise OrderFailed() from error
+        return OrderReceipt(order_number, request.store, request.customer_name, request.lines, quote.line_prices,
+                            quote.discount, quote.total, request.redeem_points, quote.points_earned, placed_at,
+                            quote.wait_seconds, rows)
+
+    # Save the order's lines to the ledger and the database, fold them into the running
+    # totals and forecast, queue them in the kitchen and announce the order.
+    # Each line's ledger row is added to `rows` as soon as it is queued.
+    def _record_order(self, order_number, request, line_prices, placed_at, rows):
+        ledger, ts = self.ledger, to_epoch(placed_at)
+        for line, price in zip(request.lines, line_prices):
+            row = ledger.append(order_number, request.customer_name, line.coffee_type, line.quantity, line.size,
+                                line.add_ons, price, placed_at, store=request.store)
+            rows.append(row)
+            self.aggregates.record(ledger, row)
+            self.forecast.record(ledger, row)
+            self.wait_times.enter(row, self.line_prep_seconds(row), ts)
+            self.write_queue.put(db.INSERT_ORDER_LINE, (
+                row, order_number, request.customer_name, line.coffee_type, line.quantity, line.size,
+                ', '.join(line.add_ons), price, ts, 'Being Processed', request.store
+            ))
+        self.events.publish(events.ORDER_CREATED, order_number)
+
+        # In sharded mode the store's own books get the order lines too
+        if self.router:
+            self.router.submit(request.store, shards.record_order_lines, [
+                (order_number, request.customer_name, line.coffee_type, line.quantity, line.size,
+                 ', '.join(line.add_ons), price, ts)
+                for line, price in zip(request.lines, line_prices)
+            ])
+
+    # Move one order line a step along its lifecycle. A line that is no longer in the status
+    # before `status`, e.g. a stale board button for an order another till already handed
+    # over, is left alone; returns whether the line moved.
+    def set_order_status(self, row, status):
+        ledger = self.ledger
+        previous = PREVIOUS_STATUS.get(status)
+        if previous is None:
+            raise InvalidStatusChange(f"Orders can only be marked Ready or Picked Up, not {status!r}.")
+        if not ledger.set_status(row, status, expected=previous):
+            return False
+        self.write_queue.put(db.UPDATE_ORDER_STATUS, (status, row))
+
+        # Leaving the kitchen takes the line's prep time off the queue and records how long it took
+        finished = to_epoch(datetime.now())
+        if self.wait_times.leave(row, finished) is not None and status == 'Ready':
+            self.write_queue.put(db.SET_READY_TIME, (finished, row))
+
+        # Tell the boards once every line of the order has moved on
+        order_number = ledger.row(row)['Order Number']
+        if status == 'Ready' and not ledger.in_queue('Being Processed', order_number):
+            self.events.publish(events.ORDER_READY, order_number)
+        elif status == 'Picked Up' and not ledger.is_active(order_number):
+            self.events.publish(events.ORDER_PICKED_UP, order_number)
+            # Once every line of the order has been picked up its number can be handed out again
+            order_numbers.release(self.pool.connection(), order_number)
+        return True
+
+    def _order_status(self, order_number, rows):
+        ledger = self.ledger
+        lines = [ledger.row(row) for row in rows]
+        return OrderStatus(
+            order_number,
+            min((line['Status'] for line in lines), key=ORDER_STATUSES.index),
+            lines[0]['Customer Name'], lines[0]['Store'],
+            [OrderLine(line['Coffee Type'], line['Size'], line['Add-ons'].split(", ") if line['Add-ons'] else [],
+                       line['Quantity']) for line in lines],
+            lines[0]['Time']
+        )
+
+    # Status of an order that is still being made or waiting for pickup; raises OrderNotFound
+    # otherwise (numbers of picked-up orders are handed out again)
+    def order_status(self, order_number):
+        active = self.ledger.active_rows(order_number)
+        if not active:
+            raise OrderNotFound(order_number)
+        return self._order_status(order_number, sorted(row for rows in active.values() for row in rows))
+
+    # Move a whole order on to 'Ready' (from the kitchen) or 'Picked Up' (once it is ready).
+    # Marking an order with the status it already has changes nothing. Returns its new status.
+    def mark_order(self, order_number, status):
+        source = PREVIOUS_STATUS.get(status)
+        if source is None:
+            raise InvalidStatusChange(f"Orders can only be marked Ready or Picked Up, not {status!r}.")
+        active = self.ledger.active_rows(order_number)
+        if not active:
+            raise OrderNotFound(order_number)
+        if status == 'Picked Up' and 'Being Processed' in active:
+            raise InvalidStatusChange(f"Order #{order_number} is not ready for pickup yet.")
+        for row in active.get(source, []):
+            self.set_order_status(row, status)
+        return self._order_status(order_number, sorted(row for rows in active.values() for row in rows))
+
+    # ---- Reports ----
+
+    def sales_report(self, first_day, last_day, store=DEFAULT_STORE):
+        aggregates = self.aggregates
+        period = aggregates.days_between(first_day, last_day)
+        store_totals = None
+        if self.router:
+            # Every store's worker totals its own books in parallel
+            store_totals = self.router.fan_out(shards.sales_totals, to_epoch(first_day), to_epoch(last_day + timedelta(days=1)))
+
+        # Value of the store's stock at restock prices, plus everything ever spent on restocking
+        stock = dict(self.store_levels(store))
+        initial_inventory_value = sum(restock.cost(item, amount, menu.restock_prices, menu.RESTOCK_UNITS)
+                                      for item, amount in stock.items())
+        restock_cost = restock.total_cost(self.pool.connection())
+        inventory_cost = initial_inventory_value + restock_cost
+        return SalesReport(
+            first_day, last_day, store, period.revenue, period.lines,
+            {coffee: int(quantity) for coffee, quantity in zip(aggregates.engine.coffee_types, period.quantity) if int(quantity) > 0},
+            {ingredient: float(amount) for ingredient, amount in zip(aggregates.engine.ingredients, period.ingredients)},
+            stock, initial_inventory_value, restock_cost, inventory_cost, period.revenue - inventory_cost, store_totals
+        )
+
+    # Rebuild the running totals from the raw ledger and compare; totals that disagree are
+    # replaced by the rebuilt ones. Returns the mismatches.
+    def verify_sales_totals(self):
+        mismatches = self.aggregates.verify(self.ledger)
+        if mismatches:
+            with self._build_lock:
+                self._components.pop('aggregates', None)
+        return mismatches
+
+    # Stop the background threads and write out everything still queued
+    def close(self):
+        if 'coupons' in self._components:
+            self._components['coupons'].stop_sweeper()
+        self.write_queue.close()
+        if self.router:
+            self.router.close()
+        self.writer_lock.release()
@@ -0,0 +1,194 @@
+import heapq
+import logging
+import secrets
+import threading
+from datetime import datetime
+
+from coffeeshop.ledger import to_epoch
+
+logger = logging.getLogger(__name__)
+
+# Codes from bulk generation avoid look-alike characters (0/O, 1/I/L)
+CODE_ALPHABET = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+
+# Saving an existing code changes its terms but keeps its use counter, so re-saving a used
+# single-use code does not make it redeemable again
+INSERT_COUPON = '''INSERT INTO coupons (code, discount, expiration_date, expires_ts, max_uses, uses)
+                   VALUES (?, ?, ?, ?, ?, 0)
+                   ON CONFLICT(code) DO UPDATE SET discount = excluded.discount,
+                       expiration_date = excluded.expiration_date, expires_ts = excluded.expires_ts,
+                       max_uses = excluded.max_uses'''
+# Only succeeds while the coupon is unexpired and has uses left, so two tills can't both take the last use
+REDEEM = '''UPDATE coupons SET uses = uses + 1
+            WHERE code=? AND expires_ts > ? AND (max_uses IS NULL OR uses < max_uses)'''
+RELEASE = "UPDATE coupons SET uses = uses - 1 WHERE code=? AND uses > 0"
+SELECT_COUPON = "SELECT code, discount, expires_ts, max_uses, uses FROM coupons WHERE code=?"
+
+
+# A coupon is valid until its expiration date starts; this is that moment in the ledger's epoch seconds
+def expiry_ts(expiration_date):
+    return to_epoch(datetime.combine(expiration_date, datetime.min.time()))
+
+
+# Persistent coupons with an in-memory index by code.
+#
+# The index maps each live code to [discount, expiry timestamp, max uses,
+# uses], with expiry worked out once when the coupon is stored, so checking
+# a code at the till is one dict lookup and an integer comparison. Codes the
+# index has not seen (e.g. created by another server process) are looked up
+# in the database and cached. Redemption is a single conditional UPDATE of
+# the coupon's counter, so a limited coupon can never be used more often
+# than allowed, however many tills try at once. A min-heap of expiry
+# timestamps lets sweep() evict expired codes from the index and the
+# database without scanning every coupon; start_sweeper() runs it on a
+# background thread.
+class CouponService:
+    def __init__(self, pool):
+        self._pool = pool
+        self._coupons = {}
+        self._expiries = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeper = None
+        self.sweep()
+        now = to_epoch(datetime.now())
+        for code, discount, expires, max_uses, uses in self._pool.connection().execute(
+                "SELECT code, discount, expires_ts, max_uses, uses FROM coupons WHERE expires_ts > ?", (now,)):
+            self._cache(code, discount, expires, max_uses, uses)
+
+    def _cache(self, code, discount, expires, max_uses, uses):
+        with self._lock:
+            self._coupons[code] = [discount, expires, max_uses, uses]
+            heapq.heappush(self._expiries, (expires, code))
+
+    # Create a coupon, or change the terms of an existing one; max_uses=None means unlimited.
+    # Returns how many times the code has already been used (0 for a new one).
+    def create(self, code, discount, expiration_date, max_uses=None):
+        expires = expiry_ts(expiration_date)
+        conn = self._pool.connection()
+        with conn:
+            conn.execute(INSERT_COUPON, (code, discount, expiration_date.isoformat(), expires, max_uses))
+            uses = conn.execute("SELECT uses FROM coupons WHERE code=?", (code,)).fetchone()[0]
+        self._cache(code, discount, expires, max_uses, uses)
+        return uses
+
+    # Create `count` new random codes sharing one discount, expiry and use limit, in one
+    # transaction. Codes that already exist are never reused. Returns the new codes.
+    # Raises ValueError if `prefix` and `length` leave too few unused codes.
+    def generate(self, count, discount, expiration_date, max_uses=1, prefix='', length=8):
+        expires = expiry_ts(expiration_date)
+        isoformat = expiration_date.isoformat()
+        conn = self._pool.connection()
+        if count > len(CODE_ALPHABET) ** length:
+            raise ValueError(f"Only {len(CODE_ALPHABET) ** length} codes of length {length} exist")
+        codes = set()
+        misses = 0
+        with conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS new_coupon_codes (code TEXT PRIMARY KEY)")
+            while len(codes) < count:
+                conn.execute("DELETE FROM new_coupon_codes")
+                conn.executemany("INSERT OR IGNORE INTO new_coupon_codes (code) VALUES (?)",
+                                 [(prefix + ''.join(secrets.choice(CODE_ALPHABET) for _ in range(length)),)
+                                  for _ in range(count - len(codes))])
+                # Drop candidates that collide with a code already handed out
+                conn.execute("DELETE FROM new_coupon_codes WHERE code IN (SELECT code FROM coupons)")
+                conn.execute('''INSERT INTO coupons (code, discount, expiration_date, expires_ts, max_uses, uses)
+                                SELECT code, ?, ?, ?, ?, 0 FROM new_coupon_codes''', (discount, isoformat, expires, max_uses))
+                added = [code for code, in conn.execute("SELECT code FROM new_coupon_codes")]
+                misses = 0 if added else misses + 1
+                if misses == 20:
+                    # Rolls back the whole batch
+                    raise ValueError(f"Ran out of unused {length}-character codes with prefix {prefix!r}")
+                codes.update(added)
+        with self._lock:
+            for code in codes:
+                self._coupons[code] = [discount, expires, max_uses, 0]
+                self._expiries.append((expires, code))
+            heapq.heapify(self._expiries)
+        return sorted(codes)
+
+    def _lookup(self, code):
+        coupon = self._coupons.get(code)
+        if coupon is None:
+            row = self._pool.connection().execute(SELECT_COUPON, (code,)).fetchone()
+            if row is None:
+                return None
+            self._cache(*row)
+            coupon = self._coupons[code]
+        return coupon
+
+    # The coupon's discount in RM, or None if there is no such coupon, it has expired or it is used up
+    def discount(self, code, now=None):
+        coupon = self._lookup(code)
+        now = to_epoch(now if now is not None else datetime.now())
+        if coupon is None or coupon[1] <= now or (coupon[2] is not None and coupon[3] >= coupon[2]):
+            return None
+        return coupon[0]
+
+    # Use the coupon once. Returns False if it has expired or has no uses left.
+    def redeem(self, code, now=None):
+        now = to_epoch(now if now is not None else datetime.now())
+        conn = self._pool.connection()
+        with conn:
+            if conn.execute(REDEEM, (code, now)).rowcount == 0:
+                return False
+            uses = conn.execute("SELECT uses FROM coupons WHERE code=?", (code,)).fetchone()[0]
+        with self._lock:
+            if code in self._coupons:
+                self._coupons[code][3] = uses
+        return True
+
+    # Give back a use taken by redeem(), e.g. when the order it was for did not go through
+    def release(self, code):
+        conn = self._pool.connection()
+        with conn:
+            conn.execute(RELEASE, (code,))
+            row = conn.execute("SELECT uses FROM coupons WHERE code=?", (code,)).fetchone()
+        with self._lock:
+            if row and code in self._coupons:
+                self._coupons[code][3] = row[0]
+
+    # Drop every coupon that has expired by `now` from the index and the database.
+    # Returns how many codes were evicted from the index.
+    def sweep(self, now=None):
+        now = to_epoch(now if now is not None else datetime.now())
+        evicted = 0
+        with self._lock:
+            while self._expiries and self._expiries[0][0] <= now:
+                expires, code = heapq.heappop(self._expiries)
+                coupon = self._coupons.get(code)
+                # A code that was replaced later has a newer heap entry; only evict the current one
+                if coupon is not None and coupon[1] == expires:
+                    del self._coupons[code]
+                    evicted += 1
+        conn = self._pool.connection()
+        with conn:
+            conn.execute("DELETE FROM coupons WHERE expires_ts <= ?", (now,))
+        return evicted
+
+    # Sweep every `interval` seconds on a daemon thread until stop_sweeper()
+    def start_sweeper(self, interval=3600):
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.sweep()
+                except Exception:
+                    logger.exception("Coupon sweep failed")
+
+        self._sweeper = threading.Thread(target=run, name='coupon-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    # The newest `limit` coupons as (code, discount, expiration date, uses, max uses), for the admin page
+    def recent(self, limit=50):
+        return self._pool.connection().execute(
+            "SELECT code, discount, expiration_date, uses, max_uses FROM coupons ORDER BY rowid DESC LIMIT ?", (limit,)
+        ).fetchall()
+
+    def __len__(self):
+        return len(self._coupons)
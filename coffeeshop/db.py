@@ -0,0 +1,219 @@
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = 'coffee_shop.db'
+
+# SQL used to persist order lines and inventory changes through the write-behind queue
+INSERT_ORDER_LINE = '''INSERT INTO orders (id, order_number, customer_name, coffee_type, quantity, size, add_ons, price, time, status, store)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+UPDATE_ORDER_STATUS = "UPDATE orders SET status=? WHERE id=?"
+SET_READY_TIME = "UPDATE orders SET ready_time=? WHERE id=?"
+UPDATE_STORE_INVENTORY = "UPDATE store_inventory SET quantity = quantity + ? WHERE store=? AND item=?"
+INSERT_FEEDBACK = '''INSERT INTO feedback (name, coffee_purchased, coffee_rating, service_rating, additional_feedback, time)
+                     VALUES (?, ?, ?, ?, ?, ?)'''
+
+# Sentinel that tells the writer thread to drain the queue and exit
+_STOP = object()
+
+
+# Open a SQLite connection tuned for many concurrent readers and one writer.
+# WAL lets readers run while a write is in progress, busy_timeout makes a
+# locked database wait instead of failing, and synchronous=NORMAL is safe in
+# WAL mode while avoiding an fsync on every commit.
+def connect(db_path=DB_PATH, busy_timeout_ms=5000, cached_statements=256, **kwargs):
+    conn = sqlite3.connect(db_path, timeout=busy_timeout_ms / 1000, cached_statements=cached_statements, **kwargs)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+# Hands out one connection per thread.
+#
+# Streamlit runs each session's script on its own thread, so a thread-local
+# connection never sees "recursive use of cursors" from another session, and
+# its statement cache keeps the prepared form of every query the thread has
+# run. A connection is closed when its thread goes away.
+class ConnectionPool:
+    def __init__(self, db_path=DB_PATH, busy_timeout_ms=5000, cached_statements=256):
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = connect(self.db_path, self.busy_timeout_ms, self.cached_statements)
+            self._local.conn = conn
+        return conn
+
+
+# Load every persisted order line into an OrderLedger, keeping ledger row == orders.id
+def load_orders(conn, ledger):
+    rows = conn.execute('''SELECT id, order_number, customer_name, coffee_type, quantity, size, add_ons, price, time, status, store
+                           FROM orders ORDER BY id''').fetchall()
+    renumbered = []
+    for line_id, order_number, customer_name, coffee_type, quantity, size, add_ons, price, order_time, status, store in rows:
+        row = ledger.append(order_number, customer_name, coffee_type, quantity, size,
+                            add_ons.split(', ') if add_ons else [], price, order_time, status, store)
+        if row != line_id:
+            renumbered.append((row, line_id))
+
+    # Close any gap left by a dropped write so later status updates hit the right line
+    if renumbered:
+        with conn:
+            conn.executemany("UPDATE orders SET id=? WHERE id=?", renumbered)
+    return ledger
+
+
+# Order-to-Ready durations in seconds of the most recently finished lines, oldest first
+def load_ready_durations(conn, limit=500):
+    rows = conn.execute("SELECT ready_time - time FROM orders WHERE ready_time IS NOT NULL ORDER BY id DESC LIMIT ?",
+                        (limit,)).fetchall()
+    return [duration for duration, in reversed(rows)]
+
+
+# Load every store's inventory levels as {store: {item: quantity}},
+# inserting any missing store or item with its default quantity
+def load_store_inventory(conn, defaults):
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO store_inventory (store, item, quantity) VALUES (?, ?, ?)",
+                         [(store, item, quantity) for store, items in defaults.items() for item, quantity in items.items()])
+    stored = {(store, item): quantity for store, item, quantity in conn.execute("SELECT store, item, quantity FROM store_inventory")}
+    return {store: {item: stored[store, item] for item in items} for store, items in defaults.items()}
+
+
+def load_feedback(conn):
+    return [
+        {
+            'Name': name,
+            'Coffee Purchased': coffee_purchased,
+            'Coffee Rating': coffee_rating,
+            'Service Rating': service_rating,
+            'Additional Feedback': additional_feedback,
+            'Time': feedback_time
+        }
+        for name, coffee_purchased, coffee_rating, service_rating, additional_feedback, feedback_time in conn.execute(
+            "SELECT name, coffee_purchased, coffee_rating, service_rating, additional_feedback, time FROM feedback ORDER BY id")
+    ]
+
+
+class DatabaseInUse(RuntimeError):
+    pass
+
+
+# Only one process may take orders on a database.
+#
+# Order lines are stored under their row in the in-memory ledger (orders.id),
+# which only the process that owns the ledger knows, so a second process on the
+# same file would reuse those ids and its writes would be dropped by the
+# write-behind queue. The owner holds an exclusive SQLite lock on a small
+# `<db>.lock` file for as long as it is open; the OS releases it if the process
+# dies. A second owner, in this process or another, fails at once.
+class WriterLock:
+    def __init__(self, db_path=DB_PATH):
+        self.path = f"{db_path}.lock"
+        conn = sqlite3.connect(self.path, timeout=0, isolation_level=None, check_same_thread=False)
+        try:
+            conn.execute("BEGIN EXCLUSIVE")
+        except sqlite3.OperationalError:
+            conn.close()
+            raise DatabaseInUse(f"Another process is already taking orders on {db_path}; stop it first, or serve the "
+                                f"order API from that process (COFFEESHOP_API_PORT) instead of running a second one.") from None
+        self._conn = conn
+
+    def release(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# Batched write-behind queue for SQLite.
+#
+# Callers enqueue (sql, params) pairs and return immediately. A single writer
+# thread with its own connection groups everything that arrives within
+# `flush_interval_ms` (or up to `max_batch` statements) into one transaction,
+# so a burst of clicks costs one commit instead of one fsync each. `flush()`
+# blocks until everything queued so far is on disk, and `close()` is
+# registered with atexit so pending writes survive a normal shutdown.
+class WriteBehindQueue:
+    def __init__(self, db_path=DB_PATH, flush_interval_ms=200, max_batch=500):
+        self.db_path = db_path
+        self.flush_interval_ms = flush_interval_ms
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='sqlite-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, sql, params=()):
+        if self._closed:
+            raise RuntimeError("Write-behind queue is closed")
+        self._queue.put((sql, tuple(params)))
+
+    # Block until every write queued before this call has been committed
+    def flush(self, timeout=None):
+        if self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        conn = connect(self.db_path)
+        interval = self.flush_interval_ms / 1000
+        stopping = False
+        while not stopping:
+            batch, waiters = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                if isinstance(item, threading.Event):
+                    # A flush request commits whatever is batched right away
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(conn, batch)
+            for waiter in waiters:
+                waiter.set()
+        conn.close()
+
+    def _write(self, conn, batch):
+        try:
+            with conn:
+                for sql, params in batch:
+                    conn.execute(sql, params)
+        except sqlite3.Error:
+            # Replay one statement per transaction so a single bad row does not drop the whole batch
+            logger.exception("Batched write failed, retrying %d statements individually", len(batch))
+            for sql, params in batch:
+                try:
+                    with conn:
+                        conn.execute(sql, params)
+                except sqlite3.Error:
+                    logger.exception("Dropping write: %s %r", sql, params)
@@ -0,0 +1,61 @@
+import threading
+from collections import deque, namedtuple
+
+# Order lifecycle events
+ORDER_CREATED = 'created'
+ORDER_READY = 'ready'
+ORDER_PICKED_UP = 'picked_up'
+
+Event = namedtuple('Event', ['version', 'kind', 'order_number'])
+
+
+# In-process publish/subscribe bus for order lifecycle events.
+#
+# Every event gets the next version number and is kept in a bounded log, so a
+# screen that polls only has to remember the last version it saw and ask for
+# what happened since, instead of reloading and re-reading every order.
+# Callbacks registered with subscribe() run on the publishing thread; wait()
+# lets a poller block until something new arrives.
+class EventBus:
+    def __init__(self, history=1000):
+        self._events = deque(maxlen=history)
+        self._version = 0
+        self._subscribers = []
+        self._changed = threading.Condition()
+
+    @property
+    def version(self):
+        return self._version
+
+    def publish(self, kind, order_number):
+        with self._changed:
+            self._version += 1
+            event = Event(self._version, kind, order_number)
+            self._events.append(event)
+            subscribers = list(self._subscribers)
+            self._changed.notify_all()
+        for callback in subscribers:
+            callback(event)
+        return event
+
+    # Register a callback for every future event; returns a function that unsubscribes it
+    def subscribe(self, callback):
+        with self._changed:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._changed:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    # Events newer than `version` (oldest first) and the version to pass next time.
+    # Events that have already dropped out of the log are not returned.
+    def since(self, version):
+        with self._changed:
+            return self._version, [event for event in self._events if event.version > version]
+
+    # Block until there is an event newer than `version`; False on timeout
+    def wait(self, version, timeout=None):
+        with self._changed:
+            return self._changed.wait_for(lambda: self._version > version, timeout)
@@ -0,0 +1,175 @@
+import argparse
+import csv
+import io
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from coffeeshop import db, migrations
+from coffeeshop.ledger import to_epoch
+
+FORMATS = ['csv', 'parquet']
+
+
+# One exportable table: the columns to write, the column rows are filtered on by
+# time, and which columns hold epoch seconds (written as timestamps). Text columns
+# with only a few distinct values are dictionary-encoded in Parquet.
+class Dataset:
+    def __init__(self, table, columns, time_column, epoch_columns=(), dictionary_columns=(), column_types=None):
+        self.table = table
+        self.columns = list(columns)
+        self.time_column = time_column
+        self.epoch_columns = list(epoch_columns)
+        self.dictionary_columns = list(dictionary_columns)
+        self.column_types = column_types or {}
+
+    # Time filter bounds in the column's own representation
+    def bounds(self, start, stop):
+        if self.time_column in self.epoch_columns:
+            return (to_epoch(start) if start is not None else None), (to_epoch(stop) if stop is not None else None)
+        return tuple(None if moment is None else moment.strftime("%Y-%m-%d %H:%M:%S") for moment in (start, stop))
+
+
+DATASETS = {
+    'sales': Dataset(
+        'orders',
+        ['id', 'order_number', 'customer_name', 'coffee_type', 'quantity', 'size', 'add_ons', 'price', 'time', 'status', 'store'],
+        'time', epoch_columns=['time'], dictionary_columns=['coffee_type', 'size', 'add_ons', 'status', 'store'],
+        column_types={'id': 'int64', 'order_number': 'int32', 'quantity': 'int16', 'price': 'float64'}
+    ),
+    'loyalty': Dataset(
+        'loyalty_points_history',
+        ['id', 'username', 'points', 'description', 'ts'],
+        'ts', epoch_columns=['ts'], dictionary_columns=['description'],
+        column_types={'id': 'int64', 'points': 'int32'}
+    ),
+    'feedback': Dataset(
+        'feedback',
+        ['id', 'name', 'coffee_purchased', 'coffee_rating', 'service_rating', 'additional_feedback', 'time'],
+        'time', dictionary_columns=['coffee_purchased'],
+        column_types={'id': 'int64', 'coffee_rating': 'int8', 'service_rating': 'int8'}
+    ),
+}
+
+
+# Rows of `dataset` with start <= time < stop (either end may be None) in id order, as
+# lists of at most `chunk_size` tuples. Each chunk is one keyset query on the primary
+# key, so only one chunk is ever held in memory.
+def iter_chunks(conn, dataset, start=None, stop=None, chunk_size=10000):
+    low, high = dataset.bounds(start, stop)
+    sql = (f"SELECT {', '.join(dataset.columns)} FROM {dataset.table} WHERE id > ?"
+           f" AND (? IS NULL OR {dataset.time_column} >= ?) AND (? IS NULL OR {dataset.time_column} < ?)"
+           f" ORDER BY id LIMIT ?")
+    last_id = 0
+    while True:
+        rows = conn.execute(sql, (last_id, low, low, high, high, chunk_size)).fetchall()
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+
+# Write the rows as CSV to the text stream `out`; epoch columns become "YYYY-MM-DD HH:MM:SS".
+# Returns the number of rows written.
+def write_csv(conn, dataset, out, start=None, stop=None, chunk_size=10000):
+    writer = csv.writer(out)
+    writer.writerow(dataset.columns)
+    epoch = [dataset.columns.index(column) for column in dataset.epoch_columns]
+    written = 0
+    for rows in iter_chunks(conn, dataset, start, stop, chunk_size):
+        if epoch:
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for i in epoch:
+                    if row[i] is not None:
+                        # Epoch seconds here are wall-clock time, so format them without a time zone shift
+                        row[i] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(row[i]))
+        writer.writerows(rows)
+        written += len(rows)
+    return written
+
+
+def arrow_schema(dataset):
+    import pyarrow as pa
+
+    return pa.schema([
+        (column, pa.timestamp('s') if column in dataset.epoch_columns
+         else pa.type_for_alias(dataset.column_types.get(column, 'string')))
+        for column in dataset.columns
+    ])
+
+
+# Write the rows as Parquet to a path or binary file object, one row group per chunk,
+# with the dataset's low-cardinality text columns dictionary-encoded. Returns the number of rows written.
+def write_parquet(conn, dataset, out, start=None, stop=None, chunk_size=10000, compression='zstd'):
+    # pyarrow is only needed for Parquet, so CSV exports do not pay for importing it
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(dataset)
+    written = 0
+    with pq.ParquetWriter(out, schema, compression=compression, use_dictionary=dataset.dictionary_columns) as writer:
+        for rows in iter_chunks(conn, dataset, start, stop, chunk_size):
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(zip(*rows), schema)], schema=schema
+            ))
+            written += len(rows)
+        if not written:
+            writer.write_table(schema.empty_table())
+    return written
+
+
+def export(conn, name, fmt, out, start=None, stop=None, chunk_size=10000):
+    if fmt == 'csv':
+        return write_csv(conn, DATASETS[name], out, start, stop, chunk_size)
+    if fmt == 'parquet':
+        return write_parquet(conn, DATASETS[name], out, start, stop, chunk_size)
+    raise ValueError(f"Unknown export format {fmt!r}; expected one of {FORMATS}")
+
+
+# The whole export as bytes, e.g. for a download button. Rows still go through in chunks;
+# only the encoded file (compressed, for Parquet) is held in memory.
+def export_bytes(conn, name, fmt, start=None, stop=None, chunk_size=10000):
+    out = io.BytesIO()
+    if fmt == 'csv':
+        text = io.TextIOWrapper(out, encoding='utf-8', newline='')
+        export(conn, name, fmt, text, start, stop, chunk_size)
+        text.flush()
+        text.detach()
+    else:
+        export(conn, name, fmt, out, start, stop, chunk_size)
+    return out.getvalue()
+
+
+# Headless entry point, e.g.
+#   python -m coffeeshop.export sales --format parquet --from 2025-01-01 --to 2025-12-31 -o sales-2025.parquet
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export shop data as CSV or Parquet.")
+    parser.add_argument('dataset', choices=sorted(DATASETS))
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--from', dest='first', type=date.fromisoformat, help="first day to include (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='last', type=date.fromisoformat, help="last day to include (YYYY-MM-DD)")
+    parser.add_argument('-o', '--output', help="file to write; CSV goes to standard output if omitted")
+    parser.add_argument('--db', default=db.DB_PATH, help="database file")
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args(argv)
+    if args.format == 'parquet' and not args.output:
+        parser.error("--output is required for Parquet")
+
+    start = datetime.combine(args.first, datetime.min.time()) if args.first else None
+    stop = datetime.combine(args.last + timedelta(days=1), datetime.min.time()) if args.last else None
+    conn = db.connect(args.db)
+    migrations.migrate(conn)
+    if args.format == 'parquet':
+        written = export(conn, args.dataset, 'parquet', args.output, start, stop, args.chunk_size)
+    elif args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as out:
+            written = export(conn, args.dataset, 'csv', out, start, stop, args.chunk_size)
+    else:
+        written = export(conn, args.dataset, 'csv', sys.stdout, start, stop, args.chunk_size)
+    print(f"Exported {written} {args.dataset} rows", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import threading
+
+import numpy as np
+
+from coffeeshop.aggregates import SECONDS_PER_DAY, RecordedRows
+from coffeeshop.ledger import to_epoch
+
+SECONDS_PER_HOUR = 3600
+HOURS_PER_DAY = 24
+
+
+# Weekday of a day key (days since 1970-01-01, a Thursday), Monday = 0
+def weekday(day):
+    return (day + 3) % 7
+
+
+# Ingredient demand per store, weekday and hour of day, learned from the order ledger.
+#
+# Consumption is folded into one bucket per (store, day, hour of day) for the
+# last `window_days` days, kept in a ring indexed by day, and into a running
+# (store, weekday, hour) sum of that ring. Each committed order line adds its
+# recipe usage to both; when the window moves on, the day that drops out is
+# subtracted from the weekly sum, so old orders are never rescanned. A
+# forecast divides the weekly sum by how many of each weekday the window has
+# seen and walks the resulting hourly rates forward from now, so every query
+# costs O(stores x hours x ingredients) however many orders there are.
+# Free lines are counted: a RM0.00 drink still uses stock.
+class DemandForecast:
+    def __init__(self, engine, stores, window_days=28):
+        self.engine = engine
+        self.stores = list(stores)
+        self.ingredients = list(engine.ingredients)
+        self.window_days = int(window_days)
+        shape = (len(self.stores), HOURS_PER_DAY, len(self.ingredients))
+        self.days = np.zeros((self.window_days,) + shape)
+        self.day_of_slot = np.full(self.window_days, -1, dtype=np.int64)
+        self.weekly = np.zeros((len(self.stores), 7) + shape[1:])
+        self.first_day = None
+        self.last_day = None
+        self.recorded = RecordedRows()
+        self._lock = threading.Lock()
+
+    # Move the window forward so it ends on `day`, dropping the days that fall out
+    def _advance(self, day):
+        if self.last_day is not None and day <= self.last_day:
+            return
+        start = day - self.window_days + 1 if self.last_day is None else max(self.last_day + 1, day - self.window_days + 1)
+        for new_day in range(start, day + 1):
+            slot = new_day % self.window_days
+            old_day = self.day_of_slot[slot]
+            if old_day >= 0:
+                self.weekly[:, weekday(old_day)] -= self.days[slot]
+                self.days[slot] = 0
+            self.day_of_slot[slot] = new_day
+        self.last_day = day
+
+    # Fold one committed ledger row into the buckets
+    def record(self, ledger, row):
+        line = ledger.codes(row, row + 1)
+        usage = self.engine.usage[self.engine.combination(line['coffee'], line['size'], line['add_ons'])[0]] \
+            * int(line['quantity'][0])
+        seconds = int(line['time'][0])
+        day, hour = seconds // SECONDS_PER_DAY, seconds % SECONDS_PER_DAY // SECONDS_PER_HOUR
+        store = int(line['store'][0])
+        with self._lock:
+            if not self.recorded.add(row):
+                return
+            self.first_day = day if self.first_day is None else min(self.first_day, day)
+            self._advance(day)
+            if day <= self.last_day - self.window_days:
+                return
+            self.days[day % self.window_days, store, hour] += usage
+            self.weekly[store, weekday(day), hour] += usage
+
+    # Build the buckets from scratch with one vectorized pass over the ledger's recent rows
+    @classmethod
+    def from_ledger(cls, ledger, engine, stores, window_days=28):
+        forecast = cls(engine, stores, window_days)
+        columns = ledger.codes()
+        forecast.recorded = RecordedRows(len(columns['time']))
+        if not len(columns['time']):
+            return forecast
+
+        days = columns['time'] // SECONDS_PER_DAY
+        forecast.first_day = int(days.min())
+        forecast._advance(int(days.max()))
+        recent = days > forecast.last_day - forecast.window_days
+        days = days[recent]
+        hours = columns['time'][recent] % SECONDS_PER_DAY // SECONDS_PER_HOUR
+        usage = engine.usage[engine.combination(columns['coffee'][recent], columns['size'][recent], columns['add_ons'][recent])] \
+            * columns['quantity'][recent].astype(np.float64)[:, None]
+
+        n_stores = len(forecast.stores)
+        bucket = ((days % forecast.window_days) * n_stores + columns['store'][recent]) * HOURS_PER_DAY + hours
+        n_buckets = forecast.window_days * n_stores * HOURS_PER_DAY
+        forecast.days[:] = np.stack(
+            [np.bincount(bucket, weights=usage[:, i], minlength=n_buckets) for i in range(usage.shape[1])], axis=1
+        ).reshape(forecast.days.shape)
+        for slot, day in enumerate(forecast.day_of_slot):
+            forecast.weekly[:, weekday(day)] += forecast.days[slot]
+        return forecast
+
+    # Average use per (store, weekday, hour, ingredient) over the hours the window has seen.
+    # Each (weekday, hour) is divided by how many of those hours have actually gone by: on the
+    # day of `now` only the hours up to `now` count, the current one by the fraction elapsed,
+    # so the hours still to come today do not water down their weekday's average.
+    def hourly_rates(self, now=None):
+        with self._lock:
+            if self.first_day is None:
+                return np.zeros_like(self.weekly)
+            seen = np.arange(max(self.first_day, self.last_day - self.window_days + 1), self.last_day + 1)
+            per_hour = np.repeat(np.bincount(weekday(seen), minlength=7)[:, None], HOURS_PER_DAY, axis=1).astype(np.float64)
+            if now is not None:
+                seconds = to_epoch(now)
+                today = seconds // SECONDS_PER_DAY
+                if seen[0] <= today <= seen[-1]:
+                    elapsed = np.clip(seconds % SECONDS_PER_DAY / SECONDS_PER_HOUR - np.arange(HOURS_PER_DAY), 0, 1)
+                    per_hour[weekday(today)] -= 1 - elapsed
+            # A weekday seen only today so far is averaged over the whole hour, not a sliver of it
+            return self.weekly / np.maximum(per_hour, 1)[None, :, :, None]
+
+    # What the recent order mix used per cup, as {ingredient: amount}; None before any cups were sold
+    def usage_per_cup(self):
+        with self._lock:
+            totals = self.weekly.sum(axis=(0, 1, 2))
+        cups = totals[self.ingredients.index('cups')] if 'cups' in self.ingredients else 0
+        if cups <= 0:
+            return None
+        return dict(zip(self.ingredients, totals / cups))
+
+    # Hourly rates for the next `hours` hours from `now` as a (store, hour, ingredient) array,
+    # with when each of those hours starts and how much of it is left, in hours from now
+    def _ahead(self, now, hours):
+        seconds = to_epoch(now)
+        with self._lock:
+            self._advance(seconds // SECONDS_PER_DAY)
+        rates = self.hourly_rates(now).reshape(len(self.stores), 7 * HOURS_PER_DAY, len(self.ingredients))
+        elapsed = seconds % SECONDS_PER_HOUR / SECONDS_PER_HOUR
+        hour_of_week = weekday(seconds // SECONDS_PER_DAY) * HOURS_PER_DAY + seconds % SECONDS_PER_DAY // SECONDS_PER_HOUR
+        # Starting part-way through an hour, the window ends part-way through the hour after the last
+        steps = np.arange(hours + (elapsed > 0))
+        starts = np.maximum(steps - elapsed, 0)
+        durations = np.minimum(steps + 1 - elapsed, hours) - starts
+        return rates[:, (hour_of_week + steps) % (7 * HOURS_PER_DAY)], starts, durations
+
+    # Expected use per (store, ingredient) over the next `hours` hours
+    def demand(self, now, hours):
+        rates, _, durations = self._ahead(now, hours)
+        return (rates * durations[None, :, None]).sum(axis=1)
+
+    # Hours until each (store, ingredient) in `levels` runs out at the forecast rates;
+    # inf if it lasts beyond `horizon_hours`
+    def hours_to_stockout(self, levels, now, horizon_hours=14 * HOURS_PER_DAY):
+        levels = np.asarray(levels, dtype=np.float64)
+        rates, starts, durations = self._ahead(now, horizon_hours)
+        used = np.cumsum(rates * durations[None, :, None], axis=1)
+        out = used >= levels[:, None, :]
+        step = out.argmax(axis=1)
+        stores, ingredients = np.indices(step.shape)
+        before = np.where(step > 0, used[stores, step - 1, ingredients], 0)
+        rate = rates[stores, step, ingredients]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hours = starts[step] + np.where(rate > 0, (levels - before) / rate, 0)
+        hours = np.where(out.any(axis=1), hours, np.inf)
+        return np.where(levels <= 0, 0, hours)
+
+    # Stock to buy so every store covers the next `cover_hours`, in whole packs, and what it costs.
+    # `pack_sizes` and `pack_prices` are {ingredient: units per pack / price per pack}.
+    def restock_plan(self, levels, now, cover_hours, pack_sizes, pack_prices):
+        short = np.maximum(self.demand(now, cover_hours) - np.asarray(levels, dtype=np.float64), 0)
+        pack = np.array([pack_sizes[ingredient] for ingredient in self.ingredients], dtype=np.float64)
+        price = np.array([pack_prices[ingredient] for ingredient in self.ingredients], dtype=np.float64)
+        packs = np.ceil(short / pack)
+        return (packs * pack).astype(np.int64), packs * price
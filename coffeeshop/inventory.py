@@ -0,0 +1,154 @@
+import itertools
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+
+# The shop's original single inventory belongs to this store
+DEFAULT_STORE = "Ampang Park"
+
+# Starting stock for each store (coffee beans and sugar in grams, milk in ml)
+STORE_INVENTORY_DEFAULTS = {
+    "Ampang Park": {"coffee_beans": 1000, "milk": 1000, "sugar": 1000, "cups": 500},
+    "KLCC": {"coffee_beans": 800, "milk": 800, "sugar": 800, "cups": 400},
+    "Persiaran TRX": {"coffee_beans": 1200, "milk": 1200, "sugar": 1200, "cups": 600},
+    "KLIA 1": {"coffee_beans": 900, "milk": 900, "sugar": 900, "cups": 450},
+}
+
+
+class InsufficientStock(Exception):
+    def __init__(self, store, ingredient, needed, available):
+        super().__init__(f"{store} needs {needed:g} {ingredient} but only has {available:g}")
+        self.store = store
+        self.ingredient = ingredient
+        self.needed = needed
+        self.available = available
+
+
+# Stock held for one basket between the check and the payment
+class Reservation:
+    def __init__(self, reservation_id, store, amounts):
+        self.id = reservation_id
+        self.store = store
+        self.amounts = amounts
+
+
+# Read-only dict-like view of one store's row, for code that reads levels by ingredient name
+class StoreLevels(Mapping):
+    def __init__(self, inventory, store):
+        self._inventory = inventory
+        self._row = inventory.store_index(store)
+
+    def __getitem__(self, ingredient):
+        return int(self._inventory.levels[self._row, self._inventory.ingredient_index(ingredient)])
+
+    def __iter__(self):
+        return iter(self._inventory.ingredients)
+
+    def __len__(self):
+        return len(self._inventory.ingredients)
+
+
+# Process-wide inventory for every store as one (store x ingredient) array.
+#
+# Every session reads the same array, so memory does not grow with the number
+# of browser sessions, and cross-store questions are single vectorized
+# operations. Each store has its own lock: a basket's total ingredient
+# requirement, worked out in one pass by the consumption engine, is checked
+# and taken out of every ingredient under that lock (compare-and-decrement),
+# so two tills at the same store can never both pass the check for the last
+# of the milk, while other stores carry on in parallel. Reserved stock stays
+# held until the order is committed, which returns the amounts to persist,
+# or released, which puts it back. Restocking goes through adjust().
+class StoreInventory:
+    def __init__(self, levels, engine):
+        self.stores = list(levels)
+        self.ingredients = list(engine.ingredients)
+        self.engine = engine
+        self.levels = np.array([[levels[store][ingredient] for ingredient in self.ingredients] for store in self.stores],
+                               dtype=np.int64)
+        self.held = {}
+        self._store_rows = {store: row for row, store in enumerate(self.stores)}
+        self._ingredient_columns = {ingredient: column for column, ingredient in enumerate(self.ingredients)}
+        self._locks = [threading.Lock() for _ in self.stores]
+        self._held_lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def store_index(self, store):
+        return self._store_rows[store]
+
+    def ingredient_index(self, ingredient):
+        return self._ingredient_columns[ingredient]
+
+    def view(self, store):
+        return StoreLevels(self, store)
+
+    # Total ingredients for basket lines given as (coffee type, size, add-ons, quantity), as an array
+    def requirement(self, lines):
+        lines = list(lines)
+        totals = self.engine.totals(
+            [self.engine.coffee_types.index(coffee_type) for coffee_type, _, _, _ in lines],
+            [self.engine.sizes.index(size) for _, size, _, _ in lines],
+            [sum(1 << self.engine.add_ons.index(add_on) for add_on in add_ons) for _, _, add_ons, _ in lines],
+            [quantity for _, _, _, quantity in lines]
+        )
+        # Recipes are whole grams, millilitres and cups
+        return np.rint([totals[ingredient] for ingredient in self.ingredients]).astype(np.int64)
+
+    # Take `amounts` out of the store's stock if every ingredient covers it, otherwise change nothing
+    def reserve(self, store, amounts):
+        row = self.store_index(store)
+        amounts = np.asarray(amounts, dtype=np.int64)
+        with self._locks[row]:
+            short = np.flatnonzero(self.levels[row] < amounts)
+            if len(short):
+                column = short[0]
+                raise InsufficientStock(store, self.ingredients[column], amounts[column], self.levels[row, column])
+            self.levels[row] -= amounts
+        reservation = Reservation(next(self._ids), store, amounts)
+        with self._held_lock:
+            self.held[reservation.id] = reservation
+        return reservation
+
+    # Put a reservation's stock back, e.g. when payment fails
+    def release(self, reservation):
+        with self._held_lock:
+            if self.held.pop(reservation.id, None) is None:
+                return False
+        row = self.store_index(reservation.store)
+        with self._locks[row]:
+            self.levels[row] += reservation.amounts
+        return True
+
+    # The order went through: the stock stays taken. Returns {ingredient: amount} to persist.
+    def commit(self, reservation):
+        with self._held_lock:
+            if self.held.pop(reservation.id, None) is None:
+                raise KeyError(f"Reservation {reservation.id} is not held")
+        return self.amounts(reservation)
+
+    # A reservation's amounts as {ingredient: amount}, leaving out ingredients it does not use
+    def amounts(self, reservation):
+        return {ingredient: int(amount) for ingredient, amount in zip(self.ingredients, reservation.amounts) if amount}
+
+    # Overwrite a store's row, e.g. with the levels its shard worker reported
+    def set_levels(self, store, levels):
+        row = self.store_index(store)
+        with self._locks[row]:
+            self.levels[row] = [levels[ingredient] for ingredient in self.ingredients]
+
+    def adjust(self, store, ingredient, amount):
+        row, column = self.store_index(store), self.ingredient_index(ingredient)
+        with self._locks[row]:
+            self.levels[row, column] += amount
+            return int(self.levels[row, column])
+
+    # Store with the least of `ingredient` left, e.g. which store runs out of milk first
+    def lowest(self, ingredient):
+        return self.stores[int(np.argmin(self.levels[:, self.ingredient_index(ingredient)]))]
+
+    # How many cups every store can still make, limited by its scarcest ingredient
+    def cups_left(self, per_cup):
+        per_cup = np.array([per_cup.get(ingredient, 0) for ingredient in self.ingredients], dtype=np.float64)
+        used = per_cup > 0
+        return np.floor(self.levels[:, used] / per_cup[used]).min(axis=1).astype(np.int64)
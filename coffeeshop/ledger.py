@@ -0,0 +1,252 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from coffeeshop.inventory import DEFAULT_STORE
+
+# Order statuses in lifecycle order; stored as small int codes in the ledger
+ORDER_STATUSES = ['Being Processed', 'Ready', 'Picked Up']
+# Statuses of orders that are still on a board; picked-up orders are only history
+QUEUED_STATUSES = ['Being Processed', 'Ready']
+
+# Column order used by every sales DataFrame in the app
+LEDGER_COLUMNS = ['Order Number', 'Customer Name', 'Coffee Type', 'Quantity', 'Size', 'Add-ons', 'Price', 'Time', 'Status',
+                  'Store']
+
+
+# Convert a naive datetime (local wall clock) to int64 epoch seconds and back
+def to_epoch(moment):
+    if isinstance(moment, (int, np.integer)):
+        return int(moment)
+    return int(np.datetime64(moment, 's').astype(np.int64))
+
+
+def from_epoch(seconds):
+    return np.datetime64(int(seconds), 's').item()
+
+
+# Append-only columnar store of order lines.
+#
+# Every column is a typed NumPy buffer that is preallocated in chunks and
+# doubled when full, so appending an order line is amortized O(1) instead of
+# copying the whole table like `pd.concat` does. Coffee type, size, add-ons
+# and status are kept as small integer codes and only turned back into
+# labels (as zero-copy Categoricals) when a DataFrame view is requested.
+# The store that took each line is a code too; lines with no known store
+# belong to the first store.
+#
+# Orders that are still active are also kept in one FIFO queue per status
+# (order number -> its rows in that status), updated on every append and
+# status change, so the kitchen and pickup boards only touch active orders.
+class OrderLedger:
+    def __init__(self, coffee_types, sizes, add_ons, statuses=ORDER_STATUSES, capacity=1024,
+                 queued_statuses=QUEUED_STATUSES, stores=(DEFAULT_STORE,)):
+        self.coffee_types = list(coffee_types)
+        self.sizes = list(sizes)
+        self.add_ons = list(add_ons)
+        self.statuses = list(statuses)
+        self.stores = list(stores)
+
+        self._coffee_codes = {name: code for code, name in enumerate(self.coffee_types)}
+        self._size_codes = {name: code for code, name in enumerate(self.sizes)}
+        self._status_codes = {name: code for code, name in enumerate(self.statuses)}
+        self._store_codes = {name: code for code, name in enumerate(self.stores)}
+        self._add_on_bits = {name: 1 << bit for bit, name in enumerate(self.add_ons)}
+
+        # Label for every possible add-on bitmask, e.g. 3 -> "Extra sugar, Extra milk"
+        self.add_on_labels = [
+            ', '.join(name for bit, name in enumerate(self.add_ons) if mask & (1 << bit))
+            for mask in range(1 << len(self.add_ons))
+        ]
+
+        self._size = 0
+        # True while order times are non-decreasing, which lets time_range() binary-search
+        self._time_sorted = True
+        self._queues = {self._status_codes[status]: OrderedDict() for status in queued_statuses}
+        # Sessions append and change statuses from their own threads
+        self._lock = threading.RLock()
+        self._allocate(max(int(capacity), 1))
+
+    def _allocate(self, capacity):
+        self._order_number = np.zeros(capacity, dtype=np.int32)
+        self._customer = np.empty(capacity, dtype=object)
+        self._coffee = np.zeros(capacity, dtype=np.int8)
+        self._quantity = np.zeros(capacity, dtype=np.int16)
+        self._size_code = np.zeros(capacity, dtype=np.int8)
+        self._add_on_mask = np.zeros(capacity, dtype=np.int8)
+        self._price = np.zeros(capacity, dtype=np.float64)
+        self._time = np.zeros(capacity, dtype=np.int64)
+        self._status = np.zeros(capacity, dtype=np.int8)
+        self._store = np.zeros(capacity, dtype=np.int8)
+
+    def _grow(self):
+        old = (self._order_number, self._customer, self._coffee, self._quantity, self._size_code,
+               self._add_on_mask, self._price, self._time, self._status, self._store)
+        self._allocate(len(self._order_number) * 2)
+        new = (self._order_number, self._customer, self._coffee, self._quantity, self._size_code,
+               self._add_on_mask, self._price, self._time, self._status, self._store)
+        for old_column, new_column in zip(old, new):
+            new_column[:self._size] = old_column[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return len(self._order_number)
+
+    def add_on_mask(self, add_ons):
+        mask = 0
+        for add_on in add_ons:
+            mask |= self._add_on_bits[add_on]
+        return mask
+
+    # Append one order line and return its row index
+    def append(self, order_number, customer_name, coffee_type, quantity, size, add_ons, price, time,
+               status='Being Processed', store=None):
+        with self._lock:
+            if self._size == len(self._order_number):
+                self._grow()
+
+            row = self._size
+            self._order_number[row] = order_number
+            self._customer[row] = customer_name
+            self._coffee[row] = self._coffee_codes[coffee_type]
+            self._quantity[row] = quantity
+            self._size_code[row] = self._size_codes[size]
+            self._add_on_mask[row] = self.add_on_mask(add_ons)
+            self._price[row] = price
+            self._time[row] = to_epoch(time)
+            if row and self._time[row] < self._time[row - 1]:
+                self._time_sorted = False
+            self._status[row] = self._status_codes[status]
+            self._store[row] = self._store_codes.get(store, 0)
+            self._enqueue(row)
+            self._size += 1
+            return row
+
+    def _enqueue(self, row):
+        queue = self._queues.get(self._status[row])
+        if queue is not None:
+            queue.setdefault(int(self._order_number[row]), []).append(row)
+
+    def _dequeue(self, row):
+        queue = self._queues.get(self._status[row])
+        if queue is not None:
+            order_number = int(self._order_number[row])
+            rows = queue.get(order_number, [])
+            if row in rows:
+                rows.remove(row)
+                if not rows:
+                    del queue[order_number]
+
+    # Rows with start <= time < stop. Orders arrive in time order, so this is normally
+    # two binary searches returning a slice; out-of-order data falls back to a scan.
+    def time_range(self, start, stop):
+        times = self._time[:self._size]
+        low, high = to_epoch(start), to_epoch(stop)
+        if self._time_sorted:
+            return slice(int(np.searchsorted(times, low, 'left')), int(np.searchsorted(times, high, 'left')))
+        return np.flatnonzero((times >= low) & (times < high))
+
+    def first_time(self):
+        if not self._size:
+            return None
+        return from_epoch(self._time[0] if self._time_sorted else self._time[:self._size].min())
+
+    def status(self, row):
+        return self.statuses[self._status[row]]
+
+    # Move a line to `status`. With `expected`, only a line that is still in that status
+    # moves, checked under the lock; returns whether the line moved.
+    def set_status(self, row, status, expected=None):
+        if not 0 <= row < self._size:
+            raise IndexError(f"Order line {row} does not exist")
+        with self._lock:
+            if expected is not None and self._status[row] != self._status_codes[expected]:
+                return False
+            self._dequeue(row)
+            self._status[row] = self._status_codes[status]
+            self._enqueue(row)
+            return True
+
+    # Orders currently in `status` as (order number, rows) pairs, oldest first
+    def queue(self, status):
+        with self._lock:
+            return [(order_number, list(rows)) for order_number, rows in self._queues[self._status_codes[status]].items()]
+
+    # Rows of every order currently in `status`, oldest order first
+    def queued_rows(self, status):
+        with self._lock:
+            return np.array([row for rows in self._queues[self._status_codes[status]].values() for row in rows], dtype=np.int64)
+
+    # True while some line of the order is in `status`
+    def in_queue(self, status, order_number):
+        with self._lock:
+            return order_number in self._queues[self._status_codes[status]]
+
+    # True while any line of the order is still on a board
+    def is_active(self, order_number):
+        with self._lock:
+            return any(order_number in queue for queue in self._queues.values())
+
+    # An active order's rows by status, e.g. {'Being Processed': [12], 'Ready': [11]}; empty once it is picked up
+    def active_rows(self, order_number):
+        with self._lock:
+            return {self.statuses[code]: list(queue[order_number])
+                    for code, queue in self._queues.items() if order_number in queue}
+
+    def row(self, row):
+        if not 0 <= row < self._size:
+            raise IndexError(f"Order line {row} does not exist")
+        return {
+            'Order Number': int(self._order_number[row]),
+            'Customer Name': self._customer[row],
+            'Coffee Type': self.coffee_types[self._coffee[row]],
+            'Quantity': int(self._quantity[row]),
+            'Size': self.sizes[self._size_code[row]],
+            'Add-ons': self.add_on_labels[self._add_on_mask[row]],
+            'Price': float(self._price[row]),
+            'Time': from_epoch(self._time[row]),
+            'Status': self.status(row),
+            'Store': self.stores[self._store[row]],
+        }
+
+    # Typed code arrays (views, not copies) for rows [start, stop)
+    def codes(self, start=0, stop=None):
+        stop = self._size if stop is None else min(stop, self._size)
+        return {
+            'order_number': self._order_number[start:stop],
+            'coffee': self._coffee[start:stop],
+            'quantity': self._quantity[start:stop],
+            'size': self._size_code[start:stop],
+            'add_ons': self._add_on_mask[start:stop],
+            'price': self._price[start:stop],
+            'time': self._time[start:stop],
+            'status': self._status[start:stop],
+            'store': self._store[start:stop],
+        }
+
+    # DataFrame over the filled part of the buffers, optionally limited to `rows`
+    # (a slice or an index array such as time_range() returns). With a slice the
+    # numeric columns are views of the ledger, so the order data is not copied.
+    def frame(self, rows=slice(None)):
+        # pandas is only needed for these views, so taking orders does not pay for importing it
+        import pandas as pd
+
+        n = self._size
+        # Keep ledger row numbers as the index so callers can pass them back to set_status()
+        index = range(n)[rows] if isinstance(rows, slice) else rows
+        return pd.DataFrame({
+            'Order Number': self._order_number[:n][rows],
+            'Customer Name': self._customer[:n][rows],
+            'Coffee Type': pd.Categorical.from_codes(self._coffee[:n][rows], categories=self.coffee_types),
+            'Quantity': self._quantity[:n][rows],
+            'Size': pd.Categorical.from_codes(self._size_code[:n][rows], categories=self.sizes),
+            'Add-ons': pd.Categorical.from_codes(self._add_on_mask[:n][rows], categories=self.add_on_labels),
+            'Price': self._price[:n][rows],
+            'Time': self._time[:n][rows].view('datetime64[s]'),
+            'Status': pd.Categorical.from_codes(self._status[:n][rows], categories=self.statuses),
+            'Store': pd.Categorical.from_codes(self._store[:n][rows], categories=self.stores),
+        }, index=index, columns=LEDGER_COLUMNS, copy=False)
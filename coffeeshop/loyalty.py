@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+
+from coffeeshop.ledger import to_epoch
+
+INSERT_HISTORY = "INSERT INTO loyalty_points_history (username, points, description, timestamp, ts) VALUES (?, ?, ?, ?, ?)"
+CREDIT_BALANCE = "UPDATE customers SET loyalty_points = COALESCE(loyalty_points, 0) + ? WHERE username=?"
+# Only succeeds when the customer has enough points, so two tills can't both spend the same balance
+DEBIT_BALANCE = '''UPDATE customers SET loyalty_points = COALESCE(loyalty_points, 0) - ?
+                   WHERE username=? AND COALESCE(loyalty_points, 0) >= ?'''
+
+
+# The TEXT timestamp shown to customers and the same wall-clock moment as epoch
+# seconds, which is what the history is sorted and range-filtered on
+def _timestamp():
+    now = datetime.now().replace(microsecond=0)
+    return now.strftime("%Y-%m-%d %H:%M:%S"), to_epoch(now)
+
+
+# Add points to a customer's balance and record the history row in the same transaction.
+# Returns False when the customer does not exist.
+def credit_points(conn, username, points, description="Points earned from a purchase"):
+    with conn:
+        if conn.execute(CREDIT_BALANCE, (points, username)).rowcount == 0:
+            return False
+        conn.execute(INSERT_HISTORY, (username, points, description, *_timestamp()))
+    return True
+
+
+# Spend points if the balance covers them. The check and the deduction are one
+# conditional UPDATE, so concurrent redemptions can never take the balance below zero.
+def redeem_points(conn, username, points, description="Points redeemed for a discount"):
+    with conn:
+        if conn.execute(DEBIT_BALANCE, (points, username, points)).rowcount == 0:
+            return False
+        conn.execute(INSERT_HISTORY, (username, -points, description, *_timestamp()))
+    return True
+
+
+# Credit many customers in one commit, e.g. an end-of-day promotion.
+# `credits` is an iterable of (username, points) pairs; returns how many balances changed.
+def credit_points_bulk(conn, credits, description):
+    credits = [(username, points) for username, points in credits if points]
+    timestamp, ts = _timestamp()
+    with conn:
+        updated = conn.executemany(CREDIT_BALANCE, [(points, username) for username, points in credits]).rowcount
+        conn.executemany(
+            "INSERT INTO loyalty_points_history (username, points, description, timestamp, ts) "
+            "SELECT ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM customers WHERE username=?)",
+            [(username, points, description, timestamp, ts, username) for username, points in credits]
+        )
+    return updated
+
+
+# Points each customer earned from purchases on `day` (a date), for promotions that
+# match or multiply a day's earnings such as Sunday's double points
+def points_earned_on(conn, day, description="Points earned from a purchase"):
+    return conn.execute(
+        '''SELECT username, SUM(points) FROM loyalty_points_history
+           WHERE description=? AND ts >= ? AND ts < ? GROUP BY username''',
+        (description, to_epoch(day), to_epoch(day + timedelta(days=1)))
+    ).fetchall()
+
+
+# Newest-first page of a customer's history using keyset pagination on (ts, id).
+# Returns the rows and the cursor for the next page (None when there are no more rows),
+# so every page is an index range scan no matter how long the history is.
+def history_page(conn, username, cursor=None, page_size=25):
+    if cursor is None:
+        rows = conn.execute(
+            '''SELECT id, points, description, timestamp, ts FROM loyalty_points_history
+               WHERE username=? ORDER BY ts DESC, id DESC LIMIT ?''',
+            (username, page_size)
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            '''SELECT id, points, description, timestamp, ts FROM loyalty_points_history
+               WHERE username=? AND (ts, id) < (?, ?) ORDER BY ts DESC, id DESC LIMIT ?''',
+            (username, cursor[0], cursor[1], page_size)
+        ).fetchall()
+    next_cursor = (rows[-1][4], rows[-1][0]) if len(rows) == page_size else None
+    return [(points, description, timestamp) for _, points, description, timestamp, _ in rows], next_cursor
+
+
+# Fold history rows added since the last run into the per-customer summary table.
+# Only the new rows are read, so running this periodically stays cheap on a large history.
+# The write lock is taken before the watermark is read, so two compactions (e.g. from two
+# server processes) cannot both fold in the same rows.
+def compact_summary(conn):
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        last_id = conn.execute("SELECT last_history_id FROM loyalty_summary_state WHERE id=0").fetchone()
+        last_id = last_id[0] if last_id else 0
+        newest_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM loyalty_points_history").fetchone()[0]
+        if newest_id <= last_id:
+            return 0
+        conn.execute(
+            '''INSERT INTO loyalty_summary (username, total_earned, total_redeemed, entries, last_activity)
+               SELECT username,
+                      SUM(CASE WHEN points > 0 THEN points ELSE 0 END),
+                      SUM(CASE WHEN points < 0 THEN -points ELSE 0 END),
+                      COUNT(*),
+                      MAX(timestamp)
+               FROM loyalty_points_history WHERE id > ? AND id <= ? GROUP BY username
+               ON CONFLICT(username) DO UPDATE SET
+                   total_earned = total_earned + excluded.total_earned,
+                   total_redeemed = total_redeemed + excluded.total_redeemed,
+                   entries = entries + excluded.entries,
+                   last_activity = MAX(last_activity, excluded.last_activity)''',
+            (last_id, newest_id)
+        )
+        conn.execute("INSERT OR REPLACE INTO loyalty_summary_state (id, last_history_id) VALUES (0, ?)", (newest_id,))
+    return newest_id - last_id
+
+
+# Lifetime totals for one customer as of the last compaction
+def summary(conn, username):
+    row = conn.execute(
+        "SELECT total_earned, total_redeemed, entries, last_activity FROM loyalty_summary WHERE username=?", (username,)
+    ).fetchone()
+    return row or (0, 0, 0, None)
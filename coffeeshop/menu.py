@@ -0,0 +1,81 @@
+import hashlib
+from datetime import datetime
+
+# The shop's menu, recipes, daily offers and restock prices. Everything that
+# prices or fulfils an order (the Streamlit pages and coffeeshop.core) reads them from here.
+
+# Ingredient usage per coffee type and size
+ingredient_usage = {
+    'Americano': {
+        'small': {'coffee_beans': 9, 'milk': 10, 'sugar': 5},
+        'medium': {'coffee_beans': 12, 'milk': 10, 'sugar': 5},
+        'large': {'coffee_beans': 15, 'milk': 10, 'sugar': 5}
+    },
+    'Cappuccino': {
+        'small': {'coffee_beans': 9, 'milk': 60, 'sugar': 5},
+        'medium': {'coffee_beans': 12, 'milk': 80, 'sugar': 5},
+        'large': {'coffee_beans': 15, 'milk': 100, 'sugar': 5}
+    },
+    'Latte': {
+        'small': {'coffee_beans': 9, 'milk': 100, 'sugar': 5},
+        'medium': {'coffee_beans': 12, 'milk': 150, 'sugar': 5},
+        'large': {'coffee_beans': 15, 'milk': 200, 'sugar': 5}
+    },
+    'Caramel Macchiato': {
+        'small': {'coffee_beans': 9, 'milk': 90, 'sugar': 5},
+        'medium': {'coffee_beans': 12, 'milk': 130, 'sugar': 5},
+        'large': {'coffee_beans': 15, 'milk': 180, 'sugar': 5}
+    }
+}
+
+# Extra usage for additional sugar and milk
+extra_usage = {
+    'milk': 30,   # Extra 30ml of milk for "Extra milk"
+    'sugar': 5    # Extra 5g of sugar for "Extra sugar"
+}
+
+# Coffee Menu Prices
+coffee_menu = {
+    'Americano': {'small': 3.75, 'medium': 5.00, 'large': 7.50},
+    'Cappuccino': {'small': 5.00, 'medium': 6.50, 'large': 8.00},
+    'Latte': {'small': 5.25, 'medium': 6.75, 'large': 8.25},
+    'Caramel Macchiato': {'small': 4.50, 'medium': 7.00, 'large': 9.50}
+}
+
+# Prices for add-ons
+add_on_prices = {
+    'Extra sugar': 0.70,  # Extra 5g of sugar
+    'Extra milk': 0.90,   # Extra 30ml of milk
+}
+
+# Define daily offers for each day of the week
+daily_offers = {
+    "Monday": {"description": "10% off on all lattes", "coffee_type": "Latte", "discount": 0.1},
+    "Tuesday": {"description": "10% off on all cappuccinos", "coffee_type": "Cappuccino", "discount": 0.1},
+    "Wednesday": {"description": "Buy 1 Get 1 Free on all Americanos", "coffee_type": "Americano", "discount": "bogo"},
+    "Thursday": {"description": "10% off on all americano", "coffee_type": "Americano", "discount": 0.1},
+    "Friday": {"description": "10% off on all Caramel Macchiatos", "coffee_type": "Caramel Macchiato", "discount": 0.1},
+    "Saturday": {"description": "Relax and enjoy - no special offers today!", "coffee_type": "any", "discount": None},
+    "Sunday": {"description": "Double loyalty points on all purchases", "coffee_type": "all", "discount": "double_points"}
+}
+
+# Define prices for restock items
+restock_prices = {
+    'coffee_beans': 1.20,  # RM per 100g
+    'milk': 0.70,          # RM per 100ml
+    'sugar': 0.20,         # RM per 100g
+    'cups': 0.02           # RM per cup
+}
+# How much of each item one restock price buys
+RESTOCK_UNITS = {'coffee_beans': 100, 'milk': 100, 'sugar': 100, 'cups': 1}
+
+
+# Today's offer (or the one for `moment`), or None
+def daily_offer(moment=None):
+    return daily_offers.get((moment or datetime.now()).strftime("%A"))
+
+
+# Fingerprint of the static menu and pricing data. Any price or offer change gives a new
+# value, which invalidates every cached page fragment rendered from the old prices.
+def version():
+    return hashlib.sha1(repr((coffee_menu, add_on_prices, daily_offers, restock_prices)).encode()).hexdigest()
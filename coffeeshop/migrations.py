@@ -0,0 +1,301 @@
+from datetime import datetime
+
+from coffeeshop import order_numbers
+from coffeeshop.inventory import DEFAULT_STORE
+
+# Versioned schema migrations.
+#
+# Every step is (version, description, function). `migrate()` applies the
+# steps newer than the version recorded in `schema_version`, in order, so the
+# app only has to check the version once at startup instead of issuing
+# CREATE TABLE IF NOT EXISTS on every rerun. Steps are written to be safe to
+# re-run if the process dies half-way through one.
+
+
+# Tables that existed before the schema was versioned. The DDL is the fixed
+# version; a database created by older code keeps its tables (IF NOT EXISTS)
+# and gets repaired by the later steps.
+def _base_tables(conn, batch_size):
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute('''CREATE TABLE IF NOT EXISTS customers (
+                    id INTEGER PRIMARY KEY,
+                    username TEXT UNIQUE,
+                    password TEXT,
+                    favorite_order TEXT,
+                    loyalty_points INTEGER DEFAULT 0
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS admins (
+                    id INTEGER PRIMARY KEY,
+                    username TEXT UNIQUE,
+                    password TEXT
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS loyalty_points_history (
+                     id INTEGER PRIMARY KEY,
+                     username TEXT,
+                     points INTEGER,
+                     description TEXT,
+                     timestamp TEXT
+                 )''')
+    # Per-customer loyalty totals, folded in from the history table by loyalty.compact_summary()
+    conn.execute('''CREATE TABLE IF NOT EXISTS loyalty_summary (
+                    username TEXT PRIMARY KEY,
+                    total_earned INTEGER DEFAULT 0,
+                    total_redeemed INTEGER DEFAULT 0,
+                    entries INTEGER DEFAULT 0,
+                    last_activity TEXT
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS loyalty_summary_state (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    last_history_id INTEGER
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS orders (
+                    id INTEGER PRIMARY KEY,
+                    order_number INTEGER,
+                    customer_name TEXT,
+                    coffee_type TEXT,
+                    quantity INTEGER,
+                    size TEXT,
+                    add_ons TEXT,
+                    price REAL,
+                    time INTEGER,
+                    status TEXT
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS inventory (
+                    item TEXT PRIMARY KEY,
+                    quantity INTEGER
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS coupons (
+                    code TEXT PRIMARY KEY,
+                    discount REAL,
+                    expiration_date TEXT
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS feedback (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT,
+                    coffee_purchased TEXT,
+                    coffee_rating INTEGER,
+                    service_rating INTEGER,
+                    additional_feedback TEXT,
+                    time TEXT
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS restock_history (
+                    id INTEGER PRIMARY KEY,
+                    item TEXT,
+                    amount INTEGER,
+                    cost REAL,
+                    time TEXT
+                )''')
+    conn.commit()
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+# Fill `table`.ts with the epoch seconds of its TEXT `column`, in batches of ids. Batches are
+# paged by id instead of re-selecting NULL rows, so timestamps that do not parse (and stay
+# NULL) are passed over once rather than picked up again forever.
+def _backfill_epoch(conn, table, column, batch_size):
+    last_id = 0
+    while True:
+        with conn:
+            batch_end = conn.execute(
+                f"SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > ? AND ts IS NULL ORDER BY id LIMIT ?)",
+                (last_id, batch_size)
+            ).fetchone()[0]
+            if batch_end is None:
+                return
+            conn.execute(
+                f"UPDATE {table} SET ts = CAST(strftime('%s', {column}) AS INTEGER) WHERE id > ? AND id <= ? AND ts IS NULL",
+                (last_id, batch_end)
+            )
+        last_id = batch_end
+
+
+# Older code created customers with a missing comma after `favorite_order TEXT`,
+# so `loyalty_points` was swallowed into the column type and never existed.
+# Rebuild the table with the right DDL, copying rows in small transactions so
+# a large table never holds the write lock for long. The starting balance is
+# rebuilt from the loyalty history, summed once per customer into a temp table
+# up front: the history has no username index yet, so a per-row subquery would
+# scan the whole history for every customer.
+def _repair_customers(conn, batch_size):
+    if 'loyalty_points' in _columns(conn, 'customers'):
+        return
+
+    copy_rows = '''INSERT INTO customers_new (id, username, password, favorite_order, loyalty_points)
+                   SELECT c.id, c.username, c.password, c.favorite_order, COALESCE(b.points, 0)
+                   FROM customers c LEFT JOIN temp.repair_balances b ON b.username = c.username
+                   WHERE c.id > ? ORDER BY c.id LIMIT ?'''
+
+    conn.execute("DROP TABLE IF EXISTS temp.repair_balances")
+    conn.execute("CREATE TEMP TABLE repair_balances (username TEXT PRIMARY KEY, points INTEGER)")
+    conn.execute('''INSERT INTO temp.repair_balances (username, points)
+                    SELECT username, SUM(points) FROM loyalty_points_history
+                    WHERE username IS NOT NULL GROUP BY username''')
+    conn.execute("DROP TABLE IF EXISTS customers_new")
+    conn.execute('''CREATE TABLE customers_new (
+                    id INTEGER PRIMARY KEY,
+                    username TEXT UNIQUE,
+                    password TEXT,
+                    favorite_order TEXT,
+                    loyalty_points INTEGER DEFAULT 0
+                )''')
+    conn.commit()
+
+    last_id = 0
+    while True:
+        with conn:
+            copied = conn.execute(copy_rows, (last_id, batch_size)).rowcount
+            if copied:
+                last_id = conn.execute("SELECT MAX(id) FROM customers_new").fetchone()[0]
+        if copied < batch_size:
+            break
+
+    # Catch up on sign-ups that arrived during the copy, then swap the tables atomically
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute(copy_rows, (last_id, -1))
+    conn.execute("DROP TABLE customers")
+    conn.execute("ALTER TABLE customers_new RENAME TO customers")
+    conn.commit()
+    conn.execute("DROP TABLE temp.repair_balances")
+
+
+# Indexes for the queries that run on every page view or order
+def _hot_query_indexes(conn, batch_size):
+    with conn:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_loyalty_history_user_time ON loyalty_points_history (username, timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_time ON orders (time)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_order_number ON orders (order_number)")
+
+
+# Give loyalty history a typed timestamp: `ts` holds epoch seconds of the same
+# wall-clock time as the TEXT `timestamp`, backfilled in batches, and the
+# history index moves to (username, ts) so sorting no longer compares strings.
+def _loyalty_epoch_timestamps(conn, batch_size):
+    if 'ts' not in _columns(conn, 'loyalty_points_history'):
+        with conn:
+            conn.execute("ALTER TABLE loyalty_points_history ADD COLUMN ts INTEGER")
+
+    _backfill_epoch(conn, 'loyalty_points_history', 'timestamp', batch_size)
+
+    with conn:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_loyalty_history_user_ts ON loyalty_points_history (username, ts)")
+        conn.execute("DROP INDEX IF EXISTS idx_loyalty_history_user_time")
+
+
+# Ring of free order numbers for order_numbers.allocate(). Numbers held by
+# orders that have not been picked up yet are left out.
+def _order_number_pool(conn, batch_size):
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute('''CREATE TABLE IF NOT EXISTS order_number_pool (
+                    slot INTEGER PRIMARY KEY,
+                    number INTEGER UNIQUE
+                )''')
+    if conn.execute("SELECT COUNT(*) FROM order_number_pool").fetchone()[0] == 0:
+        in_use = [number for number, in conn.execute("SELECT DISTINCT order_number FROM orders WHERE status != 'Picked Up'")]
+        order_numbers.fill_pool(conn, in_use)
+    conn.commit()
+
+
+# When each order line was marked Ready, so wait-time percentiles survive a restart
+def _order_ready_time(conn, batch_size):
+    if 'ready_time' not in _columns(conn, 'orders'):
+        with conn:
+            conn.execute("ALTER TABLE orders ADD COLUMN ready_time INTEGER")
+
+
+# Inventory per store. The single-shop `inventory` table carries over as the default store's stock.
+def _store_inventory(conn, batch_size):
+    with conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS store_inventory (
+                        store TEXT,
+                        item TEXT,
+                        quantity INTEGER,
+                        PRIMARY KEY (store, item)
+                    )''')
+        conn.execute("INSERT OR IGNORE INTO store_inventory (store, item, quantity) SELECT ?, item, quantity FROM inventory",
+                     (DEFAULT_STORE,))
+
+
+# Which store took each order line; older lines have none and count as the default store
+def _order_store(conn, batch_size):
+    if 'store' not in _columns(conn, 'orders'):
+        with conn:
+            conn.execute("ALTER TABLE orders ADD COLUMN store TEXT")
+
+
+# Restocks become purchase orders: one restock_orders row per restock, with its
+# lines in restock_history. Older lines have no purchase order and no store. Lines
+# also get epoch `ts` timestamps, backfilled in batches, for date-range invoices.
+def _restock_purchase_orders(conn, batch_size):
+    with conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS restock_orders (
+                        id INTEGER PRIMARY KEY,
+                        store TEXT,
+                        total_cost REAL,
+                        time TEXT,
+                        ts INTEGER
+                    )''')
+        columns = _columns(conn, 'restock_history')
+        for column, column_type in (('order_id', 'INTEGER'), ('store', 'TEXT'), ('ts', 'INTEGER')):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE restock_history ADD COLUMN {column} {column_type}")
+
+    _backfill_epoch(conn, 'restock_history', 'time', batch_size)
+
+    with conn:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_restock_history_ts ON restock_history (ts)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_restock_history_order ON restock_history (order_id)")
+
+
+# Coupons get an epoch expiry (the start of the expiration date), a use limit
+# (NULL for unlimited) and a redemption counter, and are indexed by expiry for sweeping
+def _coupon_limits(conn, batch_size):
+    columns = _columns(conn, 'coupons')
+    with conn:
+        for column, column_type in (('expires_ts', 'INTEGER'), ('max_uses', 'INTEGER'), ('uses', 'INTEGER DEFAULT 0')):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE coupons ADD COLUMN {column} {column_type}")
+        conn.execute("UPDATE coupons SET expires_ts = CAST(strftime('%s', expiration_date) AS INTEGER) WHERE expires_ts IS NULL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_coupons_expires ON coupons (expires_ts)")
+
+
+MIGRATIONS = [
+    (1, "Create base tables", _base_tables),
+    (2, "Repair customers.loyalty_points column", _repair_customers),
+    (3, "Add indexes for hot queries", _hot_query_indexes),
+    (4, "Add epoch timestamps to loyalty history", _loyalty_epoch_timestamps),
+    (5, "Add the order number pool", _order_number_pool),
+    (6, "Add orders.ready_time", _order_ready_time),
+    (7, "Add per-store inventory", _store_inventory),
+    (8, "Add orders.store", _order_store),
+    (9, "Add restock purchase orders", _restock_purchase_orders),
+    (10, "Add coupon expiry timestamps and use limits", _coupon_limits),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at TEXT
+                )''')
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+# Bring the database up to LATEST_VERSION and return the versions that were applied
+def migrate(conn, batch_size=1000):
+    applied = []
+    version = current_version(conn)
+    for step_version, description, step in MIGRATIONS:
+        if step_version <= version:
+            continue
+        step(conn, batch_size)
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                         (step_version, description, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        applied.append(step_version)
+    return applied
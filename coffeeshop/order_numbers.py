@@ -0,0 +1,54 @@
+import random
+
+# Customer-facing order numbers are four digits
+FIRST_NUMBER = 1000
+LAST_NUMBER = 9999
+
+# The free number at the front of the ring; the primary key makes both statements an index seek.
+# (Not DELETE ... RETURNING, which needs SQLite 3.35 and Debian bullseye ships 3.34.)
+FRONT_NUMBER = "SELECT slot, number FROM order_number_pool ORDER BY slot LIMIT 1"
+TAKE_NUMBER = "DELETE FROM order_number_pool WHERE slot=?"
+# Put a number back at the end of the ring. The UNIQUE number column makes a double release a no-op.
+RETURN_NUMBER = '''INSERT OR IGNORE INTO order_number_pool (slot, number)
+                   SELECT COALESCE(MAX(slot), 0) + 1, ? FROM order_number_pool'''
+
+
+class OrderNumbersExhausted(RuntimeError):
+    pass
+
+
+# Free order numbers live in a shuffled ring in the database.
+#
+# Issuing a number takes the one at the front and releasing a picked-up order
+# appends its number at the back, so both are a single indexed statement no
+# matter how many numbers are in use, numbers look random to customers, and a
+# recycled number is not handed out again until every other free one has been.
+# Because the ring is shared through the database, two sessions or two tills
+# can never be given the same number.
+def fill_pool(conn, in_use=()):
+    in_use = set(in_use)
+    numbers = [number for number in range(FIRST_NUMBER, LAST_NUMBER + 1) if number not in in_use]
+    random.shuffle(numbers)
+    conn.executemany("INSERT OR IGNORE INTO order_number_pool (slot, number) VALUES (?, ?)", enumerate(numbers, start=1))
+
+
+# Pop the front of the ring. BEGIN IMMEDIATE takes the write lock before the read,
+# so two tills cannot both read the same front number.
+def allocate(conn):
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(FRONT_NUMBER).fetchone()
+        if row is not None:
+            conn.execute(TAKE_NUMBER, (row[0],))
+    if row is None:
+        raise OrderNumbersExhausted(f"All {LAST_NUMBER - FIRST_NUMBER + 1} order numbers are in use")
+    return row[1]
+
+
+def release(conn, number):
+    with conn:
+        conn.execute(RETURN_NUMBER, (number,))
+
+
+def free_count(conn):
+    return conn.execute("SELECT COUNT(*) FROM order_number_pool").fetchone()[0]
@@ -0,0 +1,77 @@
+import numpy as np
+
+SIZES = ['small', 'medium', 'large']
+
+# Special `discount` values in a daily offer; any other number is a fraction off
+BOGO = 'bogo'
+DOUBLE_POINTS = 'double_points'
+
+
+# The menu and the day's offer compiled into flat price arrays.
+#
+# Every (coffee type, size, add-on mask) combination gets its unit price
+# (base plus add-ons) in one array indexed the same way as the consumption
+# engine, and every coffee type gets the multiplier today's offer gives it
+# (0.5 for buy-one-get-one-free, 1 - discount for a percentage off, else 1).
+# Pricing a line is then two array lookups, and a whole basket is one
+# vectorized multiply with no per-line offer rules or string checks. Line
+# prices come out exactly as (base + add-ons) x quantity x offer, the order
+# the shop has always applied them in. Build a new table when the menu or
+# the day's offer changes.
+class PriceTable:
+    def __init__(self, coffee_menu, add_on_prices, offer=None, sizes=SIZES):
+        self.coffee_types = list(coffee_menu)
+        self.sizes = list(sizes)
+        self.add_ons = list(add_on_prices)
+        self.offer = offer
+        self._coffee_codes = {name: code for code, name in enumerate(self.coffee_types)}
+        self._size_codes = {name: code for code, name in enumerate(self.sizes)}
+        self._add_on_bits = {name: 1 << bit for bit, name in enumerate(self.add_ons)}
+        self.n_masks = 1 << len(self.add_ons)
+
+        add_on_totals = [sum(add_on_prices[name] for bit, name in enumerate(self.add_ons) if mask & (1 << bit))
+                         for mask in range(self.n_masks)]
+        self.unit_prices = np.array([
+            coffee_menu[coffee][size] + add_on_totals[mask]
+            for coffee in self.coffee_types for size in self.sizes for mask in range(self.n_masks)
+        ])
+
+        discount = offer['discount'] if offer else None
+        self.offer_factors = np.ones(len(self.coffee_types))
+        if offer and offer['coffee_type'] in self._coffee_codes:
+            if discount == BOGO:
+                self.offer_factors[self._coffee_codes[offer['coffee_type']]] = 0.5
+            elif isinstance(discount, float):
+                self.offer_factors[self._coffee_codes[offer['coffee_type']]] = 1 - discount
+        self.double_points = discount == DOUBLE_POINTS
+
+        # Size choices as shown on the order form, e.g. "Medium (+RM1.25)"
+        self.size_labels = {
+            coffee: {
+                size: (f"{size.title()} (RM{prices[size]:.2f})" if i == 0
+                       else f"{size.title()} (+RM{prices[size] - prices[self.sizes[0]]:.2f})")
+                for i, size in enumerate(self.sizes)
+            }
+            for coffee, prices in coffee_menu.items()
+        }
+
+    def combination(self, coffee, size, add_ons):
+        mask = 0
+        for add_on in add_ons:
+            mask |= self._add_on_bits[add_on]
+        return (self._coffee_codes[coffee] * len(self.sizes) + self._size_codes[size]) * self.n_masks + mask
+
+    def line_price(self, coffee, size, add_ons, quantity):
+        return float(self.unit_prices[self.combination(coffee, size, add_ons)] * quantity
+                     * self.offer_factors[self._coffee_codes[coffee]])
+
+    # Price basket lines given as (coffee type, size, add-ons, quantity) in one pass.
+    # Returns the price of every line as an array and the basket total.
+    def price_lines(self, lines):
+        lines = list(lines)
+        combinations = np.fromiter((self.combination(coffee, size, add_ons) for coffee, size, add_ons, _ in lines),
+                                   dtype=np.int64, count=len(lines))
+        quantities = np.fromiter((quantity for _, _, _, quantity in lines), dtype=np.float64, count=len(lines))
+        prices = self.unit_prices[combinations] * quantities * self.offer_factors[combinations // (len(self.sizes) * self.n_masks)]
+        return prices, float(prices.sum())
+
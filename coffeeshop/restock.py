@@ -0,0 +1,89 @@
+import io
+from datetime import datetime
+
+from coffeeshop.ledger import to_epoch
+
+INSERT_PURCHASE_ORDER = "INSERT INTO restock_orders (store, total_cost, time, ts) VALUES (?, ?, ?, ?)"
+INSERT_LINE = "INSERT INTO restock_history (order_id, store, item, amount, cost, time, ts) VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+# Fixed-width invoice layout shared by purchase-order and date-range invoices
+INVOICE_RULE = "-" * 84 + "\n"
+INVOICE_HEADER = f"| {'Item':<17} | {'Amount':<8} | {'Cost (RM)':<11} | {'Time':<19} | {'Store':<13} |\n"
+
+
+# Price of `amount` of `item`; prices are per restock unit (e.g. per 100 g) and `units` says how big one is
+def cost(item, amount, prices, units):
+    return amount / units[item] * prices[item]
+
+
+# Record a multi-item restock as one purchase order, with its lines, in one transaction.
+# `lines` is an iterable of (item, amount, cost); returns the purchase order id.
+def record_purchase_order(conn, store, lines):
+    lines = [(item, amount, line_cost) for item, amount, line_cost in lines if amount]
+    now = datetime.now().replace(microsecond=0)
+    timestamp, ts = now.strftime("%Y-%m-%d %H:%M:%S"), to_epoch(now)
+    with conn:
+        order_id = conn.execute(INSERT_PURCHASE_ORDER, (store, sum(line_cost for _, _, line_cost in lines), timestamp, ts)).lastrowid
+        conn.executemany(INSERT_LINE, [(order_id, store, item, amount, line_cost, timestamp, ts)
+                                       for item, amount, line_cost in lines])
+    return order_id
+
+
+# Restock lines with start <= time < stop (either end may be None), oldest first, as
+# (item, amount, cost, time, store) rows. Rows are read `batch_size` at a time by keyset
+# on (ts, id), so a long history is never loaded into memory at once.
+def iter_lines(conn, start=None, stop=None, store=None, batch_size=500):
+    low = to_epoch(start) if start is not None else -1
+    high = to_epoch(stop) if stop is not None else 2 ** 62
+    last = (low, 0)
+    while True:
+        rows = conn.execute(
+            '''SELECT id, ts, item, amount, cost, time, store FROM restock_history
+               WHERE (ts, id) > (?, ?) AND ts < ? AND (? IS NULL OR store = ?)
+               ORDER BY ts, id LIMIT ?''',
+            (last[0], last[1], high, store, store, batch_size)
+        ).fetchall()
+        for row in rows:
+            yield row[2:]
+        if len(rows) < batch_size:
+            return
+        last = (rows[-1][1], rows[-1][0])
+
+
+# The newest `limit` restock lines, newest first, as (item, amount, cost, time, store) rows
+def recent_lines(conn, limit=50):
+    return conn.execute("SELECT item, amount, cost, time, store FROM restock_history ORDER BY ts DESC, id DESC LIMIT ?",
+                        (limit,)).fetchall()
+
+
+def purchase_order_lines(conn, order_id):
+    return conn.execute("SELECT item, amount, cost, time, store FROM restock_history WHERE order_id=? ORDER BY id",
+                        (order_id,)).fetchall()
+
+
+# Total restock spend with start <= time < stop (either end may be None), summed in SQL
+def total_cost(conn, start=None, stop=None):
+    return conn.execute(
+        "SELECT COALESCE(SUM(cost), 0) FROM restock_history WHERE ts >= ? AND ts < ?",
+        (to_epoch(start) if start is not None else -1, to_epoch(stop) if stop is not None else 2 ** 62)
+    ).fetchone()[0]
+
+
+# Write an invoice for `lines` of (item, amount, cost, time, store) to the text stream `out`,
+# one line at a time, and return the total cost
+def write_invoice(out, title, lines):
+    out.write(f"{title}\nDate: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    out.write(INVOICE_RULE + INVOICE_HEADER + INVOICE_RULE)
+    total = 0
+    for item, amount, line_cost, line_time, store in lines:
+        total += line_cost
+        out.write(f"| {item:<17} | {amount:<8} | RM{line_cost:<9.2f} | {line_time:<19} | {store or '':<13} |\n")
+    out.write(INVOICE_RULE + f"Total Cost: RM{total:.2f}\n")
+    return total
+
+
+# The invoice as UTF-8 bytes, e.g. for a download button
+def invoice_bytes(title, lines):
+    out = io.StringIO()
+    write_invoice(out, title, lines)
+    return out.getvalue().encode('utf-8')
@@ -0,0 +1,160 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from coffeeshop import db
+
+logger = logging.getLogger(__name__)
+
+# Set COFFEESHOP_SHARDED=1 to give every store its own database file and worker process
+SHARDED_ENV = 'COFFEESHOP_SHARDED'
+
+# Conditional decrement: only succeeds while the store still has enough of the item
+TAKE_STOCK = "UPDATE store_inventory SET quantity = quantity - ? WHERE store=? AND item=? AND quantity >= ?"
+INSERT_SHARD_ORDER_LINE = '''INSERT INTO orders (order_number, customer_name, coffee_type, quantity, size, add_ons, price, time)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?)'''
+
+# A shard only holds what its worker serves: the store's stock and its order lines for
+# sales totals. Order statuses, order numbers, customers and coupons stay in the main
+# database, so none of those tables (or the main schema's migrations) exist here.
+SHARD_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS store_inventory (
+           store TEXT,
+           item TEXT,
+           quantity INTEGER,
+           PRIMARY KEY (store, item)
+       )''',
+    '''CREATE TABLE IF NOT EXISTS orders (
+           id INTEGER PRIMARY KEY,
+           order_number INTEGER,
+           customer_name TEXT,
+           coffee_type TEXT,
+           quantity INTEGER,
+           size TEXT,
+           add_ons TEXT,
+           price REAL,
+           time INTEGER
+       )''',
+    "CREATE INDEX IF NOT EXISTS idx_orders_time ON orders (time)",
+]
+
+
+def sharding_enabled():
+    return os.environ.get(SHARDED_ENV, '') not in ('', '0')
+
+
+# Database file for one store's shard, e.g. coffee_shop.klia-1.db next to coffee_shop.db
+def shard_path(store, db_path=db.DB_PATH):
+    root, extension = os.path.splitext(db_path)
+    return f"{root}.{re.sub(r'[^a-z0-9]+', '-', store.lower()).strip('-')}{extension}"
+
+
+# ---- Worker side: each store's process holds one connection to its own shard ----
+
+_shard = {}
+
+
+def init_worker(store, db_path, inventory_defaults):
+    conn = db.connect(db_path)
+    with conn:
+        for statement in SHARD_SCHEMA:
+            conn.execute(statement)
+    db.load_store_inventory(conn, {store: inventory_defaults})
+    _shard.update(store=store, conn=conn)
+
+
+def levels():
+    return dict(_shard['conn'].execute("SELECT item, quantity FROM store_inventory WHERE store=?", (_shard['store'],)))
+
+
+# Take every amount out of the shard's stock in one transaction, or nothing at all.
+# Returns (short ingredient or None, levels after the attempt). Any error rolls back too,
+# so the worker's connection is never left inside a transaction for the next call.
+def reserve(amounts):
+    conn, store = _shard['conn'], _shard['store']
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for item, amount in amounts.items():
+            if conn.execute(TAKE_STOCK, (amount, store, item, amount)).rowcount == 0:
+                conn.rollback()
+                return item, levels()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return None, levels()
+
+
+def adjust(amounts):
+    conn = _shard['conn']
+    with conn:
+        conn.executemany(db.UPDATE_STORE_INVENTORY, [(amount, _shard['store'], item) for item, amount in amounts.items()])
+    return levels()
+
+
+def record_order_lines(lines):
+    conn = _shard['conn']
+    with conn:
+        conn.executemany(INSERT_SHARD_ORDER_LINE, lines)
+    return len(lines)
+
+
+# Revenue, line count and cups per coffee type for start <= time < stop (epoch seconds).
+# Like the sales report, lines priced at RM0.00 are left out.
+def sales_totals(start, stop):
+    conn = _shard['conn']
+    revenue, lines = conn.execute("SELECT COALESCE(SUM(price), 0), COUNT(*) FROM orders WHERE time >= ? AND time < ? AND price > 0",
+                                  (start, stop)).fetchone()
+    quantity = dict(conn.execute('''SELECT coffee_type, SUM(quantity) FROM orders
+                                    WHERE time >= ? AND time < ? AND price > 0 GROUP BY coffee_type''', (start, stop)))
+    return {'revenue': revenue, 'lines': lines, 'quantity': quantity}
+
+
+# ---- Router side ----
+
+# Sends each store's work to that store's own worker process.
+#
+# Every store gets a single-worker process pool bound to its shard file, so
+# the work routed here (stock checks, releases, restocks, the shard's copy of
+# order lines and its sales totals) for a rush at one site queues behind that
+# site's worker only and never holds another store's write lock or GIL. The
+# rest of placing an order (the ledger, aggregates, order numbers and boards)
+# still runs in the main process for every store. Work for one store runs in
+# submission order. fan_out() sends the same call to every
+# store at once and gathers the answers, e.g. for the all-stores sales report.
+class ShardRouter:
+    def __init__(self, inventory_defaults, db_path=db.DB_PATH):
+        self.stores = list(inventory_defaults)
+        self.db_path = db_path
+        # spawn, not fork: the Streamlit server process is full of threads
+        context = multiprocessing.get_context('spawn')
+        self._pools = {
+            store: ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=init_worker,
+                                       initargs=(store, shard_path(store, db_path), inventory_defaults[store]))
+            for store in self.stores
+        }
+        atexit.register(self.close)
+
+    def submit(self, store, fn, *args):
+        future = self._pools[store].submit(fn, *args)
+
+        # Fire-and-forget writes have nobody waiting on the result, so make failures visible
+        def log_failure(done):
+            if done.exception() is not None:
+                logger.error("Shard %s failed running %s", store, fn.__name__, exc_info=done.exception())
+        future.add_done_callback(log_failure)
+        return future
+
+    def call(self, store, fn, *args, timeout=None):
+        return self.submit(store, fn, *args).result(timeout)
+
+    def fan_out(self, fn, *args, timeout=None):
+        futures = {store: pool.submit(fn, *args) for store, pool in self._pools.items()}
+        return {store: future.result(timeout) for store, future in futures.items()}
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=True)
@@ -0,0 +1,79 @@
+import bisect
+import threading
+from collections import deque
+from datetime import datetime
+
+from coffeeshop.ledger import to_epoch
+
+# Preparation time for one order line: a base time per size plus 30 seconds per add-on
+PREP_SECONDS = {'small': 2 * 60, 'medium': 3 * 60, 'large': 5 * 60}
+ADD_ON_SECONDS = 30
+
+
+def prep_seconds(size, n_add_ons):
+    return PREP_SECONDS.get(size, 0) + n_add_ons * ADD_ON_SECONDS
+
+
+# Running estimate of how long the kitchen queue will take.
+#
+# Lines add their prep time when they enter the kitchen and take it back out
+# when they are marked Ready, so the outstanding total is always at hand and
+# an estimate is O(1) however long the queue is. The work is shared between
+# `stations` baristas working in parallel. Every finished line also records
+# how long it actually took from order to Ready; the most recent `samples`
+# durations are kept sorted for p50/p90 lookups.
+class WaitTimeEstimator:
+    def __init__(self, stations=1, samples=500):
+        self.stations = max(int(stations), 1)
+        self.outstanding = 0
+        self._lines = {}
+        self._recent = deque(maxlen=samples)
+        self._sorted = []
+        self._lock = threading.Lock()
+
+    # A line entered the kitchen; `started` is its order time in the ledger's epoch seconds
+    def enter(self, row, seconds, started):
+        with self._lock:
+            if row in self._lines:
+                return
+            self._lines[row] = (seconds, started)
+            self.outstanding += seconds
+
+    # A line left the kitchen. Returns how long it took, or None if it was not queued.
+    def leave(self, row, finished=None):
+        with self._lock:
+            line = self._lines.pop(row, None)
+            if line is None:
+                return None
+            seconds, started = line
+            self.outstanding -= seconds
+        duration = max((finished if finished is not None else to_epoch(datetime.now())) - started, 0)
+        self.record_duration(duration)
+        return duration
+
+    def record_duration(self, duration):
+        with self._lock:
+            if len(self._recent) == self._recent.maxlen:
+                oldest = self._recent.popleft()
+                del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+            self._recent.append(duration)
+            bisect.insort(self._sorted, duration)
+
+    # Change how many baristas share the work; every till and kitchen screen sees the new number
+    def set_stations(self, stations):
+        with self._lock:
+            self.stations = max(int(stations), 1)
+
+    # Seconds until a new order needing `extra_seconds` of prep would be ready
+    def estimate(self, extra_seconds=0):
+        return int(round(self.outstanding / self.stations)) + extra_seconds
+
+    # Observed order-to-Ready time at quantile q (0-1), or None before any order has finished
+    def percentile(self, q):
+        with self._lock:
+            if not self._sorted:
+                return None
+            return self._sorted[min(int(q * len(self._sorted)), len(self._sorted) - 1)]
+
+    def __len__(self):
+        return len(self._lines)
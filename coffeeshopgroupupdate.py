@@ -1,36 +1,52 @@
 import streamlit as st
-import pandas as pd
-import random
 import io
-from datetime import datetime
+import textwrap
+from datetime import datetime, timedelta
 import sqlite3
 import hashlib
-
-# Database connection and setup
-conn = sqlite3.connect('coffee_shop.db')
-c = conn.cursor()
-
-# Create tables for customers and admins if they don't exist
-c.execute('''CREATE TABLE IF NOT EXISTS customers (
-                id INTEGER PRIMARY KEY,
-                username TEXT UNIQUE,
-                password TEXT,
-                favorite_order TEXT
-                loyalty_points INTEGER DEFAULT 0
-            )''')
-c.execute('''CREATE TABLE IF NOT EXISTS admins (
-                id INTEGER PRIMARY KEY,
-                username TEXT UNIQUE,
-                password TEXT
-            )''')
-c.execute('''CREATE TABLE IF NOT EXISTS loyalty_points_history (
-                 id INTEGER PRIMARY KEY,
-                 username TEXT,
-                 points INTEGER,
-                 description TEXT,
-                 timestamp TEXT
-             )''')
-conn.commit()
+import functools
+from coffeeshop import api, core, db, events, export, loyalty, menu, restock
+from coffeeshop.core import MAX_LINE_QUANTITY, OrderLine, OrderRejected, OrderRequest
+from coffeeshop.inventory import DEFAULT_STORE, STORE_INVENTORY_DEFAULTS
+from coffeeshop.menu import RESTOCK_UNITS, add_on_prices, coffee_menu, daily_offers, restock_prices
+
+STORES = list(STORE_INVENTORY_DEFAULTS)
+
+# How often expired coupons are swept from memory and the database
+COUPON_SWEEP_SECONDS = 3600
+
+# The order-processing core (coffeeshop.core), built once per server process and shared by all sessions:
+# the connection pool and write-behind queue, the order ledger and everything derived from it, every
+# store's inventory, coupons and order events. The pages below only render it and collect input.
+# In sharded mode (COFFEESHOP_SHARDED=1) each store's stock and a copy of its order lines live in their
+# own database file, served by that store's worker process; the ledger, order numbers and boards stay here.
+@st.cache_resource
+def get_shop():
+    return core.Shop(db.DB_PATH, STORE_INVENTORY_DEFAULTS, coupon_sweep_seconds=COUPON_SWEEP_SECONDS)
+
+# Only one process may take orders on the database; say so instead of losing orders
+try:
+    shop = get_shop()
+except db.DatabaseInUse as error:
+    st.error(str(error))
+    st.stop()
+pool = shop.pool
+write_queue = shop.write_queue
+
+# With COFFEESHOP_API_PORT set, POS terminals and kiosks order over HTTP (coffeeshop.api) from this same
+# process, so their orders land in the same ledger, stock and order boards as the tills on these pages.
+# It starts with the first session the server runs.
+@st.cache_resource
+def start_order_api():
+    port = api.api_port()
+    return api.serve_in_thread(shop, port=port) if port else None
+
+start_order_api()
+
+# Process-wide copies of the shop data, loaded from the database once and shared by all sessions
+@st.cache_resource
+def get_shared_feedback():
+    return db.load_feedback(pool.connection())
 
 def display_about_page():
     st.markdown("<h3 style='color: #3D3D3D;'>☕ About Mug Life</h3>", unsafe_allow_html=True)
@@ -50,6 +66,8 @@ def display_about_page():
         "Student ID": ["21000536", "21002463", "20001884", "21002286"],
         "Program": ["Computer Science", "Computer Science", "Information Technology", "Information Technology"]
     }
+    import pandas as pd
+
     team_df = pd.DataFrame(team_data)
 
     st.table(team_df)
@@ -62,8 +80,9 @@ def hash_password(password):
 def signup(username, password, is_admin=False):
     password_hashed = hash_password(password)
     table = 'admins' if is_admin else 'customers'
+    conn = pool.connection()
     try:
-        c.execute(f"INSERT INTO {table} (username, password) VALUES (?, ?)", (username, password_hashed))
+        conn.execute(f"INSERT INTO {table} (username, password) VALUES (?, ?)", (username, password_hashed))
         conn.commit()
         st.success(f"Account created successfully for {'admin' if is_admin else 'customer'}!")
     except sqlite3.IntegrityError:
@@ -73,8 +92,8 @@ def signup(username, password, is_admin=False):
 def login(username, password, is_admin=False):
     password_hashed = hash_password(password)
     table = 'admins' if is_admin else 'customers'
-    c.execute(f"SELECT * FROM {table} WHERE username=? AND password=?", (username, password_hashed))
-    user = c.fetchone()
+    conn = pool.connection()
+    user = conn.execute(f"SELECT * FROM {table} WHERE username=? AND password=?", (username, password_hashed)).fetchone()
     return user
 
 # Session management (added logout functionality)
@@ -116,209 +135,148 @@ def authenticate_user():
                 else:
                     st.error("Incorrect username or password.")
 
-def get_daily_offer():
-    current_day = datetime.now().strftime("%A")
-    return daily_offers.get(current_day, None)
-
-def record_loyalty_points(username, points, description):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    c.execute("INSERT INTO loyalty_points_history (username, points, description, timestamp) VALUES (?, ?, ?, ?)",
-              (username, points, description, timestamp))
-    conn.commit()
-
-def add_loyalty_points(username, points):
-    # Fetch current points
-    c.execute("SELECT loyalty_points FROM customers WHERE username=?", (username,))
-    current_points = c.fetchone()
-    if current_points is None:
-        current_points = 0
-    else:
-        current_points = current_points[0]
-
-    # Calculate new points
-    new_points = current_points + points
-
-    # Update the loyalty points in the database
-    c.execute("UPDATE customers SET loyalty_points=? WHERE username=?", (new_points, username))
-    conn.commit()
-
-    # Debugging statement to verify points are added
-    # st.write(f"Debug: {points} points added for {username}. Total points: {new_points}")
-
-    # Add an entry to the Loyalty Points History table
-    description = f"Points earned from a purchase"
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    c.execute("INSERT INTO loyalty_points_history (username, points, description, timestamp) VALUES (?, ?, ?, ?)",
-            (username, points, description, timestamp))
-    conn.commit()  # Commit the transaction
-
-def redeem_loyalty_points(username, points_needed):
-    c.execute("SELECT loyalty_points FROM customers WHERE username=?", (username,))
-    current_points = c.fetchone()[0] or 0
-    if current_points >= points_needed:
-        new_points = current_points - points_needed
-        c.execute("UPDATE customers SET loyalty_points=? WHERE username=?", (new_points, username))
-        conn.commit()
-        # Record the history
-        record_loyalty_points(username, -points_needed, "Points redeemed for a discount")
-        return True
-    else:
-        return False
+# Fold new history rows into loyalty_summary at most once a minute for the whole server
+@st.cache_data(ttl=60)
+def compact_loyalty_summary():
+    return loyalty.compact_summary(pool.connection())
+
+# Fetch the next page of the logged-in customer's history (runs before the rerun on "Load more")
+def load_more_loyalty_history():
+    rows, cursor = loyalty.history_page(pool.connection(), st.session_state['user'], st.session_state.loyalty_history_cursor)
+    st.session_state.loyalty_history += rows
+    st.session_state.loyalty_history_cursor = cursor
+    st.session_state.loyalty_history_paging = True
 
 def display_loyalty_points():
     st.markdown("<h3 style='color: #3D3D3D;'>🎁 Loyalty Points</h3>", unsafe_allow_html=True)
     username = st.session_state['user']
+    conn = pool.connection()
 
     # Fetch current loyalty points
-    c.execute("SELECT loyalty_points FROM customers WHERE username=?", (username,))
-    points = c.fetchone()[0] or 0
+    points = conn.execute("SELECT loyalty_points FROM customers WHERE username=?", (username,)).fetchone()[0] or 0
     st.write(f"**Current Loyalty Points:** {points}")
 
-    # Fetch loyalty points history
-    c.execute("SELECT points, description, timestamp FROM loyalty_points_history WHERE username=? ORDER BY timestamp DESC", (username,))
-    history = c.fetchall()
+    compact_loyalty_summary()
+    total_earned, total_redeemed, _, _ = loyalty.summary(conn, username)
+    if total_earned or total_redeemed:
+        st.write(f"**Lifetime Earned:** {total_earned} points | **Lifetime Redeemed:** {total_redeemed} points")
+
+    # Start from the newest page unless this rerun came from "Load more"
+    if not st.session_state.pop('loyalty_history_paging', False):
+        st.session_state.loyalty_history, st.session_state.loyalty_history_cursor = loyalty.history_page(conn, username)
+    history = st.session_state.loyalty_history
 
     if history:
         st.markdown("### Loyalty Points History")
-        for record in history:
-            points, description, timestamp = record
-            st.write(f"- **{description}**: {points} points on {timestamp}")
+        st.markdown("\n".join(
+            f"- **{description}**: {points} points on {timestamp}" for points, description, timestamp in history
+        ))
+        if st.session_state.loyalty_history_cursor is not None:
+            st.button("Load more", key="loyalty_load_more", on_click=load_more_loyalty_history)
     else:
         st.write("No loyalty points history available.")
 
 
 # Initialize Streamlit Session State to retain data across app interactions
-if 'inventory' not in st.session_state:
-    st.session_state.inventory = {
-        "coffee_beans": 1000,  # in grams
-        "milk": 1000,          # in ml
-        "sugar": 1000,          # in grams
-        "cups": 500
-    }
-
-if 'sales_data' not in st.session_state:
-    st.session_state.sales_data = pd.DataFrame(columns=['Order Number', 'Customer Name', 'Coffee Type', 'Qantity', 'Size', 'Add-ons', 'Price', 'Time', 'Status'])
+# (feedback points at the shared, persisted copy)
+if 'store' not in st.session_state:
+    st.session_state.store = DEFAULT_STORE
 
 if 'order_history' not in st.session_state:
     st.session_state.order_history = {}
 
-# Initialize order_numbers set in session state
-if 'order_numbers' not in st.session_state:
-    st.session_state.order_numbers = set()
-
-# Initialize restock_history in session state
-if 'restock_history' not in st.session_state:
-    st.session_state.restock_history = []
-
-# Initialize session state for coupons if not already initialized
-if 'coupons' not in st.session_state:
-    st.session_state.coupons = []
+# How many of the newest coupons the admin page lists
+COUPON_LIST_ROWS = 50
 
 if 'feedback' not in st.session_state:
-    st.session_state.feedback = []
-
-# Function to generate unique 4-digit order number
-def generate_unique_order_number():
-    existing_numbers = st.session_state.get('order_numbers', set())  # Get existing order numbers from session state
-
-    # Generate a unique order number
-    while True:
-        new_number = random.randint(1000, 9999)
-        if new_number not in existing_numbers:
-            st.session_state.order_numbers.add(new_number)
-            return new_number
-
-# JavaScript function to refresh the page
-def js_refresh():
-    st.markdown("""<script>window.location.reload()</script>""", unsafe_allow_html=True)
+    st.session_state.feedback = get_shared_feedback()
+
+# How often the kitchen and order status boards poll for changes
+BOARD_REFRESH_SECONDS = 2
+
+# Toast the events of `kinds` published since this board last looked, deduplicated per order
+def announce_order_events(seen_key, kinds, message):
+    bus = shop.events
+    if seen_key not in st.session_state:
+        st.session_state[seen_key] = bus.version
+    st.session_state[seen_key], new_events = bus.since(st.session_state[seen_key])
+    for order_number in dict.fromkeys(event.order_number for event in new_events if event.kind in kinds):
+        st.toast(message.format(order_number))
+
+# Box-styled card for one order, listing each of its lines.
+# Lines never change once placed, so a card is rendered once and reused on every poll.
+@st.cache_data(max_entries=256)
+def order_card_html(_ledger, order_number, rows, background):
+    lines = [_ledger.row(row) for row in rows]
+    items = "".join(
+        f"<strong>Coffee:</strong> {line['Coffee Type']} ({line['Size']})<br>"
+        f"<strong>Add-ons:</strong> {line['Add-ons']}<br>"
+        for line in lines
+    )
+    return (
+        f"<div style='border: 1px solid #d9d9d9; border-radius: 10px; padding: 15px; margin-bottom: 10px; background-color: {background};'>"
+        f"<strong>Order #{order_number}</strong><br>"
+        f"<strong>Customer:</strong> {lines[0]['Customer Name']}<br>"
+        f"{items}"
+        f"<strong>Order Time:</strong> {lines[0]['Time']}<br>"
+        "</div>"
+    )
 
 # Kitchen Orders Interface with box-styled layout
 def display_kitchen_orders():
     st.markdown("<h3 style='color: #3D3D3D;'>👨‍🍳 Kitchen Orders</h3>", unsafe_allow_html=True)
     
-    # Filter orders that are being processed (not ready yet)
-    kitchen_orders = st.session_state.sales_data[st.session_state.sales_data['Status'] == 'Being Processed']
-    
-    if not kitchen_orders.empty:
-        for idx, order in kitchen_orders.iterrows():
-            st.markdown(
-                f"""
-                <div style='border: 1px solid #d9d9d9; border-radius: 10px; padding: 15px; margin-bottom: 10px; background-color: #f5f5f5;'>
-                    <strong>Order #{order['Order Number']}</strong><br>
-                    <strong>Customer:</strong> {order['Customer Name']}<br>
-                    <strong>Coffee:</strong> {order['Coffee Type']} ({order['Size']})<br>
-                    <strong>Add-ons:</strong> {order['Add-ons']}<br>
-                    <strong>Order Time:</strong> {order['Time']}<br>
-                </div>
-                """, unsafe_allow_html=True
-            )
-            if st.button(f"Mark Order #{order['Order Number']} as Ready", key=f"ready_{order['Order Number']}"):
-                # Update the order status to "Ready"
-                st.session_state.sales_data.at[idx, 'Status'] = 'Ready'
-            
+    # Outstanding prep time is shared between the baristas on shift. The number is shared by every
+    # kitchen screen, so each rerun shows the current one and only an edit changes it.
+    st.session_state.barista_stations = shop.wait_times.stations
+    st.number_input("Baristas on shift", min_value=1, step=1, key="barista_stations", on_change=set_barista_stations)
+
+    kitchen_board()
+
+# Widget callback: store the edited number of baristas for every session
+def set_barista_stations():
+    shop.wait_times.set_stations(st.session_state.barista_stations)
+
+# The kitchen queue redraws itself every few seconds without rerunning the rest of the page
+@st.fragment(run_every=BOARD_REFRESH_SECONDS)
+def kitchen_board():
+    announce_order_events('kitchen_events_seen', {events.ORDER_CREATED}, "New order #{}")
+
+    # Orders that are being processed (not ready yet), oldest first, straight from the status queue
+    ledger = st.session_state.sales_ledger
+    kitchen_orders = ledger.queue('Being Processed')
+
+    if kitchen_orders:
+        for order_number, rows in kitchen_orders:
+            st.markdown(order_card_html(ledger, order_number, tuple(rows), '#f5f5f5'), unsafe_allow_html=True)
+            # Update the status of every line in the order to "Ready" before the board redraws
+            st.button(f"Mark Order #{order_number} as Ready", key=f"ready_{order_number}",
+                      on_click=set_order_lines_status, args=(rows, 'Ready'))
+
     else:
         st.write("No active orders in the kitchen.")
 
 
-# Ingredient usage per coffee type and size
-ingredient_usage = {
-    'Americano': {
-        'small': {'coffee_beans': 9, 'milk': 10, 'sugar': 5},
-        'medium': {'coffee_beans': 12, 'milk': 10, 'sugar': 5},
-        'large': {'coffee_beans': 15, 'milk': 10, 'sugar': 5}
-    },
-    'Cappuccino': {
-        'small': {'coffee_beans': 9, 'milk': 60, 'sugar': 5},
-        'medium': {'coffee_beans': 12, 'milk': 80, 'sugar': 5},
-        'large': {'coffee_beans': 15, 'milk': 100, 'sugar': 5}
-    },
-    'Latte': {
-        'small': {'coffee_beans': 9, 'milk': 100, 'sugar': 5},
-        'medium': {'coffee_beans': 12, 'milk': 150, 'sugar': 5},
-        'large': {'coffee_beans': 15, 'milk': 200, 'sugar': 5}
-    },
-    'Caramel Macchiato': {
-        'small': {'coffee_beans': 9, 'milk': 90, 'sugar': 5},
-        'medium': {'coffee_beans': 12, 'milk': 130, 'sugar': 5},
-        'large': {'coffee_beans': 15, 'milk': 180, 'sugar': 5}
-    }
-}
-
-# Extra usage for additional sugar and milk
-extra_usage = {
-    'milk': 30,   # Extra 30ml of milk for "Extra milk"
-    'sugar': 5    # Extra 5g of sugar for "Extra sugar"
-}
-
-# Coffee Menu Prices
-coffee_menu = {
-    'Americano': {'small': 3.75, 'medium': 5.00, 'large': 7.50},
-    'Cappuccino': {'small': 5.00, 'medium': 6.50, 'large': 8.00},
-    'Latte': {'small': 5.25, 'medium': 6.75, 'large': 8.25},
-    'Caramel Macchiato': {'small': 4.50, 'medium': 7.00, 'large': 9.50}
-}
-
-# Prices for add-ons
-add_on_prices = {
-    'Extra sugar': 0.70,  # Extra 5g of sugar
-    'Extra milk': 0.90,   # Extra 30ml of milk
-}
-
-# Define daily offers for each day of the week
-daily_offers = {
-    "Monday": {"description": "10% off on all lattes", "coffee_type": "Latte", "discount": 0.1},
-    "Tuesday": {"description": "10% off on all cappuccinos", "coffee_type": "Cappuccino", "discount": 0.1},
-    "Wednesday": {"description": "Buy 1 Get 1 Free on all Americanos", "coffee_type": "Americano", "discount": "bogo"},
-    "Thursday": {"description": "10% off on all americano", "coffee_type": "Americano", "discount": 0.1},
-    "Friday": {"description": "10% off on all Caramel Macchiatos", "coffee_type": "Caramel Macchiato", "discount": 0.1},
-    "Saturday": {"description": "Relax and enjoy - no special offers today!", "coffee_type": "any", "discount": None},
-    "Sunday": {"description": "Double loyalty points on all purchases", "coffee_type": "all", "discount": "double_points"}
-}
-
-# Front Page Coffee Menu Display with clean, professional formatting
-# Front Page Coffee Menu Display with clean, professional, and bright formatting
-def display_menu():
-    st.markdown("""
+if 'sales_ledger' not in st.session_state:
+    st.session_state.sales_ledger = shop.ledger
+
+# Function to get inventory for the selected store (a read-only view of its row)
+def get_store_inventory():
+    return shop.store_levels(st.session_state.store)
+
+# Button callback: move every line of an order to `status`; the board shows `message` when it redraws.
+# The rows are the ones drawn with the button, so lines another session has already moved on are skipped.
+def set_order_lines_status(rows, status, message=None):
+    moved = [shop.set_order_status(row, status) for row in rows]
+    if message and any(moved):
+        st.session_state.board_message = message
+
+# Build the whole menu page (styles, offer, items, add-ons) as one HTML string.
+# Cached per (menu version, weekday) so reruns reuse it instead of rebuilding it.
+@st.cache_data(max_entries=32)
+def render_menu_html(version, weekday):
+    daily_offer = daily_offers.get(weekday, None)
+    parts = ["""
         <style>
             .menu-container {
                 background-color: #ffffff;
@@ -395,27 +353,26 @@ def display_menu():
                 margin-top: 5px;
             }
         </style>
-    """, unsafe_allow_html=True)
+    """]
 
-    st.markdown("<div class='menu-title'>📋 Our Coffee Menu</div>", unsafe_allow_html=True)
+    parts.append("<div class='menu-title'>📋 Our Coffee Menu</div>")
 
     # Main menu container
-    st.markdown("<div class='menu-container'>", unsafe_allow_html=True)
-    daily_offer = get_daily_offer()
+    parts.append("<div class='menu-container'>")
 
     # Today's Offer section
-    st.markdown(
+    parts.append(
         f"""
         <div class="offer-section">
             <div class="offer-title">🌟 Today's Offer</div>
             <div class="offer-item">{daily_offer['description']}</div>
         </div>
-        """, unsafe_allow_html=True
-    )    
+        """
+    )
 
     # Styling each coffee item with box-style layout
     for coffee, sizes in coffee_menu.items():
-        st.markdown(
+        parts.append(
             f"""
             <div class="menu-item-box">
                 <div class="item-title">{coffee}</div>
@@ -425,32 +382,173 @@ def display_menu():
                     Large: RM{sizes['large']:.2f}
                 </div>
             </div>
-            """, unsafe_allow_html=True
+            """
         )
 
-    st.markdown("</div>", unsafe_allow_html=True)
+    parts.append("</div>")
 
     # Clean Add-ons section in a box
-    st.markdown(
+    parts.append(
         f"""
         <div class="addon-section">
             <div class="addon-title">Add-ons</div>
             <div class="addon-item">Extra sugar: RM{add_on_prices['Extra sugar']:.2f}</div>
             <div class="addon-item">Extra milk: RM{add_on_prices['Extra milk']:.2f}</div>
         </div>
-        """, unsafe_allow_html=True
+        """
     )
 
     # Divider line to keep the layout neat and clean
-    st.markdown("<hr style='margin-top: 30px; border: none; border-top: 2px solid #3498DB;'>", unsafe_allow_html=True)
+    parts.append("<hr style='margin-top: 30px; border: none; border-top: 2px solid #3498DB;'>")
+
+    # Dedent each fragment so no line is indented far enough to be read as a Markdown code block
+    return "\n".join(textwrap.dedent(part).strip() for part in parts)
+
+# Front Page Coffee Menu Display with clean, professional, and bright formatting
+def display_menu():
+    st.markdown(render_menu_html(menu.version(), datetime.now().strftime("%A")), unsafe_allow_html=True)
+
+RESTOCK_UNIT_LABELS = {'coffee_beans': 'g', 'milk': 'ml', 'sugar': 'g', 'cups': 'units'}
+# How many of the latest restock lines the history table shows
+RESTOCK_HISTORY_ROWS = 50
+
+# Stock forecasting: how far ahead to look, when to warn, and how many days a suggested restock should cover
+STOCKOUT_HORIZON_HOURS = 14 * 24
+LOW_STOCK_HOURS = 24
+RESTOCK_COVER_DAYS = 7
+
+# Hours as e.g. "2d 5h"; anything past the forecast horizon shows as "14d+"
+def format_hours(hours):
+    if hours == float('inf'):
+        return f"{STOCKOUT_HORIZON_HOURS // 24}d+"
+    hours = int(hours)
+    return f"{hours // 24}d {hours % 24}h" if hours >= 24 else f"{hours}h"
+
+# Current stock table, cached per inventory snapshot (a tuple of (item, quantity) pairs).
+# A restock or sale changes the snapshot, so the next render builds a fresh table.
+@st.cache_data(max_entries=32)
+def render_stock_table_html(snapshot):
+    inventory = dict(snapshot)
+    return f"""
+    <style>
+        .inventory-table {{
+            width: 100%;
+            border-collapse: collapse;
+            margin: 20px 0;
+            font-size: 18px;
+            text-align: left;
+        }}
+        .inventory-table th, .inventory-table td {{
+            padding: 12px 15px;
+            border: 1px solid #ddd;
+        }}
+        .inventory-table th {{
+            background-color: #f4f4f4;
+            font-weight: bold;
+            color: #333;
+        }}
+        .inventory-table td {{
+            background-color: #ffffff;
+            color: #555;
+        }}
+        .inventory-table tbody tr:nth-child(even) td {{
+            background-color: #f9f9f9;
+        }}
+    </style>
+
+    <table class="inventory-table">
+        <thead>
+            <tr>
+                <th>Item</th>
+                <th>Current Quantity</th>
+                <th>Unit</th>
+            </tr>
+        </thead>
+        <tbody>
+            <tr>
+                <td>Coffee Beans</td>
+                <td>{inventory['coffee_beans']}</td>
+                <td>grams</td>
+            </tr>
+            <tr>
+                <td>Milk</td>
+                <td>{inventory['milk']}</td>
+                <td>milliliters</td>
+            </tr>
+            <tr>
+                <td>Sugar</td>
+                <td>{inventory['sugar']}</td>
+                <td>grams</td>
+            </tr>
+            <tr>
+                <td>Cups</td>
+                <td>{inventory['cups']}</td>
+                <td>units</td>
+            </tr>
+        </tbody>
+    </table>
+    """
 
-# Define prices for restock items
-restock_prices = {
-    'coffee_beans': 1.20,  # RM per 100g
-    'milk': 0.70,          # RM per 100ml
-    'sugar': 0.20,         # RM per 100g
-    'cups': 0.02           # RM per cup
-}
+# Restock price table, cached per menu version
+@st.cache_data(max_entries=8)
+def render_restock_prices_html(version):
+    return f"""
+    <style>
+        .restock-table {{
+            width: 100%;
+            border-collapse: collapse;
+            margin: 20px 0;
+            font-size: 18px;
+            text-align: left;
+        }}
+        .restock-table th, .restock-table td {{
+            padding: 12px 15px;
+            border: 1px solid #ddd;
+        }}
+        .restock-table th {{
+            background-color: #f4f4f4;
+            font-weight: bold;
+        }}
+        .restock-table td {{
+            background-color: #ffffff;
+        }}
+        .restock-table tbody tr:nth-child(even) td {{
+            background-color: #f9f9f9;
+        }}
+    </style>
+
+    <table class="restock-table">
+        <thead>
+            <tr>
+                <th>Item</th>
+                <th>Price</th>
+                <th>Unit</th>
+            </tr>
+        </thead>
+        <tbody>
+            <tr>
+                <td>Coffee Beans</td>
+                <td>RM{restock_prices['coffee_beans']:.2f}</td>
+                <td>per 100g</td>
+            </tr>
+            <tr>
+                <td>Milk</td>
+                <td>RM{restock_prices['milk']:.2f}</td>
+                <td>per 100ml</td>
+            </tr>
+            <tr>
+                <td>Sugar</td>
+                <td>RM{restock_prices['sugar']:.2f}</td>
+                <td>per 100g</td>
+            </tr>
+            <tr>
+                <td>Cups</td>
+                <td>RM{restock_prices['cups']:.2f}</td>
+                <td>per cup</td>
+            </tr>
+        </tbody>
+    </table>
+    """
 
 def display_inventory():
     st.markdown("<h3 style='color: #3D3D3D;'>📦 Inventory Management</h3>", unsafe_allow_html=True)
@@ -458,272 +556,129 @@ def display_inventory():
 
     # Display current inventory in a clean, modern, and professional table
     st.markdown("### Current Stock Levels:")
-    st.markdown(
-        f"""
-        <style>
-            .inventory-table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin: 20px 0;
-                font-size: 18px;
-                text-align: left;
-            }}
-            .inventory-table th, .inventory-table td {{
-                padding: 12px 15px;
-                border: 1px solid #ddd;
-            }}
-            .inventory-table th {{
-                background-color: #f4f4f4;
-                font-weight: bold;
-                color: #333;
-            }}
-            .inventory-table td {{
-                background-color: #ffffff;
-                color: #555;
-            }}
-            .inventory-table tbody tr:nth-child(even) td {{
-                background-color: #f9f9f9;
-            }}
-        </style>
-
-        <table class="inventory-table">
-            <thead>
-                <tr>
-                    <th>Item</th>
-                    <th>Current Quantity</th>
-                    <th>Unit</th>
-                </tr>
-            </thead>
-            <tbody>
-                <tr>
-                    <td>Coffee Beans</td>
-                    <td>{st.session_state.inventory['coffee_beans']}</td>
-                    <td>grams</td>
-                </tr>
-                <tr>
-                    <td>Milk</td>
-                    <td>{st.session_state.inventory['milk']}</td>
-                    <td>milliliters</td>
-                </tr>
-                <tr>
-                    <td>Sugar</td>
-                    <td>{st.session_state.inventory['sugar']}</td>
-                    <td>grams</td>
-                </tr>
-                <tr>
-                    <td>Cups</td>
-                    <td>{st.session_state.inventory['cups']}</td>
-                    <td>units</td>
-                </tr>
-            </tbody>
-        </table>
-        """,
-        unsafe_allow_html=True
-    )
+    inventory = get_store_inventory()
+    st.markdown(render_stock_table_html(tuple(inventory.items())), unsafe_allow_html=True)
 
 
     # Display restock prices under current stock levels in a modern and clean style
     st.markdown("### 🛒 Restock Price Menu:")
-    st.markdown(
-        f"""
-        <style>
-            .restock-table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin: 20px 0;
-                font-size: 18px;
-                text-align: left;
-            }}
-            .restock-table th, .restock-table td {{
-                padding: 12px 15px;
-                border: 1px solid #ddd;
-            }}
-            .restock-table th {{
-                background-color: #f4f4f4;
-                font-weight: bold;
-            }}
-            .restock-table td {{
-                background-color: #ffffff;
-            }}
-            .restock-table tbody tr:nth-child(even) td {{
-                background-color: #f9f9f9;
-            }}
-        </style>
+    st.markdown(render_restock_prices_html(menu.version()), unsafe_allow_html=True)
 
-        <table class="restock-table">
-            <thead>
-                <tr>
-                    <th>Item</th>
-                    <th>Price</th>
-                    <th>Unit</th>
-                </tr>
-            </thead>
-            <tbody>
-                <tr>
-                    <td>Coffee Beans</td>
-                    <td>RM{restock_prices['coffee_beans']:.2f}</td>
-                    <td>per 100g</td>
-                </tr>
-                <tr>
-                    <td>Milk</td>
-                    <td>RM{restock_prices['milk']:.2f}</td>
-                    <td>per 100ml</td>
-                </tr>
-                <tr>
-                    <td>Sugar</td>
-                    <td>RM{restock_prices['sugar']:.2f}</td>
-                    <td>per 100g</td>
-                </tr>
-                <tr>
-                    <td>Cups</td>
-                    <td>RM{restock_prices['cups']:.2f}</td>
-                    <td>per cup</td>
-                </tr>
-            </tbody>
-        </table>
-        """, 
-        unsafe_allow_html=True
-    )
-
-    # Manual Restock Section
+    # Restock several items at once as one purchase order
     st.markdown("### 🔄 Manual Restock:")
-    item_to_restock = st.selectbox("Select item to restock", list(st.session_state.inventory.keys()))
-    restock_amount = st.number_input("Enter restock amount", min_value=0, step=10)
-
-    # Calculate restock cost
-    cost = 0
-    if item_to_restock == "coffee_beans":
-        cost = (restock_amount / 100) * restock_prices['coffee_beans']
-    elif item_to_restock == "milk":
-        cost = (restock_amount / 100) * restock_prices['milk']
-    elif item_to_restock == "sugar":
-        cost = (restock_amount / 100) * restock_prices['sugar']
-    elif item_to_restock == "cups":
-        cost = restock_amount * restock_prices['cups']
+    amounts = {
+        item: st.number_input(f"Restock {item.replace('_', ' ')} ({RESTOCK_UNIT_LABELS[item]})", min_value=0, step=10,
+                              key=f"restock_{item}")
+        for item in inventory.keys()
+    }
+    costs = {item: restock.cost(item, amount, restock_prices, RESTOCK_UNITS) for item, amount in amounts.items()}
+    total_cost = sum(costs.values())
 
     # Display restock cost
-    if restock_amount > 0:
-        st.write(f"💵 **Restock Cost:** RM{cost:.2f}")
+    if total_cost > 0:
+        st.write(f"💵 **Restock Cost:** RM{total_cost:.2f}")
 
-    # Restock and update history
+    # Restock every item, then record them together as one purchase order
     if st.button("Restock", key="restock"):
-        if restock_amount > 0:
-            st.session_state.inventory[item_to_restock] += restock_amount
-            st.success(f"Restocked **{item_to_restock}** by **{restock_amount}**. New total: **{st.session_state.inventory[item_to_restock]}**")
-            st.write(f"💵 Total Restock Cost: RM{cost:.2f}")
-            # Save restock history
-            st.session_state.restock_history.append({
-                'Item': item_to_restock,
-                'Amount': restock_amount,
-                'Cost': cost,
-                'Time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            })
+        if any(amounts.values()):
+            receipt = shop.restock(st.session_state.store, amounts)
+            for item, new_total in receipt.levels.items():
+                st.success(f"Restocked **{item}** by **{amounts[item]}**. New total: **{new_total}**")
+            st.write(f"💵 Total Restock Cost: RM{receipt.total_cost:.2f}")
+            st.download_button(
+                label="Download Purchase Order",
+                data=restock.invoice_bytes(f"Coffee Shop Restock Invoice (Purchase Order #{receipt.order_id})",
+                                           restock.purchase_order_lines(pool.connection(), receipt.order_id)),
+                file_name=f"restock_order_{receipt.order_id}.txt",
+                mime="text/plain",
+                on_click="ignore"
+            )
         else:
             st.warning("Please enter a valid restock amount.")
 
     # Display restock history
     display_restock_history()
 
-def display_restock_history():
-    st.markdown("<h3 style='color: #3D3D3D;'>📦 Restock History</h3>", unsafe_allow_html=True)
 
-    # Ensure there is restock history to display
-    if 'restock_history' in st.session_state and st.session_state.restock_history:
-        # Convert restock history to a DataFrame for table display
-        df = pd.DataFrame(st.session_state.restock_history)
-
-        # Display restock history in a table format using Streamlit's data frame display
-        st.markdown("<h4 style='color: #2C3E50;'>Restock History Table</h4>", unsafe_allow_html=True)
-
-        # Display the table with headers and professional formatting
-        st.dataframe(df.style.format({"Amount": "{:.0f}", "Cost": "RM{:.2f}", "Time": "{:%Y-%m-%d %H:%M:%S}"}))
-    else:
-        st.write("No restock history available.")
-
-
-
-# Function to display and download restock history in text file format (invoice)
+# Function to display the latest restocks and download restock invoices in text file format
 def display_restock_history():
     st.markdown("<h3 style='color: #3D3D3D;'>📦 Restock History</h3>", unsafe_allow_html=True)
 
-    # Ensure there is restock history to display
-    if 'restock_history' in st.session_state and st.session_state.restock_history:
-        # Convert restock history to a DataFrame for table display
-        df = pd.DataFrame(st.session_state.restock_history)
-
-        # Display restock history in a table format using Streamlit's data frame display
-        st.write(df)
-
-        # Generate invoice button
-        if st.button("Generate Invoice"):
-            generate_invoice()
+    recent = restock.recent_lines(pool.connection(), RESTOCK_HISTORY_ROWS)
+    if recent:
+        import pandas as pd
+
+        # Display the latest restocks in a table format using Streamlit's data frame display
+        df = pd.DataFrame(recent, columns=['Item', 'Amount', 'Cost', 'Time', 'Store'])
+        st.markdown(f"<h4 style='color: #2C3E50;'>Latest {RESTOCK_HISTORY_ROWS} Restocks</h4>", unsafe_allow_html=True)
+        st.dataframe(df.style.format({"Amount": "{:.0f}", "Cost": "RM{:.2f}"}))
+
+        # Invoice for any period; it is only built when the download is clicked
+        today = datetime.now().date()
+        invoice_range = st.date_input("Invoice period", value=(today.replace(day=1), today), max_value=today,
+                                      key="restock_invoice_range")
+        if len(invoice_range) == 2:
+            st.download_button(
+                label="Download Invoice",
+                data=functools.partial(generate_restock_invoice, invoice_range[0], invoice_range[1]),
+                file_name=f"restock_invoice_{invoice_range[0]:%Y%m%d}_{invoice_range[1]:%Y%m%d}.txt",
+                mime="text/plain"
+            )
     else:
         st.write("No restock history available.")
 
 
-
-
-# Function to generate and download invoice as a text file
-def generate_invoice():
-    if 'restock_history' in st.session_state and st.session_state.restock_history:
-        # Create invoice text
-        invoice_text = "Coffee Shop Restock Invoice\n"
-        invoice_text += f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-        invoice_text += "-------------------------------------------------\n"
-        invoice_text += "| Item              | Amount    | Cost (RM) | Time           |\n"
-        invoice_text += "-------------------------------------------------\n"
-        
-        total_cost = 0
-        for restock in st.session_state.restock_history:
-            total_cost += restock['Cost']
-            invoice_text += f"| {restock['Item']:<17} | {restock['Amount']:<8} | RM{restock['Cost']:<9.2f} | {restock['Time']:<15} |\n"
-
-        invoice_text += "-------------------------------------------------\n"
-        invoice_text += f"Total Cost: RM{total_cost:.2f}\n"
-
-        # Create a downloadable text file
-        invoice_bytes = io.BytesIO(invoice_text.encode('utf-8'))
-
-        # Add download button
-        st.download_button(
-            label="Download Invoice",
-            data=invoice_bytes,
-            file_name=f"restock_invoice_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-            mime="text/plain"
-        )
-    else:
-        st.write("No restock history available to generate an invoice.")
-
-import matplotlib.pyplot as plt
+# Restock invoice for every line from `first` to `last` (dates, inclusive), streamed from the database
+def generate_restock_invoice(first, last):
+    return restock.invoice_bytes(
+        f"Coffee Shop Restock Invoice ({first:%Y-%m-%d} to {last:%Y-%m-%d})",
+        restock.iter_lines(pool.connection(), first, last + timedelta(days=1))
+    )
 
 # Update the sales report to include the actual final price after discount (which is the price customer pays)
 def sales_report():
+    # pandas and matplotlib are only needed on the admin report pages, so the login page
+    # and the customer pages start without importing them
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
     st.markdown("<h3 style='color: #3D3D3D; text-align: center;'>📊 Sales Report</h3>", unsafe_allow_html=True)
 
     # Choose report period
-    report_period = st.radio("Select Report Period:", ["Daily", "Weekly", "Monthly"], index=0, key="report_period")
+    report_period = st.radio("Select Report Period:", ["Daily", "Weekly", "Monthly", "Custom Range"], index=0, key="report_period")
 
-    # Filter sales data based on the selected period
+    # The report is read from the core's running aggregates instead of rescanning every order
+    today = datetime.now().date()
     if report_period == "Daily":
-        filtered_data = st.session_state.sales_data[
-            st.session_state.sales_data['Time'].str.contains(datetime.now().strftime("%Y-%m-%d"))]
+        first_day, last_day = today, today
     elif report_period == "Weekly":
-        filtered_data = st.session_state.sales_data[
-            pd.to_datetime(st.session_state.sales_data['Time']) >= pd.Timestamp(datetime.now()) - pd.Timedelta(days=7)]
-    else:  # Monthly report
-        filtered_data = st.session_state.sales_data[
-            pd.to_datetime(st.session_state.sales_data['Time']).dt.to_period('M') == pd.Timestamp(datetime.now()).to_period('M')]
-
-    # **Exclude orders with RM0.00 from revenue calculations**
-    filtered_data = filtered_data[filtered_data['Price'] > 0]  # Filter out RM0.00 orders
-
-    if not filtered_data.empty:
+        first_day, last_day = today - timedelta(days=6), today
+    elif report_period == "Monthly":
+        first_day, last_day = today.replace(day=1), today
+    else:  # Custom range of whole days
+        report_range = st.date_input("Report Dates:", value=(today - timedelta(days=6), today), max_value=today, key="report_range")
+        if len(report_range) < 2:
+            st.info("Pick an end date for the report.")
+            return
+        first_day, last_day = report_range
+    report = shop.sales_report(first_day, last_day, st.session_state.store)
+
+    # In sharded mode every store's worker totals its own books in parallel
+    if report.store_totals:
+        st.markdown("### Sales by Store")
+        st.table(pd.DataFrame({
+            'Revenue (RM)': [round(totals['revenue'], 2) for totals in report.store_totals.values()],
+            'Order Lines': [totals['lines'] for totals in report.store_totals.values()],
+        }, index=list(report.store_totals)))
+
+    # **Orders with RM0.00 are left out of the report**
+    if report.lines:
         # Calculate **total revenue** as the sum of **final price**, excluding coupon-discounted RM0.00 orders
-        total_revenue = filtered_data['Price'].sum()  # 'Price' field should already include the discount
+        total_revenue = report.revenue  # 'Price' field should already include the discount
         st.markdown(f"<strong style='font-size:18px;'>Total Revenue:</strong> RM{total_revenue:.2f}", unsafe_allow_html=True)
 
         # Coffee sales breakdown
-        coffee_sales = filtered_data.groupby('Coffee Type')['Quantity'].sum().reset_index()
+        coffee_sales = pd.DataFrame({'Coffee Type': list(report.coffee_quantities), 'Quantity': list(report.coffee_quantities.values())})
         st.markdown("### Coffee Sales by Type")
         st.bar_chart(coffee_sales.set_index('Coffee Type'))
 
@@ -740,59 +695,21 @@ def sales_report():
         ax1.axis('equal')
         st.pyplot(fig1)
 
-        # Ingredient usage calculation based on sales
-        total_beans_used = 0
-        total_milk_used = 0
-        total_sugar_used = 0
-        total_cups_used = filtered_data['Quantity'].sum()
-
-        for idx, order in filtered_data.iterrows():
-            size = order['Size']
-            coffee_type = order['Coffee Type']
-
-            # Calculate base ingredient usage for each order
-            beans_used = ingredient_usage[coffee_type][size]['coffee_beans'] * order['Quantity']
-            milk_used = ingredient_usage[coffee_type][size]['milk'] * order['Quantity']
-            sugar_used = ingredient_usage[coffee_type][size]['sugar'] * order['Quantity']
-
-            total_beans_used += beans_used
-            total_milk_used += milk_used
-            total_sugar_used += sugar_used
-
-            # Add extra ingredient usage for add-ons
-            if 'Extra sugar' in order['Add-ons']:
-                total_sugar_used += extra_usage['sugar'] * order['Quantity']
-            if 'Extra milk' in order['Add-ons']:
-                total_milk_used += extra_usage['milk'] * order['Quantity']
-
-        # **Calculate inventory costs based on initial inventory and restocking costs**
-        initial_inventory_value = (
-            (st.session_state.inventory['coffee_beans'] / 100) * restock_prices['coffee_beans'] +
-            (st.session_state.inventory['milk'] / 100) * restock_prices['milk'] +
-            (st.session_state.inventory['sugar'] / 100) * restock_prices['sugar'] +
-            st.session_state.inventory['cups'] * restock_prices['cups']
-        )
-
-        # **Calculate the restocking cost**
-        total_restock_cost = 0
-        if 'restock_history' in st.session_state and st.session_state.restock_history:
-            total_restock_cost = sum(restock['Cost'] for restock in st.session_state.restock_history)
-
-        # The total inventory cost is the sum of the initial inventory value and restocking cost
-        total_inventory_cost = initial_inventory_value + total_restock_cost
+        # Ingredient usage for the period, accumulated as each order was placed
+        used = report.ingredients_used
+        inventory = report.stock
 
-        # Calculate **total profit** by subtracting inventory cost from actual final revenue
-        total_profit = total_revenue - total_inventory_cost
+        # Inventory cost: the store's current stock at restock prices plus everything spent on restocking
+        total_inventory_cost = report.inventory_cost
+        total_profit = report.profit
 
         # Ingredient usage summary
         ingredient_usage_summary = {
             'Ingredient': ['Coffee Beans (g)', 'Milk (ml)', 'Sugar (g)', 'Cups'],
-            'Amount Used': [total_beans_used, total_milk_used, total_sugar_used, total_cups_used],
+            'Amount Used': [used[item] for item in ('coffee_beans', 'milk', 'sugar', 'cups')],
             '% Used': [
-                (total_beans_used / (total_beans_used + st.session_state.inventory['coffee_beans'])) * 100 if st.session_state.inventory['coffee_beans'] > 0 else 0,
-                (total_milk_used / (total_milk_used + st.session_state.inventory['milk'])) * 100 if st.session_state.inventory['milk'] > 0 else 0,
-                (total_sugar_used / (total_sugar_used + st.session_state.inventory['sugar'])) * 100 if st.session_state.inventory['sugar'] > 0 else 0,
-                (total_cups_used / (total_cups_used + st.session_state.inventory['cups'])) * 100 if st.session_state.inventory['cups'] > 0 else 0
+                (used[item] / (used[item] + inventory[item])) * 100 if inventory[item] > 0 else 0
+                for item in ('coffee_beans', 'milk', 'sugar', 'cups')
             ]
         }
         ingredient_df = pd.DataFrame(ingredient_usage_summary)
@@ -803,7 +720,6 @@ def sales_report():
         st.markdown("<h4 style='text-align: center;'>Revenue, Inventory Cost, and Profit Breakdown</h4>", unsafe_allow_html=True)
         fig, ax = plt.subplots()
         categories = ['Total Revenue', 'Inventory Cost', 'Profit']
-        values = [total_revenue, total_inventory_cost, total_profit]
 
         ax.bar(categories, [total_revenue, 0, 0], label='Total Revenue', color='#66B3FF')
         ax.bar(categories, [0, total_inventory_cost, 0], label='Inventory Cost', color='#FF9999')
@@ -821,6 +737,14 @@ def sales_report():
     else:
         st.write("No sales data available for the selected period.")
 
+    # Consistency check: rebuild the totals from the raw ledger and compare
+    if st.button("Verify Report Totals", key="verify_aggregates"):
+        mismatches = shop.verify_sales_totals()
+        if mismatches:
+            st.error(f"{len(mismatches)} report totals did not match the order ledger and have been rebuilt.")
+        else:
+            st.success("Report totals match the order ledger.")
+
 
 
 
@@ -828,17 +752,54 @@ def sales_report():
 def display_order_history():
     st.markdown("<h3 style='color: #3D3D3D;'>📜 Order History</h3>", unsafe_allow_html=True)
 
-    if not st.session_state.sales_data.empty:
+    ledger = st.session_state.sales_ledger
+    if len(ledger):
+        # Only the selected days are turned into a DataFrame; the ledger finds them by binary search on time
+        today = datetime.now().date()
+        history_range = st.date_input("Show Orders From:", value=(ledger.first_time().date(), today), key="history_range")
+        if len(history_range) < 2:
+            st.info("Pick an end date to show orders.")
+            return
+        sales_data = ledger.frame(ledger.time_range(history_range[0], history_range[1] + timedelta(days=1)))
+
         # Display order history
-        st.dataframe(st.session_state.sales_data[['Order Number', 'Customer Name', 'Coffee Type', 'Size', 'Add-ons', 'Price', 'Time']])
+        st.dataframe(sales_data[['Order Number', 'Customer Name', 'Coffee Type', 'Size', 'Add-ons', 'Price', 'Time']])
 
         # Show total price for all orders in the history
-        total_price = st.session_state.sales_data['Price'].sum()
-        st.markdown(f"<strong style='font-size:18px;'>Total Price of All Orders:</strong> RM{total_price:.2f}", unsafe_allow_html=True)
+        total_price = sales_data['Price'].sum()
+        st.markdown(f"<strong style='font-size:18px;'>Total Price of Orders Shown:</strong> RM{total_price:.2f}", unsafe_allow_html=True)
     else:
         st.write("No orders have been placed yet.")
 
 
+# Export sales, loyalty history or feedback for accounting. The file is only built when the
+# download is clicked, streaming rows out of the database in chunks.
+def display_data_export():
+    st.markdown("<h3 style='color: #3D3D3D;'>📤 Data Export</h3>", unsafe_allow_html=True)
+
+    dataset = st.selectbox("Data", list(export.DATASETS), format_func=str.title, key="export_dataset")
+    fmt = st.radio("Format", export.FORMATS, format_func=str.upper, horizontal=True, key="export_format")
+    today = datetime.now().date()
+    export_range = st.date_input("Period", value=(today.replace(day=1), today), max_value=today, key="export_range")
+    if len(export_range) < 2:
+        st.info("Pick an end date to export.")
+        return
+
+    start = datetime.combine(export_range[0], datetime.min.time())
+    stop = datetime.combine(export_range[1] + timedelta(days=1), datetime.min.time())
+    st.download_button(
+        label=f"Download {dataset.title()} ({fmt.upper()})",
+        data=functools.partial(generate_export, dataset, fmt, start, stop),
+        file_name=f"{dataset}_{export_range[0]:%Y%m%d}_{export_range[1]:%Y%m%d}.{fmt}",
+        mime="text/csv" if fmt == 'csv' else "application/vnd.apache.parquet",
+        on_click="ignore"
+    )
+    st.caption("For very large exports, run `python -m coffeeshop.export --help` on the server instead.")
+
+def generate_export(dataset, fmt, start, stop):
+    return export.export_bytes(pool.connection(), dataset, fmt, start, stop)
+
+
 # Customer Feedback Form
 def feedback_form():
     st.markdown("<h3 style='color: #3D3D3D;'>💬 Submit Your Feedback</h3>", unsafe_allow_html=True)
@@ -852,7 +813,7 @@ def feedback_form():
     if st.button("Submit Feedback"):
         # Add feedback to session state
         if 'feedback' not in st.session_state:
-            st.session_state.feedback = []
+            st.session_state.feedback = get_shared_feedback()
 
         # Get the current time of submission
         feedback_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -867,26 +828,31 @@ def feedback_form():
             'Time': feedback_time
         }
 
-        # Append to feedback list in session state
+        # Append to the shared feedback list and persist it
         st.session_state.feedback.append(new_feedback)
+        write_queue.put(db.INSERT_FEEDBACK, tuple(new_feedback.values()))
         st.success("Thank you for your feedback!")
 
 
 
 # Analytics Dashboard with Restocking Warning and Inventory Level Display
 def analytics_dashboard():
+    import pandas as pd
+
     st.markdown("<h3 style='color: #3D3D3D;'>📈 Analytics Dashboard</h3>", unsafe_allow_html=True)
     st.write("Real-time stats on orders, inventory, and sales.")
 
     # Display the order count and total revenue with proper spacing
-    st.metric(label="Total Orders", value=len(st.session_state.sales_data))
-    total_revenue = st.session_state.sales_data['Price'].sum()
+    aggregates = shop.aggregates
+    st.metric(label="Total Orders", value=aggregates.total_lines)
+    total_revenue = aggregates.total_revenue
     st.metric(label="Total Revenue", value=f"RM{total_revenue:.2f}")
 
     # Add spacing before displaying inventory levels
     st.markdown("<h4 style='color: #333; margin-top: 20px;'>📦 Current Inventory Levels</h4>", unsafe_allow_html=True)
 
     # Show current inventory levels in box format with proper spacing
+    inventory = get_store_inventory()
     st.markdown(
         """
         <div style='display: flex; flex-wrap: wrap; gap: 20px; margin-bottom: 20px;'>
@@ -904,50 +870,80 @@ def analytics_dashboard():
             </div>
         </div>
         """.format(
-            st.session_state.inventory['coffee_beans'],
-            st.session_state.inventory['milk'],
-            st.session_state.inventory['sugar'],
-            st.session_state.inventory['cups']
+            inventory['coffee_beans'],
+            inventory['milk'],
+            inventory['sugar'],
+            inventory['cups']
         ), 
         unsafe_allow_html=True
     )
 
-    # Estimate how many cups can be made with the current inventory
-    average_beans_per_cup = 12  # g
-    average_milk_per_cup = 80   # ml
-    average_sugar_per_cup = 5   # g
+    # Estimate how many cups can be made with the current inventory, using what the
+    # recent order mix actually used per cup (fixed averages until there are orders)
+    forecast = shop.forecast
+    per_cup = forecast.usage_per_cup() or {'coffee_beans': 12, 'milk': 80, 'sugar': 5, 'cups': 1}
 
-    max_cups_beans = st.session_state.inventory['coffee_beans'] // average_beans_per_cup
-    max_cups_milk = st.session_state.inventory['milk'] // average_milk_per_cup
-    max_cups_sugar = st.session_state.inventory['sugar'] // average_sugar_per_cup
-    max_cups = min(max_cups_beans, max_cups_milk, max_cups_sugar, st.session_state.inventory['cups'])
+    # One vectorized pass over every store's stock; cups are limited by the scarcest ingredient
+    inventory_model = shop.inventory
+    cups_left = inventory_model.cups_left(per_cup)
+    store_row = inventory_model.store_index(st.session_state.store)
+    max_cups = int(cups_left[store_row])
 
     st.markdown(f"<h4 style='margin-top: 20px;'>☕ Estimated Cups You Can Make: {max_cups} cups</h4>", unsafe_allow_html=True)
     st.write(f"- Based on current inventory, you can make approximately **{max_cups}** more cups of coffee.")
 
+    # Cross-store view straight from the shared inventory array
+    st.markdown("<h4 style='margin-top: 20px;'>🏬 Stock Across Stores</h4>", unsafe_allow_html=True)
+    stores_table = pd.DataFrame(inventory_model.levels, index=inventory_model.stores, columns=inventory_model.ingredients)
+    stores_table['Cups Left'] = cups_left
+    st.table(stores_table)
+    st.write(f"- **{inventory_model.lowest('milk')}** will run out of milk first.")
+
+    # When each store runs out of each ingredient at the usual pace for this weekday and hour
+    now = datetime.now()
+    stockout_hours = forecast.hours_to_stockout(inventory_model.levels, now, STOCKOUT_HORIZON_HOURS)
+    st.markdown("<h4 style='margin-top: 20px;'>🔮 Time Until Stock Runs Out</h4>", unsafe_allow_html=True)
+    st.table(pd.DataFrame([[format_hours(hours) for hours in row] for row in stockout_hours],
+                          index=inventory_model.stores, columns=inventory_model.ingredients))
+
+    # Restock suggestion for this store, priced per restock unit
+    st.markdown(f"<h4 style='margin-top: 20px;'>🧾 Suggested Restock for the Next {RESTOCK_COVER_DAYS} Days</h4>", unsafe_allow_html=True)
+    quantities, costs = forecast.restock_plan(inventory_model.levels, now, RESTOCK_COVER_DAYS * 24, RESTOCK_UNITS, restock_prices)
+    if quantities[store_row].any():
+        st.table(pd.DataFrame({
+            'Item': inventory_model.ingredients,
+            'Quantity': quantities[store_row],
+            'Cost (RM)': [f"{cost:.2f}" for cost in costs[store_row]],
+        })[quantities[store_row] > 0])
+        st.write(f"- Estimated restock cost: **RM{costs[store_row].sum():.2f}**")
+    else:
+        st.write("- Current stock covers the expected demand.")
+
     # Inventory Health with restocking warnings with proper spacing
     st.markdown("<h4 style='color: #FF4136; margin-top: 30px;'>⚠️ Inventory Health Alerts</h4>", unsafe_allow_html=True)
 
     low_stock_items = []
 
-    # Check specific thresholds for coffee_beans, milk, sugar, and cups
-    if st.session_state.inventory['coffee_beans'] < 200:
-        low_stock_items.append(("Coffee Beans", st.session_state.inventory['coffee_beans'], 'g'))
-    if st.session_state.inventory['milk'] < 200:
-        low_stock_items.append(("Milk", st.session_state.inventory['milk'], 'ml'))
-    if st.session_state.inventory['sugar'] < 200:
-        low_stock_items.append(("Sugar", st.session_state.inventory['sugar'], 'g'))
-    if st.session_state.inventory['cups'] < 20:
-        low_stock_items.append(("Cups", st.session_state.inventory['cups'], 'units'))
+    # Warn about anything forecast to run out within a day; without any order history
+    # to forecast from, fall back to the fixed minimum levels
+    units = {'coffee_beans': 'g', 'milk': 'ml', 'sugar': 'g', 'cups': 'units'}
+    minimums = {'coffee_beans': 200, 'milk': 200, 'sugar': 200, 'cups': 20}
+    for column, item in enumerate(inventory_model.ingredients):
+        hours = stockout_hours[store_row, column]
+        if forecast.first_day is not None and hours < LOW_STOCK_HOURS:
+            low_stock_items.append((item.replace('_', ' ').title(), inventory[item], units[item], f"Runs out in {format_hours(hours)}"))
+        elif forecast.first_day is None and inventory[item] < minimums[item]:
+            low_stock_items.append((item.replace('_', ' ').title(), inventory[item], units[item], None))
 
     # Show warnings for low stock items with units displayed and spaced out
     if low_stock_items:
-        for item, quantity, unit in low_stock_items:
+        for item, quantity, unit, outlook in low_stock_items:
             st.markdown(
                 f"""
                 <div style='border: 1px solid #FF4136; border-radius: 10px; padding: 20px; margin-bottom: 20px; background-color: #ffe6e6;'>
                     <strong style="color: #FF4136;">{item} is low on stock!</strong><br>
                     <span>Current Quantity: <strong>{quantity} {unit}</strong></span>
+                    {f"<br><span>{outlook}</span>" if outlook else ""}
                 </div>
                 """, unsafe_allow_html=True
             )
@@ -975,66 +971,85 @@ def customer_interface():
 # Display order status for customers with a box-styled layout for each order and the pickup button
 def display_order_status():
     st.markdown("<h3 style='color: #3D3D3D;'>📊 Order Status Dashboard</h3>", unsafe_allow_html=True)
-    
-    # Display orders that are being processed
-    processing_orders = st.session_state.sales_data[st.session_state.sales_data['Status'] == 'Being Processed']
-    ready_orders = st.session_state.sales_data[st.session_state.sales_data['Status'] == 'Ready']
+    order_status_board()
+
+# The status board redraws itself every few seconds, so a wall-mounted screen never needs a full reload
+@st.fragment(run_every=BOARD_REFRESH_SECONDS)
+def order_status_board():
+    announce_order_events('status_events_seen', {events.ORDER_READY}, "Order #{} is ready for pickup!")
+    if 'board_message' in st.session_state:
+        st.toast(st.session_state.pop('board_message'))
+
+    # Active orders come from the per-status queues, so this page never scans past orders
+    ledger = st.session_state.sales_ledger
+    processing_rows = ledger.queued_rows('Being Processed')
+    ready_orders = ledger.queue('Ready')
 
     # Orders being processed
     st.subheader("Orders Being Processed")
-    if not processing_orders.empty:
-        st.write(processing_orders[['Order Number', 'Customer Name', 'Time']])
+    if len(processing_rows):
+        st.write(ledger.frame(processing_rows)[['Order Number', 'Customer Name', 'Time']])
     else:
         st.write("No orders are being processed.")
 
     # Orders ready for pickup with formatted boxes
     st.subheader("Orders Ready for Pickup")
-    if not ready_orders.empty:
-        for idx, order in ready_orders.iterrows():
-            st.markdown(
-                f"""
-                <div style='border: 1px solid #d9d9d9; border-radius: 10px; padding: 15px; margin-bottom: 10px; background-color: #f9f9f9;'>
-                    <strong>Order #{order['Order Number']}</strong><br>
-                    <strong>Customer:</strong> {order['Customer Name']}<br>
-                    <strong>Coffee:</strong> {order['Coffee Type']} ({order['Size']})<br>
-                    <strong>Add-ons:</strong> {order['Add-ons']}<br>
-                    <strong>Order Time:</strong> {order['Time']}<br>
-                </div>
-                """, unsafe_allow_html=True
-            )
-            if st.button(f"Picked Up #{order['Order Number']}", key=f"pickup_{order['Order Number']}"):
-                # Remove the order from the sales data by updating the status
-                st.session_state.sales_data.drop(idx, inplace=True)
-                st.success(f"Order #{order['Order Number']} has been picked up!")
+    if ready_orders:
+        for order_number, rows in ready_orders:
+            st.markdown(order_card_html(ledger, order_number, tuple(rows), '#f9f9f9'), unsafe_allow_html=True)
+            # Mark the order as picked up; the lines stay in the ledger for the sales report
+            st.button(f"Picked Up #{order_number}", key=f"pickup_{order_number}",
+                      on_click=set_order_lines_status, args=(rows, 'Picked Up', f"Order #{order_number} has been picked up!"))
     else:
         st.write("No orders are ready for pickup.")
 
 # Function to manage coupon codes in the admin interface
 def manage_coupons():
     st.markdown("<h3 style='color: #3D3D3D;'>💳 Manage Coupon Codes</h3>", unsafe_allow_html=True)
+    service = shop.coupons
 
     # Create a new coupon
     coupon_code = st.text_input("Enter Coupon Code")
     discount_amount = st.number_input("Discount Amount (in RM)", min_value=0.0, format="%.2f")
     expiration_date = st.date_input("Expiration Date")
+    max_uses = st.number_input("Maximum Uses (0 = unlimited)", min_value=0, step=1, key="coupon_max_uses")
 
     if st.button("Create Coupon"):
         if coupon_code and discount_amount > 0:
-            new_coupon = {
-                'Code': coupon_code,
-                'Discount': discount_amount,
-                'Expiration Date': expiration_date
-            }
-            st.session_state.coupons.append(new_coupon)
-            st.success(f"Coupon '{coupon_code}' created successfully!")
+            uses = service.create(coupon_code, discount_amount, expiration_date, max_uses or None)
+            if uses:
+                st.success(f"Coupon '{coupon_code}' updated; it has already been used {uses} time(s).")
+            else:
+                st.success(f"Coupon '{coupon_code}' created successfully!")
         else:
             st.error("Please enter a valid coupon code and discount amount.")
 
-    # Display existing coupons
-    if st.session_state.coupons:
-        st.markdown("<h4>Existing Coupons</h4>", unsafe_allow_html=True)
-        for coupon in st.session_state.coupons:
-            st.markdown(f"- **{coupon['Code']}**: RM{coupon['Discount']} (Expires on {coupon['Expiration Date']})")
+    # Bulk generation of single-use (or limited-use) codes for a campaign
+    st.markdown("<h4>Generate Coupon Codes in Bulk</h4>", unsafe_allow_html=True)
+    bulk_count = st.number_input("Number of Codes", min_value=1, max_value=1_000_000, value=100, step=100, key="bulk_count")
+    bulk_prefix = st.text_input("Code Prefix (optional)", key="bulk_prefix").strip().upper()
+    bulk_uses = st.number_input("Uses per Code", min_value=1, value=1, step=1, key="bulk_uses")
+    if st.button("Generate Codes", key="generate_coupons"):
+        if discount_amount > 0:
+            codes = service.generate(int(bulk_count), discount_amount, expiration_date, int(bulk_uses), bulk_prefix)
+            st.success(f"Generated {len(codes)} coupon codes worth RM{discount_amount:.2f} each.")
+            st.download_button(
+                label="Download Codes",
+                data="\n".join(codes) + "\n",
+                file_name=f"coupons_{bulk_prefix or 'campaign'}_{expiration_date:%Y%m%d}.txt",
+                mime="text/plain",
+                on_click="ignore"
+            )
+        else:
+            st.error("Please enter a discount amount above to generate codes.")
+
+    # Display existing coupons (the newest ones; expired codes are swept away)
+    if len(service):
+        st.markdown(f"<h4>Existing Coupons ({len(service)} active)</h4>", unsafe_allow_html=True)
+        st.markdown("\n".join(
+            f"- **{code}**: RM{discount} (Expires on {expires}, used {uses}{f' of {limit}' if limit else ''} times)"
+            for code, discount, expires, uses, limit in service.recent(COUPON_LIST_ROWS)
+        ))
     else:
         st.write("No coupons available.")
         
@@ -1049,8 +1064,9 @@ def take_order():
         if 'order_list' not in st.session_state:
             st.session_state.order_list = []
 
-        # Get the daily offer
-        daily_offer = get_daily_offer()
+        # Get the daily offer and today's compiled prices
+        daily_offer = menu.daily_offer()
+        price_table = shop.price_table()
         if daily_offer and daily_offer["discount"] is not None:
             st.markdown("<h4 style='color: #3D3D3D;'>🌟 Today's Offer</h4>", unsafe_allow_html=True)
             st.write(f"**{daily_offer['description']}**")
@@ -1060,11 +1076,7 @@ def take_order():
 
         if coffee_type:
             # Show sizes with the price difference in a radio button
-            size_options = {
-                'small': f"Small (RM{coffee_menu[coffee_type]['small']:.2f})",
-                'medium': f"Medium (+RM{coffee_menu[coffee_type]['medium'] - coffee_menu[coffee_type]['small']:.2f})",
-                'large': f"Large (+RM{coffee_menu[coffee_type]['large'] - coffee_menu[coffee_type]['small']:.2f})"
-            }
+            size_options = price_table.size_labels[coffee_type]
             size = st.radio(f"Select size for {coffee_type}", list(size_options.keys()), format_func=lambda x: size_options[x])
 
             # Add-ons selection with displayed prices
@@ -1074,60 +1086,25 @@ def take_order():
             )
 
             # Quantity selection
-            quantity = st.number_input("Select quantity", min_value=1, max_value=10, value=1, step=1)
-
-            # Calculate the base price
-            base_price = coffee_menu[coffee_type][size]
-            add_on_price = sum(add_on_prices[add_on] for add_on in add_ons)
-            total_item_price = (base_price + add_on_price) * quantity
-
-            # Apply the daily offer
-            double_points = False  # Initialize double points flag
-            if daily_offer:
-                if daily_offer["discount"] == "bogo" and coffee_type == daily_offer["coffee_type"]:
-                    # Apply "Buy 1 Get 1 Free" (BOGO)
-                    total_item_price /= 2
-                elif isinstance(daily_offer["discount"], float) and coffee_type == daily_offer["coffee_type"]:
-                    # Apply percentage discount
-                    total_item_price *= (1 - daily_offer["discount"])
-                elif daily_offer["discount"] == "double_points":
-                    double_points = True
-
-            # Add item to the order list
+            quantity = st.number_input("Select quantity", min_value=1, max_value=MAX_LINE_QUANTITY, value=1, step=1)
+
+            # Add item to the order list; the whole basket is priced together below
             if st.button("Add to Order"):
-                
-                # Add the item to the order list
-                order_item = {
-                    'coffee_type': coffee_type,
-                    'size': size,
-                    'add_ons': add_ons,
-                    'quantity': quantity,
-                    'price': total_item_price
-                }
-                st.session_state.order_list.append(order_item)
+                st.session_state.order_list.append(OrderLine(coffee_type, size, add_ons, quantity))
                 st.success(f"Added {quantity} x {coffee_type} to your order.")
 
         # Display the current order summary
         if st.session_state.order_list:
             st.markdown("<h4 style='color: #3D3D3D;'>🛒 Order Summary</h4>", unsafe_allow_html=True)
-            total_order_price = 0
-
-            for item in st.session_state.order_list:
-                st.write(f"{item['quantity']} x {item['coffee_type']} ({item['size']}): RM{item['price']:.2f}")
-                if item['add_ons']:
-                    st.write(f" - Add-ons: {', '.join(item['add_ons'])}")
-                total_order_price += item['price']
-
-            st.write(f"**Total Order Price:** RM{total_order_price:.2f}")
+            # Filled in once the coupon and points below are known
+            order_summary = st.container()
 
             # Coupon code input
             coupon_code = st.text_input("Enter Coupon Code (optional):")
-            discount = 0  # Default discount value
 
             # Check if the customer wants to redeem points
-            c.execute("SELECT loyalty_points FROM customers WHERE username=?", (customer_name,))
-            result = c.fetchone()
-            points = result[0] if result else 0
+            balance = shop.loyalty_balance(customer_name)
+            points = balance.points if balance else 0
 
             # Input field for redeeming points
             redeem_points = st.number_input(
@@ -1135,68 +1112,28 @@ def take_order():
                 min_value=0, max_value=points, step=10
             )
 
-            # Calculate the discount based on the redeem_points input (10 points = RM1)
-            discount = (redeem_points // 10) * 1  # Integer division to calculate RM1 for every 10 points
+            # Price the basket with today's offer and the coupon or points discount in one call
+            request = OrderRequest(customer_name, list(st.session_state.order_list), st.session_state.store,
+                                   coupon_code or None, int(redeem_points))
+            quote = shop.quote(request)
 
+            with order_summary:
+                st.markdown("\n".join(
+                    f"- {line.quantity} x {line.coffee_type} ({line.size}): RM{price:.2f}"
+                    + (f"\n  - Add-ons: {', '.join(line.add_ons)}" if line.add_ons else "")
+                    for line, price in zip(request.lines, quote.line_prices)
+                ))
+                st.write(f"**Total Order Price:** RM{quote.subtotal:.2f}")
 
             # Automatically apply coupon when entered
-            if coupon_code:
-                coupon_found = False
-                for coupon in st.session_state.coupons:
-                    if coupon['Code'] == coupon_code:
-                        if datetime.strptime(coupon['Expiration Date'].strftime('%Y-%m-%d'), '%Y-%m-%d') >= datetime.now():
-                            discount = coupon['Discount']
-                            st.success(f"RM{discount:.2f} discount applied!")  # Show success message for coupon application
-                            coupon_found = True
-                            break
-
-                if not coupon_found:
-                    st.error("Invalid coupon or coupon has expired.")
-
-            # Calculate final price after applying coupon
-            final_price = total_order_price - discount
-            if final_price < 0:
-                final_price = 0.00  # Ensure total price does not go below RM0.00
+            if quote.coupon_valid:
+                st.success(f"RM{quote.discount:.2f} discount applied!")  # Show success message for coupon application
+            elif quote.coupon_valid is False:
+                st.error("Invalid coupon or coupon has expired.")
 
             # Live total display
             st.markdown("<h4 style='color: #3D3D3D;'>Live Total:</h4>", unsafe_allow_html=True)
-            st.write(f"**Total Price:** RM{final_price:.2f}")
-
-            # Calculate preparation time based on size and add-ons
-            base_prep_time = 0
-            if size == 'small':
-                base_prep_time = 2 * 60  # 2 minutes in seconds
-            elif size == 'medium':
-                base_prep_time = 3 * 60  # 3 minutes in seconds
-            elif size == 'large':
-                base_prep_time = 5 * 60  # 5 minutes in seconds
-
-            # Add time for each add-on (30 seconds per add-on)
-            total_prep_time = base_prep_time + (len(add_ons) * 30)  # in seconds
-
-            # Calculate waiting time based on orders ahead
-            orders_ahead = len(st.session_state.sales_data[st.session_state.sales_data['Status'] == 'Being Processed'])
-            total_waiting_time = 0
-
-            # Sum the preparation time for each order ahead in the queue
-            for idx, order in st.session_state.sales_data[st.session_state.sales_data['Status'] == 'Being Processed'].iterrows():
-                order_size = order['Size']
-                order_add_ons = order['Add-ons'].split(", ")
-
-                # Calculate preparation time for each order ahead
-                if order_size == 'small':
-                    prep_time = 2 * 60
-                elif order_size == 'medium':
-                    prep_time = 3 * 60
-                elif order_size == 'large':
-                    prep_time = 5 * 60
-
-                prep_time += len(order_add_ons) * 30  # Add time for add-ons
-                total_waiting_time += prep_time
-
-            # Calculate estimated waiting time (in minutes and seconds)
-            estimated_total_waiting_time = total_waiting_time + total_prep_time
-            minutes, seconds = divmod(estimated_total_waiting_time, 60)
+            st.write(f"**Total Price:** RM{quote.total:.2f}")
 
             # Payment Method Section
             st.markdown("<h4 style='color: #3D3D3D;'>Secure Payment</h4>", unsafe_allow_html=True)
@@ -1244,63 +1181,37 @@ def take_order():
                 valid_payment = True  # No validation needed for cash
 
 
-            # Confirm order button and inventory check
+            # Confirm order button: the core takes the coupon, stock, order number and points, or none of them
             if st.button("Confirm Order and Pay", key="confirm_order"):
                 if valid_payment:
-                    if check_inventory(coffee_type, size, 1, add_ons):
-                        order_number = generate_unique_order_number()
-                        order_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                        # Deduct points only if the user chose to redeem them and payment is successful
-                        if redeem_points > 0:
-                            redeem_success = redeem_loyalty_points(customer_name, redeem_points)
-                            if redeem_success:
-                                st.success(f"{redeem_points} loyalty points redeemed successfully!")
-                            else:
-                                st.warning("Failed to redeem points. Please check your balance.")
-
-                        # Award points based on the final price (1 point for every RM10 spent)
-                        points_earned = int(final_price)  # Integer division to award 1 point for every RM1
-                        if double_points == True:
-                            points_earned = points_earned*2
-                            
-                        if points_earned > 0:
-                            add_loyalty_points(customer_name, points_earned)
-                            st.success(f"You earned {points_earned} loyalty points for this order!")
-
-                        # Save each item in the order to the database
-                        for item in st.session_state.order_list:
-                            new_order = {
-                                'Order Number': order_number,
-                                'Customer Name': customer_name,
-                                'Coffee Type': item['coffee_type'],
-                                'Quantity': item['quantity'],
-                                'Size': item['size'],
-                                'Add-ons': ', '.join(item['add_ons']),
-                                'Price': item['price'],
-                                'Time': order_time,
-                                'Status': 'Being Processed'
-                            }
-                            st.session_state.sales_data = pd.concat([st.session_state.sales_data, pd.DataFrame([new_order])], ignore_index=True)
-
-                        # Update inventory based on the order
-                        update_inventory(coffee_type, size, 1, add_ons)
-
-                        # Show success message with the order number
-                        st.success(f"Order placed successfully with Order Number: {order_number}!")
-
-                        # Display the estimated waiting time after confirming the order
-                        st.markdown(f"**Your estimated waiting time is:** {minutes} minutes and {seconds} seconds.")
-                        
-                        # Simulate payment processing
-                        st.success(f"Payment of RM{final_price:.2f} received successfully.")
-                        # Generate and download invoice
-                        generate_invoice(order_number, customer_name, coffee_type, size, add_ons, final_price, order_time)
-
-                        # Clear the order list after successful order placement
-                        st.session_state.order_list = []
-                    else:
-                        st.error("Sorry, your order cannot be placed due to insufficient inventory!")
+                    try:
+                        receipt = shop.place_order(request)
+                    except OrderRejected as rejection:
+                        st.error(str(rejection))
+                        return
+
+                    if receipt.points_redeemed > 0:
+                        st.success(f"{receipt.points_redeemed} loyalty points redeemed successfully!")
+                    if receipt.points_earned > 0:
+                        st.success(f"You earned {receipt.points_earned} loyalty points for this order!")
+                    st.write("📊 Inventory updated.")
+
+                    # Show success message with the order number
+                    st.success(f"Order placed successfully with Order Number: {receipt.order_number}!")
+
+                    # Display the estimated waiting time after confirming the order
+                    minutes, seconds = divmod(receipt.wait_seconds, 60)
+                    st.markdown(f"**Your estimated waiting time is:** {minutes} minutes and {seconds} seconds.")
+                    typical_wait, slow_wait = shop.wait_times.percentile(0.5), shop.wait_times.percentile(0.9)
+                    if typical_wait is not None:
+                        st.caption(f"Recent orders were ready in about {typical_wait // 60} minutes "
+                                   f"(9 in 10 within {-(-slow_wait // 60)} minutes).")
+
+                    # Simulate payment processing
+                    st.success(f"Payment of RM{receipt.total:.2f} received successfully.")
+                    # Generate and download invoice
+                    generate_invoice(receipt.order_number, customer_name, coffee_type, size, add_ons, receipt.total,
+                                     receipt.placed_at.strftime("%Y-%m-%d %H:%M:%S"))
                 else:
                     st.error("Payment could not be processed due to invalid payment details. Please try again.")
 
@@ -1342,41 +1253,8 @@ def generate_invoice(order_number, customer_name, coffee_type, size, add_ons, fi
 
 
 
-# Check Inventory Based on Coffee Type, Size, and Quantity
-def check_inventory(coffee_type, size, quantity, add_ons):
-    ingredients = ingredient_usage[coffee_type][size]
-
-    if st.session_state.inventory['coffee_beans'] < ingredients['coffee_beans'] * quantity:
-        st.error(f"Sorry, {coffee_type} ({size}) is currently out of stock due to insufficient coffee beans.")
-        return False
-    if st.session_state.inventory['milk'] < (ingredients['milk'] * quantity + (extra_usage['milk'] * quantity if 'Extra milk' in add_ons else 0)):
-        st.error(f"Sorry, {coffee_type} ({size}) is currently out of stock due to insufficient milk.")
-        return False
-    if st.session_state.inventory['sugar'] < (ingredients['sugar'] * quantity + (extra_usage['sugar'] * quantity if 'Extra sugar' in add_ons else 0)):
-        st.error(f"Sorry, {coffee_type} ({size}) is currently out of stock due to insufficient sugar.")
-        return False
-    if st.session_state.inventory['cups'] < quantity:
-        st.error(f"Sorry, we are out of cups to serve {coffee_type} ({size}).")
-        return False
-    return True
-
-# Update Inventory After Successful Order
-def update_inventory(coffee_type, size, quantity, add_ons):
-    ingredients = ingredient_usage[coffee_type][size]
-    
-    st.session_state.inventory['coffee_beans'] -= ingredients['coffee_beans'] * quantity
-    st.session_state.inventory['milk'] -= ingredients['milk'] * quantity
-    if 'Extra milk' in add_ons:
-        st.session_state.inventory['milk'] -= extra_usage['milk'] * quantity  # Deduct extra milk
-    if 'Extra sugar' in add_ons:
-        st.session_state.inventory['sugar'] -= (ingredients['sugar'] * quantity + extra_usage['sugar'] * quantity)  # Deduct extra sugar
-    else:
-        st.session_state.inventory['sugar'] -= ingredients['sugar'] * quantity  # Deduct regular sugar
-    st.session_state.inventory['cups'] -= quantity
-    st.write("📊 Inventory updated.")
-
 if 'feedback' not in st.session_state:
-    st.session_state.feedback = []
+    st.session_state.feedback = get_shared_feedback()
 
 # Function to display customer feedback in the admin section
 def display_feedback():
@@ -1413,7 +1291,7 @@ def display_feedback():
 def admin_interface():
     st.sidebar.title("Administration")
     # Adding 'Order History' to the admin page selection
-    selection = st.sidebar.radio("Choose a page:", ["Inventory Management", "Sales Report", "Analytics Dashboard", "Feedback", "Kitchen Orders", "Manage Coupons", "Order History"])
+    selection = st.sidebar.radio("Choose a page:", ["Inventory Management", "Sales Report", "Analytics Dashboard", "Feedback", "Kitchen Orders", "Manage Coupons", "Order History", "Data Export"])
 
     if selection == "Inventory Management":
         display_inventory()
@@ -1429,6 +1307,8 @@ def admin_interface():
         manage_coupons()
     elif selection == "Order History":  # New section for Order History
         display_order_history()
+    elif selection == "Data Export":
+        display_data_export()
 
 
 # Main content function
@@ -1443,86 +1323,26 @@ def main_content():
     else:
         st.write("Please log in or sign up to access the app.")
 
-# Call the authentication and main content functions
-if __name__ == "__main__":
-    authenticate_user()
-    main_content()
-
-# Add store selection to session state
-if 'store' not in st.session_state:
-    st.session_state.store = "Ampang Park"
-
-if 'stores_inventory' not in st.session_state:
-    st.session_state.stores_inventory = {
-        "Ampang Park": {
-            "coffee_beans": 1000,
-            "milk": 1000,
-            "sugar": 1000,
-            "cups": 500
-        },
-        "KLCC": {
-            "coffee_beans": 800,
-            "milk": 800,
-            "sugar": 800,
-            "cups": 400
-        },
-        "Persiaran TRX": {
-            "coffee_beans": 1200,
-            "milk": 1200,
-            "sugar": 1200,
-            "cups": 600
-        },
-        "KLIA 1": {
-            "coffee_beans": 900,
-            "milk": 900,
-            "sugar": 900,
-            "cups": 450
-        },
-    }
-
-# Function to get inventory for the selected store
-def get_store_inventory():
-    return st.session_state.stores_inventory[st.session_state.store]
-
-# Function to update inventory for the selected store
-def update_store_inventory(item, amount):
-    st.session_state.stores_inventory[st.session_state.store][item] += amount
-
 # Modify authentication function to include store selection
 def authenticate_user_with_store():
     if 'user' in st.session_state:
         st.sidebar.selectbox("Select Store Location", 
-                             ["Ampang Park", "KLCC", "Persiaran TRX", "KLIA 1"], 
+                             STORES, 
                              key='store')
         st.write(f"Current Store: **{st.session_state.store}**")
-    else:
-        authenticate_user()
-
-# Update inventory management to use selected store inventory
-def display_inventory_with_store():
-    inventory = get_store_inventory()
-    st.write(f"Current Store: **{st.session_state.store}**")
-    st.write("Here's a summary of the current inventory levels for essential items:")
-    st.table(pd.DataFrame([inventory]).T.rename(columns={0: "Quantity"}))
-
-    item_to_restock = st.selectbox("Select item to restock", list(inventory.keys()))
-    restock_amount = st.number_input("Enter restock amount", min_value=0, step=10)
-
-    if st.button("Restock"):
-        update_store_inventory(item_to_restock, restock_amount)
-        st.success(f"Restocked {item_to_restock} by {restock_amount}. New total: {inventory[item_to_restock]}")
+    authenticate_user()
 
-# Use the new authentication and inventory display functions
-if __name__ == "__main__":
+# The app's only entry point: every rerun authenticates once and renders one page
+def main():
     st.sidebar.title("Navigation")
     selected_page = st.sidebar.radio("Go to:", ["Home", "About"])
 
     if selected_page == "Home":
         authenticate_user_with_store()
-        if 'user' in st.session_state:
-            if st.session_state.get('is_admin'):
-                display_inventory_with_store()
-            else:
-                display_menu()
+        main_content()
     elif selected_page == "About":
         display_about_page()
+
+
+if __name__ == "__main__":
+    main()
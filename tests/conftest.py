@@ -0,0 +1,37 @@
+import pytest
+
+from coffeeshop import core, menu
+from coffeeshop.consumption import ConsumptionEngine
+from coffeeshop.inventory import STORE_INVENTORY_DEFAULTS
+from coffeeshop.ledger import OrderLedger
+from coffeeshop.pricing import SIZES
+
+
+# A shop on its own database file; the coupon sweeper is left off so tests control time
+@pytest.fixture
+def shop(tmp_path):
+    shop = core.Shop(str(tmp_path / 'coffee_shop.db'), STORE_INVENTORY_DEFAULTS, sharded=False, coupon_sweep_seconds=0)
+    yield shop
+    shop.close()
+
+
+@pytest.fixture
+def customer(shop):
+    conn = shop.pool.connection()
+    with conn:
+        conn.execute("INSERT INTO customers (username, password, loyalty_points) VALUES ('amy', 'x', 100)")
+    return 'amy'
+
+
+@pytest.fixture
+def ledger():
+    return OrderLedger(menu.coffee_menu, SIZES, menu.add_on_prices, capacity=4, stores=list(STORE_INVENTORY_DEFAULTS))
+
+
+# The same recipe matrix Shop.engine builds
+@pytest.fixture
+def engine():
+    return ConsumptionEngine(list(menu.coffee_menu), SIZES, list(menu.add_on_prices), menu.ingredient_usage, {
+        'Extra sugar': {'sugar': menu.extra_usage['sugar']},
+        'Extra milk': {'milk': menu.extra_usage['milk']}
+    })
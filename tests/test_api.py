@@ -0,0 +1,32 @@
+import pytest
+
+from coffeeshop import api, core
+
+
+def test_parse_order():
+    order = api.parse_order({'customer_name': 'Amy', 'store': 'KLCC', 'coupon_code': None,
+                             'lines': [{'coffee_type': 'Latte', 'size': 'medium', 'add_ons': ['Extra milk'], 'quantity': 2}]})
+    assert order == core.OrderRequest('Amy', [core.OrderLine('Latte', 'medium', ['Extra milk'], 2)], 'KLCC')
+
+
+@pytest.mark.parametrize('body', [
+    [],
+    {'customer_name': 'Amy'},
+    {'customer_name': 'Amy', 'lines': [{'coffee_type': 'Latte'}]},
+    {'customer_name': 'Amy', 'lines': ['Latte']},
+    {'customer_name': 'Amy', 'store': ['KLCC'], 'lines': [{'coffee_type': 'Latte', 'size': 'small'}]},
+    {'customer_name': 'Amy', 'redeem_points': True, 'lines': [{'coffee_type': 'Latte', 'size': 'small'}]},
+    {'customer_name': 'Amy', 'lines': [{'coffee_type': 'Latte', 'size': 'small', 'quantity': '2'}]},
+    {'customer_name': 'Amy', 'lines': [{'coffee_type': 'Latte', 'size': 'small', 'add_ons': [1]}]},
+    {'customer_name': 'Amy', 'tip': 5, 'lines': [{'coffee_type': 'Latte', 'size': 'small'}]},
+])
+def test_malformed_orders_are_refused(body):
+    with pytest.raises((ValueError, TypeError)):
+        api.parse_order(body)
+
+
+def test_api_port_is_opt_in(monkeypatch):
+    monkeypatch.delenv(api.API_PORT_ENV, raising=False)
+    assert api.api_port() is None
+    monkeypatch.setenv(api.API_PORT_ENV, '8600')
+    assert api.api_port() == 8600
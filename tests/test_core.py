@@ -0,0 +1,175 @@
+import subprocess
+import sys
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+from coffeeshop import core, db, order_numbers
+from coffeeshop.core import OrderLine, OrderRequest
+from coffeeshop.inventory import DEFAULT_STORE
+
+BASKET = [OrderLine('Latte', 'small'), OrderLine('Cappuccino', 'large', ['Extra milk'], 2)]
+
+
+# Everything an order can take, to compare before and after a rejected one
+def snapshot(shop, username):
+    return {
+        'points': shop.loyalty_balance(username).points,
+        'free numbers': order_numbers.free_count(shop.pool.connection()),
+        'stock': dict(shop.store_levels(DEFAULT_STORE)),
+        'held': dict(shop.inventory.held),
+        'lines': len(shop.ledger),
+        'kitchen': shop.ledger.queue('Being Processed'),
+    }
+
+
+def test_place_order_takes_stock_number_and_points(shop, customer):
+    before = snapshot(shop, customer)
+    receipt = shop.place_order(OrderRequest(customer, BASKET, redeem_points=30))
+    after = snapshot(shop, customer)
+
+    assert receipt.discount == 3 and receipt.points_redeemed == 30
+    assert after['points'] == before['points'] - 30 + receipt.points_earned
+    assert after['free numbers'] == before['free numbers'] - 1
+    assert after['kitchen'] == [(receipt.order_number, receipt.rows)]
+    assert all(after['stock'][item] < before['stock'][item] for item in ('coffee_beans', 'milk', 'cups'))
+    assert not after['held']
+    assert shop.order_status(receipt.order_number).status == 'Being Processed'
+
+
+def test_picked_up_orders_give_their_number_back(shop, customer):
+    receipt = shop.place_order(OrderRequest(customer, BASKET))
+    free = order_numbers.free_count(shop.pool.connection())
+    with pytest.raises(core.InvalidStatusChange):
+        shop.mark_order(receipt.order_number, 'Picked Up')
+    shop.mark_order(receipt.order_number, 'Ready')
+    assert shop.mark_order(receipt.order_number, 'Picked Up').status == 'Picked Up'
+    assert order_numbers.free_count(shop.pool.connection()) == free + 1
+    with pytest.raises(core.OrderNotFound):
+        shop.order_status(receipt.order_number)
+
+
+# A board button drawn before another session handed the order over must not bring it back:
+# its number is already free and may belong to a new order
+def test_stale_board_click_leaves_a_picked_up_order_alone(shop, customer):
+    receipt = shop.place_order(OrderRequest(customer, BASKET))
+    stale_rows = list(receipt.rows)
+    shop.mark_order(receipt.order_number, 'Ready')
+    shop.mark_order(receipt.order_number, 'Picked Up')
+    free = order_numbers.free_count(shop.pool.connection())
+
+    assert not any(shop.set_order_status(row, 'Ready') for row in stale_rows)
+    assert not shop.ledger.is_active(receipt.order_number)
+    assert [shop.ledger.status(row) for row in stale_rows] == ['Picked Up'] * len(stale_rows)
+    assert order_numbers.free_count(shop.pool.connection()) == free
+    with pytest.raises(core.InvalidStatusChange):
+        shop.set_order_status(stale_rows[0], 'Being Processed')
+
+
+def test_not_enough_points_gives_everything_back(shop, customer):
+    code = 'ONCE'
+    shop.coupons.create(code, 1.0, date.today() + timedelta(days=7), max_uses=1)
+    before = snapshot(shop, customer)
+    with pytest.raises(core.NotEnoughPoints):
+        shop.place_order(OrderRequest(customer, BASKET, coupon_code=code, redeem_points=500))
+    assert snapshot(shop, customer) == before
+    # The coupon's only use went back too
+    assert shop.place_order(OrderRequest(customer, BASKET, coupon_code=code)).discount == 1.0
+
+
+def test_out_of_stock_gives_everything_back(shop, customer):
+    before = snapshot(shop, customer)
+    with pytest.raises(core.OutOfStock):
+        shop.place_order(OrderRequest(customer, [OrderLine('Caramel Macchiato', 'large', [], 10)] * 20, redeem_points=10))
+    assert snapshot(shop, customer) == before
+
+
+def test_invalid_orders_take_nothing(shop, customer):
+    before = snapshot(shop, customer)
+    with pytest.raises(core.InvalidOrder):
+        shop.place_order(OrderRequest(customer, [OrderLine('Tea', 'small')]))
+    with pytest.raises(core.InvalidOrder):
+        shop.place_order(OrderRequest(customer, [OrderLine('Latte', 'small', quantity=0)]))
+    assert snapshot(shop, customer) == before
+
+
+# A failure before any line reaches the kitchen refunds the points and frees the number too
+def test_failure_before_the_kitchen_gives_everything_back(shop, customer, monkeypatch):
+    before = snapshot(shop, customer)
+
+    def broken_append(*args, **kwargs):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(shop.ledger, 'append', broken_append)
+
+    with pytest.raises(core.OrderFailed) as failure:
+        shop.place_order(OrderRequest(customer, BASKET, redeem_points=40))
+    assert isinstance(failure.value.__cause__, RuntimeError)
+    assert snapshot(shop, customer) == before
+
+
+# Once a line is queued in the kitchen the order stands: its stock stays taken
+def test_failure_after_the_kitchen_keeps_the_order(shop, customer, monkeypatch):
+    before = snapshot(shop, customer)
+    record = shop.forecast.record
+    calls = []
+
+    def failing_second_record(ledger, row):
+        calls.append(row)
+        if len(calls) == 2:
+            raise RuntimeError("boom")
+        record(ledger, row)
+    monkeypatch.setattr(shop.forecast, 'record', failing_second_record)
+
+    with pytest.raises(core.OrderIncomplete) as incomplete:
+        shop.place_order(OrderRequest(customer, BASKET, redeem_points=40))
+    after = snapshot(shop, customer)
+    assert after['kitchen'] == [(incomplete.value.order_number, [0, 1])]
+    assert after['free numbers'] == before['free numbers'] - 1
+    assert after['stock']['milk'] < before['stock']['milk']
+    assert not after['held']
+
+
+def test_price_table_follows_menu_changes(shop, monkeypatch):
+    request = OrderRequest('guest', [OrderLine('Latte', 'small')])
+    price = shop.quote(request).subtotal
+    monkeypatch.setitem(core.menu.coffee_menu['Latte'], 'small', core.menu.coffee_menu['Latte']['small'] + 1)
+    assert shop.quote(request).subtotal == pytest.approx(price + 1)
+
+
+# Tills placing orders at once never share a number, and every line reaches the totals
+def test_concurrent_orders(shop):
+    receipts, rejected = [], []
+    barrier = threading.Barrier(8)
+
+    def till(i):
+        barrier.wait()
+        for _ in range(15):
+            try:
+                receipts.append(shop.place_order(OrderRequest(f"till {i}", [OrderLine('Americano', 'small')])))
+            except core.OutOfStock:
+                rejected.append(i)
+
+    tills = [threading.Thread(target=till, args=(i,)) for i in range(8)]
+    for thread in tills:
+        thread.start()
+    for thread in tills:
+        thread.join()
+
+    assert len({receipt.order_number for receipt in receipts}) == len(receipts) == 120 - len(rejected)
+    assert shop.aggregates.total_lines == len(shop.ledger) == len(receipts)
+    assert shop.aggregates.verify(shop.ledger) == []
+    assert min(shop.store_levels(DEFAULT_STORE).values()) >= 0
+
+
+# Order lines are stored under ledger row ids only their own shop knows, so a second shop on
+# the same database, in this process or another, must refuse to start instead of losing orders
+def test_only_one_shop_takes_orders_on_a_database(shop):
+    with pytest.raises(db.DatabaseInUse):
+        core.Shop(shop.db_path, sharded=False, coupon_sweep_seconds=0)
+    second = subprocess.run([sys.executable, '-c', f"from coffeeshop import core; core.Shop({shop.db_path!r}, sharded=False)"],
+                            capture_output=True, text=True)
+    assert second.returncode != 0 and 'DatabaseInUse' in second.stderr
+
+    shop.close()
+    core.Shop(shop.db_path, sharded=False, coupon_sweep_seconds=0).close()
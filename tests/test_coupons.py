@@ -0,0 +1,81 @@
+import threading
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from coffeeshop.coupons import CODE_ALPHABET, CouponService
+
+NEXT_WEEK = date.today() + timedelta(days=7)
+
+
+@pytest.fixture
+def coupons(shop):
+    return shop.coupons
+
+
+def test_use_limit_and_release(coupons):
+    coupons.create('TWICE', 2.0, NEXT_WEEK, max_uses=2)
+    assert coupons.discount('TWICE') == 2.0
+    assert coupons.redeem('TWICE') and coupons.redeem('TWICE')
+    assert not coupons.redeem('TWICE')
+    assert coupons.discount('TWICE') is None
+    coupons.release('TWICE')
+    assert coupons.redeem('TWICE')
+
+
+# Re-saving a code from the admin form changes its terms but never its use count
+def test_saving_an_existing_code_keeps_its_uses(coupons):
+    coupons.create('ONCE', 1.0, NEXT_WEEK, max_uses=1)
+    assert coupons.redeem('ONCE')
+    assert coupons.create('ONCE', 1.5, NEXT_WEEK + timedelta(days=7), max_uses=1) == 1
+    assert not coupons.redeem('ONCE')
+    assert coupons.discount('ONCE') is None
+    # Raising the limit gives it exactly one more use
+    coupons.create('ONCE', 1.5, NEXT_WEEK, max_uses=2)
+    assert coupons.discount('ONCE') == 1.5
+    assert coupons.redeem('ONCE') and not coupons.redeem('ONCE')
+
+
+def test_coupons_expire_at_the_start_of_their_date(coupons):
+    coupons.create('WEEK', 1.0, NEXT_WEEK)
+    assert coupons.discount('WEEK', now=datetime.combine(NEXT_WEEK, datetime.min.time()) - timedelta(seconds=1)) == 1.0
+    assert coupons.discount('WEEK', now=datetime.combine(NEXT_WEEK, datetime.min.time())) is None
+    assert not coupons.redeem('WEEK', now=datetime.combine(NEXT_WEEK, datetime.min.time()))
+
+
+def test_sweep_evicts_expired_codes_from_memory_and_database(shop, coupons):
+    coupons.create('SOON', 1.0, date.today() + timedelta(days=1))
+    coupons.create('LATER', 1.0, NEXT_WEEK)
+    assert coupons.sweep(now=datetime.combine(date.today() + timedelta(days=2), datetime.min.time())) == 1
+    assert len(coupons) == 1
+    assert [code for code, in shop.pool.connection().execute("SELECT code FROM coupons")] == ['LATER']
+    # A fresh service, e.g. after a restart, only loads what is left
+    assert len(CouponService(shop.pool)) == 1
+
+
+# However many tills redeem at once, a limited coupon is never used more often than allowed
+def test_concurrent_redemptions_respect_the_limit(coupons):
+    coupons.create('RUSH', 1.0, NEXT_WEEK, max_uses=50)
+    redeemed = []
+    barrier = threading.Barrier(8)
+
+    def till():
+        barrier.wait()
+        redeemed.extend(ok for ok in (coupons.redeem('RUSH') for _ in range(20)) if ok)
+
+    tills = [threading.Thread(target=till) for _ in range(8)]
+    for thread in tills:
+        thread.start()
+    for thread in tills:
+        thread.join()
+    assert len(redeemed) == 50
+
+
+def test_generate_makes_new_single_use_codes(coupons):
+    coupons.create('EXISTING', 1.0, NEXT_WEEK)
+    codes = coupons.generate(200, 0.5, NEXT_WEEK, prefix='X', length=3)
+    assert len(set(codes)) == 200 and 'EXISTING' not in codes
+    assert all(code[0] == 'X' and set(code[1:]) <= set(CODE_ALPHABET) for code in codes)
+    assert coupons.redeem(codes[0]) and not coupons.redeem(codes[0])
+    with pytest.raises(ValueError):
+        coupons.generate(2, 0.5, NEXT_WEEK, length=0)
@@ -0,0 +1,119 @@
+import threading
+
+from coffeeshop import core, db
+from coffeeshop.core import OrderLine, OrderRequest
+from coffeeshop.inventory import STORE_INVENTORY_DEFAULTS
+
+CREATE_NOTES = "CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT)"
+INSERT_NOTE = "INSERT INTO notes (id, body) VALUES (?, ?)"
+
+
+def notes(path):
+    return db.connect(path).execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+
+def make_notes_db(tmp_path):
+    path = str(tmp_path / 'coffee_shop.db')
+    conn = db.connect(path)
+    conn.execute(CREATE_NOTES)
+    conn.close()
+    return path
+
+
+# Writes wait for the batch window and then land together; flush() commits them at once
+def test_write_behind_batches_until_flushed(tmp_path):
+    path = make_notes_db(tmp_path)
+    writes = db.WriteBehindQueue(path, flush_interval_ms=60_000)
+    try:
+        for i in range(100):
+            writes.put(INSERT_NOTE, (i, f"note {i}"))
+        assert notes(path) == 0
+        assert writes.flush(timeout=10)
+        assert notes(path) == 100
+    finally:
+        writes.close()
+
+
+def test_close_writes_everything_still_queued(tmp_path):
+    path = make_notes_db(tmp_path)
+    writes = db.WriteBehindQueue(path, flush_interval_ms=60_000)
+    for i in range(10):
+        writes.put(INSERT_NOTE, (i, 'x'))
+    writes.close()
+    assert notes(path) == 10
+    assert writes.flush()
+
+
+# One bad statement is dropped on its own; the rest of its batch still lands
+def test_a_bad_write_does_not_drop_its_batch(tmp_path):
+    path = make_notes_db(tmp_path)
+    writes = db.WriteBehindQueue(path, flush_interval_ms=60_000)
+    try:
+        writes.put(INSERT_NOTE, (1, 'first'))
+        writes.put(INSERT_NOTE, (1, 'same id again'))
+        writes.put(INSERT_NOTE, (2, 'second'))
+        writes.flush(timeout=10)
+        assert db.connect(path).execute("SELECT id, body FROM notes ORDER BY id").fetchall() == [(1, 'first'), (2, 'second')]
+    finally:
+        writes.close()
+
+
+# Orders persisted through the queue come back on restart under the same ledger rows and statuses
+def test_orders_reload_under_the_same_rows(shop):
+    first = shop.place_order(OrderRequest('amy', [OrderLine('Latte', 'small'), OrderLine('Americano', 'large')]))
+    second = shop.place_order(OrderRequest('bob', [OrderLine('Cappuccino', 'medium', ['Extra milk'], 2)]))
+    shop.mark_order(first.order_number, 'Ready')
+    lines = [shop.ledger.row(row) for row in first.rows + second.rows]
+    shop.close()
+
+    reopened = core.Shop(shop.db_path, STORE_INVENTORY_DEFAULTS, sharded=False, coupon_sweep_seconds=0)
+    try:
+        assert len(reopened.ledger) == 3
+        assert [reopened.ledger.row(row) for row in first.rows + second.rows] == lines
+        assert reopened.ledger.queue('Ready') == [(first.order_number, first.rows)]
+    finally:
+        reopened.close()
+
+
+# Each thread gets its own connection and keeps it; every connection is in WAL mode
+def test_pool_hands_each_thread_its_own_connection(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / 'coffee_shop.db'), busy_timeout_ms=1234)
+    mine = pool.connection()
+    assert pool.connection() is mine
+    assert mine.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    assert mine.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+
+    theirs = []
+    threads = [threading.Thread(target=lambda: theirs.append(pool.connection())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(conn) for conn in theirs + [mine]}) == 5
+
+
+# Many sessions writing at once through the pool neither fail on a locked database nor lose writes
+def test_pool_serves_concurrent_sessions(tmp_path):
+    path = make_notes_db(tmp_path)
+    pool = db.ConnectionPool(path)
+    errors = []
+    barrier = threading.Barrier(16)
+
+    def session(i):
+        barrier.wait()
+        try:
+            for j in range(25):
+                conn = pool.connection()
+                with conn:
+                    conn.execute(INSERT_NOTE, (i * 100 + j, 'x'))
+                conn.execute("SELECT COUNT(*) FROM notes").fetchone()
+        except Exception as error:
+            errors.append(error)
+
+    sessions = [threading.Thread(target=session, args=(i,)) for i in range(16)]
+    for thread in sessions:
+        thread.start()
+    for thread in sessions:
+        thread.join()
+    assert errors == []
+    assert notes(path) == 16 * 25
@@ -0,0 +1,55 @@
+import threading
+
+from coffeeshop import events
+from coffeeshop.core import OrderLine, OrderRequest
+from coffeeshop.events import EventBus
+
+
+def test_since_returns_only_newer_events():
+    bus = EventBus()
+    first = bus.publish(events.ORDER_CREATED, 1001)
+    bus.publish(events.ORDER_READY, 1001)
+    version, new = bus.since(first.version)
+    assert version == bus.version == 2
+    assert [(event.kind, event.order_number) for event in new] == [(events.ORDER_READY, 1001)]
+    assert bus.since(version) == (2, [])
+
+
+def test_the_log_is_bounded():
+    bus = EventBus(history=3)
+    for number in range(10):
+        bus.publish(events.ORDER_CREATED, number)
+    version, new = bus.since(0)
+    assert version == 10 and [event.order_number for event in new] == [7, 8, 9]
+
+
+def test_subscribers_hear_events_until_they_unsubscribe():
+    bus = EventBus()
+    heard = []
+    unsubscribe = bus.subscribe(heard.append)
+    bus.publish(events.ORDER_CREATED, 1)
+    unsubscribe()
+    unsubscribe()
+    bus.publish(events.ORDER_CREATED, 2)
+    assert [event.order_number for event in heard] == [1]
+
+
+def test_wait_wakes_on_publish():
+    bus = EventBus()
+    assert not bus.wait(0, timeout=0.01)
+    threading.Timer(0.05, bus.publish, args=(events.ORDER_READY, 7)).start()
+    assert bus.wait(0, timeout=10)
+
+
+# The shop announces an order once: when it is placed, when its last line is ready and when it is picked up
+def test_shop_publishes_the_order_lifecycle(shop):
+    receipt = shop.place_order(OrderRequest('amy', [OrderLine('Latte', 'small'), OrderLine('Americano', 'small')]))
+    shop.set_order_status(receipt.rows[0], 'Ready')
+    assert [event.kind for event in shop.events.since(0)[1]] == [events.ORDER_CREATED]
+    shop.set_order_status(receipt.rows[1], 'Ready')
+    shop.mark_order(receipt.order_number, 'Picked Up')
+    assert [(event.kind, event.order_number) for event in shop.events.since(0)[1]] == [
+        (events.ORDER_CREATED, receipt.order_number),
+        (events.ORDER_READY, receipt.order_number),
+        (events.ORDER_PICKED_UP, receipt.order_number),
+    ]
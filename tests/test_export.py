@@ -0,0 +1,67 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from coffeeshop import db, export, migrations
+from coffeeshop.ledger import to_epoch
+
+START = datetime(2026, 3, 2, 8, 0)
+
+
+# 50 order lines an hour apart, with the text a CSV writer has to quote
+@pytest.fixture
+def conn(tmp_path):
+    conn = db.connect(str(tmp_path / 'coffee_shop.db'))
+    migrations.migrate(conn)
+    with conn:
+        conn.executemany(db.INSERT_ORDER_LINE, [
+            (i, 1000 + i, 'Lee, "Jr."\nand co' if i == 3 else f"guest {i}", 'Latte', 1 + i % 3, 'small',
+             'Extra sugar, Extra milk' if i % 2 else '', 4.5 + i, to_epoch(START + timedelta(hours=i)), 'Being Processed',
+             None if i == 4 else 'KLCC')
+            for i in range(1, 51)
+        ])
+    return conn
+
+
+def expected_rows(first=1, last=50):
+    return [(i, 1000 + i, 'Lee, "Jr."\nand co' if i == 3 else f"guest {i}", 'Latte', 1 + i % 3, 'small',
+             'Extra sugar, Extra milk' if i % 2 else '', 4.5 + i, START + timedelta(hours=i), 'Being Processed',
+             None if i == 4 else 'KLCC')
+            for i in range(first, last + 1)]
+
+
+def test_csv_round_trip(conn):
+    data = export.export_bytes(conn, 'sales', 'csv', chunk_size=7)
+    header, *rows = list(csv.reader(io.StringIO(data.decode('utf-8'), newline='')))
+    assert header == export.DATASETS['sales'].columns
+    assert rows == [[str(value) if value is not None else '' for value in row[:8]]
+                    + [row[8].strftime("%Y-%m-%d %H:%M:%S"), row[9], row[10] or '']
+                    for row in expected_rows()]
+
+
+def test_parquet_round_trip(conn):
+    pq = pytest.importorskip('pyarrow.parquet')
+    data = export.export_bytes(conn, 'sales', 'parquet', chunk_size=7)
+    table = pq.read_table(io.BytesIO(data))
+    assert table.column_names == export.DATASETS['sales'].columns
+    assert [tuple(row.values()) for row in table.to_pylist()] == expected_rows()
+
+
+# The range is half-open and chunking never repeats or skips a row
+def test_time_range_filter(conn):
+    data = export.export_bytes(conn, 'sales', 'csv', START + timedelta(hours=10), START + timedelta(hours=20), chunk_size=3)
+    rows = list(csv.reader(io.StringIO(data.decode('utf-8'), newline='')))[1:]
+    assert [int(row[0]) for row in rows] == list(range(10, 20))
+
+
+def test_empty_parquet_export_is_still_a_valid_file(conn):
+    pq = pytest.importorskip('pyarrow.parquet')
+    data = export.export_bytes(conn, 'loyalty', 'parquet')
+    assert pq.read_table(io.BytesIO(data)).num_rows == 0
+
+
+def test_unknown_format(conn):
+    with pytest.raises(ValueError):
+        export.export_bytes(conn, 'sales', 'xlsx')
@@ -0,0 +1,93 @@
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from coffeeshop.inventory import InsufficientStock, StoreInventory
+
+STOCK = {'coffee_beans': 5000, 'milk': 5000, 'sugar': 5000, 'cups': 400}
+BASKETS = [
+    [('Latte', 'small', [], 1)],
+    [('Cappuccino', 'large', ['Extra milk'], 2)],
+    [('Americano', 'medium', ['Extra sugar'], 1), ('Caramel Macchiato', 'small', ['Extra milk', 'Extra sugar'], 3)],
+]
+
+
+@pytest.fixture
+def inventory(engine):
+    return StoreInventory({'KLCC': dict(STOCK), 'KLIA 1': dict(STOCK)}, engine)
+
+
+def test_requirement_totals_the_whole_basket(inventory):
+    one = inventory.requirement(BASKETS[0])
+    both = inventory.requirement(BASKETS[0] + BASKETS[1])
+    np.testing.assert_array_equal(both, one + inventory.requirement(BASKETS[1]))
+    assert both[inventory.ingredient_index('cups')] == 3
+
+
+# A basket that any one ingredient cannot cover takes nothing at all
+def test_reserve_is_all_or_nothing(inventory):
+    before = inventory.levels.copy()
+    with pytest.raises(InsufficientStock) as shortage:
+        inventory.reserve('KLCC', inventory.requirement([('Latte', 'large', [], 10)]) * 100)
+    assert shortage.value.store == 'KLCC'
+    np.testing.assert_array_equal(inventory.levels, before)
+    assert not inventory.held
+
+
+def test_release_gives_stock_back_once(inventory):
+    before = inventory.levels.copy()
+    reservation = inventory.reserve('KLCC', inventory.requirement(BASKETS[1]))
+    assert inventory.release(reservation)
+    assert not inventory.release(reservation)
+    np.testing.assert_array_equal(inventory.levels, before)
+
+
+def test_commit_keeps_stock_taken(inventory):
+    needed = inventory.requirement(BASKETS[2])
+    reservation = inventory.reserve('KLIA 1', needed)
+    assert inventory.commit(reservation) == {ingredient: int(amount) for ingredient, amount in zip(inventory.ingredients, needed) if amount}
+    assert not inventory.release(reservation)
+    with pytest.raises(KeyError):
+        inventory.commit(reservation)
+
+
+# Many tills reserve, release and commit against the same stores until they run dry.
+# Stock never goes negative, and what is left is exactly the start minus what was committed.
+def test_concurrent_reservations_never_oversell(inventory):
+    start = inventory.levels.copy()
+    committed = np.zeros_like(start)
+    committed_lock = threading.Lock()
+    rejections = []
+    barrier = threading.Barrier(8)
+
+    def till(seed):
+        rng = random.Random(seed)
+        barrier.wait()
+        for _ in range(400):
+            store = rng.choice(inventory.stores)
+            needed = inventory.requirement(rng.choice(BASKETS))
+            try:
+                reservation = inventory.reserve(store, needed)
+            except InsufficientStock:
+                rejections.append(store)
+                continue
+            assert (inventory.levels >= 0).all()
+            if rng.random() < 0.3:
+                inventory.release(reservation)
+            else:
+                inventory.commit(reservation)
+                with committed_lock:
+                    committed[inventory.store_index(store)] += needed
+
+    tills = [threading.Thread(target=till, args=(seed,)) for seed in range(8)]
+    for thread in tills:
+        thread.start()
+    for thread in tills:
+        thread.join()
+
+    assert rejections, "the stores should have run out of something"
+    assert (inventory.levels >= 0).all()
+    assert not inventory.held
+    np.testing.assert_array_equal(inventory.levels, start - committed)
@@ -0,0 +1,135 @@
+import random
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from coffeeshop.aggregates import RecordedRows, SalesAggregates
+from coffeeshop.forecast import DemandForecast
+from coffeeshop.inventory import STORE_INVENTORY_DEFAULTS
+
+START = datetime(2026, 3, 2, 8, 0)
+
+
+def fill(ledger, n, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        ledger.append(1000 + i % 50, f"guest {i}", rng.choice(ledger.coffee_types), rng.randint(1, 3), rng.choice(ledger.sizes),
+                      rng.sample(ledger.add_ons, rng.randint(0, len(ledger.add_ons))), rng.choice([0.0, 4.5, 7.25]),
+                      START + timedelta(minutes=17 * i), store=rng.choice(ledger.stores))
+
+
+def test_append_grows_and_keeps_every_row(ledger):
+    fill(ledger, 100)
+    assert len(ledger) == 100 and ledger.capacity >= 100
+    row = ledger.row(37)
+    assert row['Order Number'] == 1037 and row['Customer Name'] == 'guest 37'
+    assert row['Time'] == START + timedelta(minutes=17 * 37)
+    frame = ledger.frame()
+    assert list(frame.index) == list(range(100))
+    assert frame.loc[37, 'Coffee Type'] == row['Coffee Type'] and frame.loc[37, 'Add-ons'] == row['Add-ons']
+
+
+def test_time_range_is_half_open(ledger):
+    fill(ledger, 10)
+    rows = ledger.time_range(START + timedelta(minutes=17), START + timedelta(minutes=17 * 4))
+    assert list(range(len(ledger)))[rows] == [1, 2, 3]
+
+
+def test_status_queues_follow_status_changes(ledger):
+    fill(ledger, 3)
+    assert [number for number, _ in ledger.queue('Being Processed')] == [1000, 1001, 1002]
+    ledger.set_status(1, 'Ready')
+    assert ledger.active_rows(1001) == {'Ready': [1]}
+    ledger.set_status(1, 'Picked Up')
+    assert not ledger.is_active(1001)
+    # A move that expects a status the line has already left does nothing
+    assert not ledger.set_status(1, 'Ready', expected='Being Processed')
+    assert ledger.status(1) == 'Picked Up' and not ledger.is_active(1001)
+
+
+def test_recorded_rows_tracks_out_of_order_rows():
+    recorded = RecordedRows()
+    assert recorded.add(2) and recorded.add(0)
+    assert not recorded.add(2)
+    assert recorded.next_row == 1 and 2 in recorded and 1 not in recorded
+    assert recorded.add(1)
+    assert recorded.next_row == 3 and len(recorded) == 3
+
+
+# Rows are appended in order but recorded by many threads in any order, as concurrent
+# orders are; every row reaches the running totals exactly once
+def record_shuffled(ledger, recorders, threads=8):
+    rows = list(range(len(ledger)))
+    random.Random(1).shuffle(rows)
+    # Each row is recorded twice, which must change nothing
+    rows += rows[:100]
+
+    def work(chunk):
+        for row in chunk:
+            for recorder in recorders:
+                recorder.record(ledger, row)
+
+    workers = [threading.Thread(target=work, args=(rows[i::threads],)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def test_aggregates_match_the_ledger_when_recorded_out_of_order(ledger, engine):
+    fill(ledger, 800)
+    aggregates = SalesAggregates(engine)
+    record_shuffled(ledger, [aggregates])
+    assert aggregates.total_lines == 800
+    assert aggregates.verify(ledger) == []
+
+
+def test_forecast_matches_the_ledger_when_recorded_out_of_order(ledger, engine):
+    fill(ledger, 800)
+    stores = list(STORE_INVENTORY_DEFAULTS)
+    forecast = DemandForecast(engine, stores)
+    record_shuffled(ledger, [forecast])
+    rebuilt = DemandForecast.from_ledger(ledger, engine, stores)
+    assert len(forecast.recorded) == 800
+    np.testing.assert_allclose(forecast.weekly, rebuilt.weekly)
+
+
+# Rows appended after a rebuild are recorded on top of it; rows it already holds are not
+def test_rebuilt_totals_only_take_new_rows(ledger, engine):
+    fill(ledger, 50)
+    aggregates = SalesAggregates.from_ledger(ledger, engine)
+    fill(ledger, 10, seed=1)
+    for row in range(len(ledger)):
+        aggregates.record(ledger, row)
+    assert aggregates.total_lines == 60
+    assert aggregates.verify(ledger) == []
+
+
+@pytest.fixture
+def steady_forecast(ledger, engine):
+    # One small latte every ten minutes for two whole weeks up to `now`
+    now = datetime(2026, 10, 18, 14, 30)
+    forecast = DemandForecast(engine, ledger.stores)
+    moment = datetime(2026, 10, 4)
+    while moment < now:
+        forecast.record(ledger, ledger.append(1, 'guest', 'Latte', 1, 'small', [], 5.0, moment, store=ledger.stores[0]))
+        moment += timedelta(minutes=10)
+    per_hour = 6 * engine.usage[engine.combination([engine.coffee_types.index('Latte')], [0], [0])[0]]
+    return forecast, now, per_hour
+
+
+# The hours still to come today must not water down today's weekday
+def test_forecast_demand_is_unbiased_part_way_through_a_day(steady_forecast):
+    forecast, now, per_hour = steady_forecast
+    np.testing.assert_allclose(forecast.demand(now, 24)[0], per_hour * 24)
+    np.testing.assert_allclose(forecast.demand(now, 7)[0], per_hour * 7)
+
+
+def test_forecast_stockout_hours(steady_forecast):
+    forecast, now, per_hour = steady_forecast
+    milk = forecast.ingredients.index('milk')
+    levels = np.zeros((len(forecast.stores), len(forecast.ingredients)))
+    levels[0, milk] = per_hour[milk] * 10
+    assert forecast.hours_to_stockout(levels, now)[0, milk] == pytest.approx(10)
@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+from coffeeshop import db, loyalty, migrations
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'coffee_shop.db')
+    conn = db.connect(path)
+    migrations.migrate(conn)
+    with conn:
+        conn.execute("INSERT INTO customers (username, password, loyalty_points) VALUES ('amy', 'x', 0)")
+    return path
+
+
+def test_redeem_never_overdraws(db_path):
+    conn = db.connect(db_path)
+    assert loyalty.credit_points(conn, 'amy', 50)
+    assert not loyalty.credit_points(conn, 'nobody', 50)
+    assert loyalty.redeem_points(conn, 'amy', 30)
+    assert not loyalty.redeem_points(conn, 'amy', 30)
+    assert conn.execute("SELECT loyalty_points FROM customers WHERE username='amy'").fetchone()[0] == 20
+
+
+# Compactions racing each other still fold every history row in exactly once
+def test_concurrent_compactions_count_each_row_once(db_path):
+    conn = db.connect(db_path)
+    for _ in range(20):
+        with conn:
+            conn.executemany(loyalty.INSERT_HISTORY, [('amy', 2, 'x', '2026-01-01 00:00:00', 0)] * 500)
+            conn.execute(loyalty.INSERT_HISTORY, ('amy', -5, 'x', '2026-01-01 00:00:00', 0))
+        barrier = threading.Barrier(4)
+
+        def compact():
+            other = db.connect(db_path)
+            barrier.wait()
+            loyalty.compact_summary(other)
+
+        workers = [threading.Thread(target=compact) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    assert loyalty.summary(conn, 'amy')[:3] == (20000, 100, 10020)
@@ -0,0 +1,45 @@
+from coffeeshop import db, migrations
+
+
+def test_migrate_is_idempotent(tmp_path):
+    conn = db.connect(str(tmp_path / 'coffee_shop.db'))
+    assert migrations.migrate(conn) == [version for version, _, _ in migrations.MIGRATIONS]
+    assert migrations.migrate(conn) == []
+    assert migrations.current_version(conn) == migrations.LATEST_VERSION
+
+
+# Timestamps that do not parse stay NULL without stalling the batched backfills
+def test_epoch_backfills_skip_unparseable_timestamps(tmp_path):
+    conn = db.connect(str(tmp_path / 'coffee_shop.db'))
+    migrations.migrate(conn)
+    with conn:
+        conn.executemany("INSERT INTO loyalty_points_history (username, points, description, timestamp) VALUES ('a', 1, 'x', ?)",
+                         [('garbage',)] * 50 + [('2024-01-02 03:04:05',)] * 25)
+        conn.executemany("INSERT INTO restock_history (item, amount, cost, time) VALUES ('milk', 1, 1, ?)",
+                         [('??',)] * 30 + [('2024-01-02 03:04:05',)] * 7)
+        conn.execute("DELETE FROM schema_version WHERE version >= 4")
+
+    assert migrations.migrate(conn, batch_size=10)[0] == 4
+    assert conn.execute("SELECT COUNT(ts) FROM loyalty_points_history").fetchone()[0] == 25
+    assert conn.execute("SELECT COUNT(ts) FROM restock_history").fetchone()[0] == 7
+    assert conn.execute("SELECT ts FROM restock_history WHERE time = '2024-01-02 03:04:05'").fetchone()[0] == 1704164645
+
+
+# Customers made by the old DDL lost loyalty_points to a missing comma; the repair
+# copies them over in batches with balances summed from the history
+def test_repair_customers_rebuilds_balances(tmp_path):
+    conn = db.connect(str(tmp_path / 'coffee_shop.db'))
+    with conn:
+        conn.execute('''CREATE TABLE customers (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT,
+                        favorite_order TEXT loyalty_points INTEGER DEFAULT 0)''')
+        conn.executemany("INSERT INTO customers (username, password) VALUES (?, 'x')", [(f"c{i}",) for i in range(120)])
+        conn.execute("CREATE TABLE loyalty_points_history (id INTEGER PRIMARY KEY, username TEXT, points INTEGER, "
+                     "description TEXT, timestamp TEXT)")
+        conn.executemany("INSERT INTO loyalty_points_history (username, points, description, timestamp) VALUES (?, ?, 'x', '')",
+                         [(f"c{i % 40}", points) for i in range(400) for points in (10, -3)])
+
+    migrations.migrate(conn, batch_size=25)
+    balances = dict(conn.execute("SELECT username, loyalty_points FROM customers").fetchall())
+    assert len(balances) == 120
+    assert balances['c0'] == 10 * 7 and balances['c39'] == 10 * 7 and balances['c40'] == 0
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_temp_master WHERE name = 'repair_balances'").fetchone()[0] == 0
@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+from coffeeshop import db, migrations, order_numbers
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'coffee_shop.db')
+    migrations.migrate(db.connect(path))
+    return path
+
+
+def test_pool_starts_with_every_four_digit_number(db_path):
+    conn = db.connect(db_path)
+    assert order_numbers.free_count(conn) == order_numbers.LAST_NUMBER - order_numbers.FIRST_NUMBER + 1
+    number = order_numbers.allocate(conn)
+    assert order_numbers.FIRST_NUMBER <= number <= order_numbers.LAST_NUMBER
+
+
+# Two tills on their own connections are never handed the same number
+def test_concurrent_allocations_are_unique(db_path):
+    numbers = []
+    barrier = threading.Barrier(6)
+
+    def till():
+        conn = db.connect(db_path)
+        barrier.wait()
+        numbers.extend(order_numbers.allocate(conn) for _ in range(200))
+
+    tills = [threading.Thread(target=till) for _ in range(6)]
+    for thread in tills:
+        thread.start()
+    for thread in tills:
+        thread.join()
+    assert len(set(numbers)) == len(numbers) == 1200
+
+
+# At full occupancy allocation fails fast, and a released number goes to the back of the ring
+def test_full_pool_and_recycling(db_path):
+    conn = db.connect(db_path)
+    taken = [order_numbers.allocate(conn) for _ in range(order_numbers.free_count(conn))]
+    with pytest.raises(order_numbers.OrderNumbersExhausted):
+        order_numbers.allocate(conn)
+    order_numbers.release(conn, taken[0])
+    order_numbers.release(conn, taken[0])
+    order_numbers.release(conn, taken[1])
+    assert order_numbers.free_count(conn) == 2
+    assert [order_numbers.allocate(conn), order_numbers.allocate(conn)] == taken[:2]
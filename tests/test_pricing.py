@@ -0,0 +1,48 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from coffeeshop import menu
+from coffeeshop.pricing import SIZES, PriceTable
+
+ADD_ON_CHOICES = [[], ['Extra sugar'], ['Extra milk'], ['Extra sugar', 'Extra milk']]
+
+
+# The per-line offer rules the order form applied before the table existed
+def reference_price(coffee, size, add_ons, quantity, offer):
+    price = (menu.coffee_menu[coffee][size] + sum(menu.add_on_prices[add_on] for add_on in add_ons)) * quantity
+    if offer and offer['coffee_type'] == coffee:
+        if offer['discount'] == 'bogo':
+            price *= 0.5
+        elif isinstance(offer['discount'], float):
+            price *= 1 - offer['discount']
+    return price
+
+
+@pytest.mark.parametrize('weekday', list(menu.daily_offers))
+def test_every_line_matches_the_offer_rules(weekday):
+    offer = menu.daily_offers[weekday]
+    table = PriceTable(menu.coffee_menu, menu.add_on_prices, offer)
+    lines = [(coffee, size, add_ons, quantity)
+             for coffee, size, add_ons, quantity in itertools.product(menu.coffee_menu, SIZES, ADD_ON_CHOICES, [1, 3])]
+    prices, total = table.price_lines(lines)
+    expected = [reference_price(*line, offer) for line in lines]
+    np.testing.assert_allclose(prices, expected)
+    assert total == pytest.approx(sum(expected))
+    assert [table.line_price(*line) for line in lines] == pytest.approx(expected)
+    assert table.double_points == (offer['discount'] == 'double_points')
+
+
+def test_no_offer_and_an_empty_basket():
+    table = PriceTable(menu.coffee_menu, menu.add_on_prices)
+    assert table.line_price('Latte', 'large', ['Extra milk'], 2) == pytest.approx(reference_price('Latte', 'large', ['Extra milk'], 2, None))
+    prices, total = table.price_lines([])
+    assert len(prices) == 0 and total == 0
+
+
+def test_size_labels_show_the_step_up_from_small():
+    labels = PriceTable(menu.coffee_menu, menu.add_on_prices).size_labels['Latte']
+    small, medium = menu.coffee_menu['Latte']['small'], menu.coffee_menu['Latte']['medium']
+    assert labels['small'] == f"Small (RM{small:.2f})"
+    assert labels['medium'] == f"Medium (+RM{medium - small:.2f})"
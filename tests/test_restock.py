@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from coffeeshop import menu, restock
+from coffeeshop.ledger import to_epoch
+
+
+def test_cost_is_per_restock_unit():
+    assert restock.cost('milk', 250, {'milk': 2.0}, {'milk': 100}) == pytest.approx(5.0)
+
+
+# A restock raises the store's stock and is recorded as one purchase order with a line per item
+def test_restock_records_one_purchase_order(shop):
+    before = dict(shop.store_levels('KLCC'))
+    receipt = shop.restock('KLCC', {'milk': 200, 'cups': 50, 'sugar': 0})
+    assert receipt.levels == {'milk': before['milk'] + 200, 'cups': before['cups'] + 50}
+    assert shop.store_levels('KLIA 1')['milk'] == 900
+
+    conn = shop.pool.connection()
+    lines = restock.purchase_order_lines(conn, receipt.order_id)
+    assert [(item, amount, store) for item, amount, _, _, store in lines] == [('milk', 200, 'KLCC'), ('cups', 50, 'KLCC')]
+    assert sum(cost for _, _, cost, _, _ in lines) == pytest.approx(receipt.total_cost)
+    assert receipt.costs['milk'] == pytest.approx(2 * menu.restock_prices['milk'])
+    assert restock.total_cost(conn) == pytest.approx(receipt.total_cost)
+
+
+# Range invoices read the history in keyset batches; every line comes back once, oldest first
+def test_iter_lines_pages_through_a_time_range(shop):
+    conn = shop.pool.connection()
+    start = datetime(2026, 3, 1, 8, 0)
+    with conn:
+        conn.executemany(restock.INSERT_LINE, [
+            (None, 'KLCC' if i % 2 else 'KLIA 1', 'milk', i, float(i), str(start + timedelta(minutes=i // 3)),
+             to_epoch(start + timedelta(minutes=i // 3)))
+            for i in range(1, 101)
+        ])
+    lines = list(restock.iter_lines(conn, batch_size=7))
+    assert [amount for _, amount, _, _, _ in lines] == list(range(1, 101))
+    klcc = list(restock.iter_lines(conn, store='KLCC', batch_size=4))
+    assert [amount for _, amount, _, _, _ in klcc] == list(range(1, 101, 2))
+
+
+def test_invoice_lists_every_line_and_the_total():
+    lines = [('milk', 200, 4.0, '2026-03-01 08:00:00', 'KLCC'), ('cups', 50, 5.5, '2026-03-01 08:00:00', None)]
+    text = restock.invoice_bytes("Restock Invoice", lines).decode('utf-8')
+    body = text.splitlines()
+    assert body[0] == "Restock Invoice"
+    assert sum(line.startswith('| milk') or line.startswith('| cups') for line in body) == 2
+    assert body[-1] == "Total Cost: RM9.50"
@@ -0,0 +1,73 @@
+import sqlite3
+from datetime import date, datetime
+
+import pytest
+
+from coffeeshop import core, shards
+from coffeeshop.core import OrderLine, OrderRequest
+from coffeeshop.inventory import STORE_INVENTORY_DEFAULTS
+from coffeeshop.ledger import to_epoch
+
+STOCK = {'coffee_beans': 800, 'milk': 800, 'sugar': 800, 'cups': 400}
+
+
+# The worker side run in this process, on its own shard file
+@pytest.fixture
+def worker(tmp_path):
+    shards.init_worker('KLCC', str(tmp_path / 'coffee_shop.klcc.db'), STOCK)
+    yield
+    shards._shard.pop('conn').close()
+    shards._shard.clear()
+
+
+def test_shard_path_sits_next_to_the_main_database():
+    assert shards.shard_path('KLIA 1', '/data/coffee_shop.db') == '/data/coffee_shop.klia-1.db'
+
+
+def test_reserve_takes_the_whole_basket_or_nothing(worker):
+    short, levels = shards.reserve({'milk': 100, 'cups': 2})
+    assert short is None and levels['milk'] == 700 and levels['cups'] == 398
+    short, levels = shards.reserve({'milk': 100, 'sugar': 10 ** 6})
+    assert short == 'sugar' and levels['milk'] == 700
+
+
+# An error part-way through a basket rolls back, so the worker's next call still works
+def test_reserve_rolls_back_on_error(worker):
+    with pytest.raises(sqlite3.Error):
+        shards.reserve({'milk': 100, 'sugar': object()})
+    short, levels = shards.reserve({'milk': 10})
+    assert short is None and levels['milk'] == 790
+
+
+def test_sales_totals_leave_out_free_lines(worker):
+    now = to_epoch(datetime(2026, 3, 2, 9, 0))
+    shards.record_order_lines([
+        (1001, 'amy', 'Latte', 2, 'small', '', 9.0, now),
+        (1001, 'amy', 'Latte', 1, 'large', 'Extra milk', 0.0, now),
+        (1002, 'bob', 'Americano', 1, 'small', '', 3.5, now + 60),
+    ])
+    totals = shards.sales_totals(now, now + 60)
+    assert totals == {'revenue': 9.0, 'lines': 1, 'quantity': {'Latte': 2}}
+    assert shards.sales_totals(now, now + 61)['lines'] == 2
+
+
+# End to end with a worker process per store: the order's stock leaves its own store's shard
+def test_sharded_shop_routes_each_store_to_its_worker(tmp_path):
+    shop = core.Shop(str(tmp_path / 'coffee_shop.db'), STORE_INVENTORY_DEFAULTS, sharded=True, coupon_sweep_seconds=0)
+    try:
+        before = dict(shop.store_levels('KLCC'))
+        receipt = shop.place_order(OrderRequest('guest', [OrderLine('Latte', 'small', [], 2)], store='KLCC'))
+        after = dict(shop.store_levels('KLCC'))
+        assert after['cups'] == before['cups'] - 2
+        assert dict(shop.store_levels('KLIA 1')) == STORE_INVENTORY_DEFAULTS['KLIA 1']
+        assert shop.router.call('KLCC', shards.levels) == after
+
+        with pytest.raises(core.OutOfStock):
+            shop.place_order(OrderRequest('guest', [OrderLine('Latte', 'large', [], 10)] * 50, store='KLIA 1'))
+        assert dict(shop.store_levels('KLIA 1')) == STORE_INVENTORY_DEFAULTS['KLIA 1']
+
+        report = shop.sales_report(date.today(), date.today(), 'KLCC')
+        assert report.store_totals['KLCC']['revenue'] == pytest.approx(sum(receipt.line_prices))
+        assert report.store_totals['KLIA 1']['lines'] == 0
+    finally:
+        shop.close()
@@ -0,0 +1,65 @@
+import threading
+
+from coffeeshop.core import OrderLine, OrderRequest
+from coffeeshop.wait_times import WaitTimeEstimator, prep_seconds
+
+
+def test_prep_seconds_per_size_and_add_on():
+    assert prep_seconds('small', 0) == 120
+    assert prep_seconds('large', 2) == 5 * 60 + 60
+
+
+def test_estimate_follows_lines_in_and_out():
+    waits = WaitTimeEstimator(stations=2)
+    waits.enter(1, 120, started=1000)
+    waits.enter(2, 300, started=1000)
+    # A line already in the kitchen is not counted twice
+    waits.enter(2, 300, started=1000)
+    assert len(waits) == 2 and waits.estimate() == 210
+    assert waits.estimate(extra_seconds=60) == 270
+
+    assert waits.leave(1, finished=1090) == 90
+    assert waits.leave(1, finished=1100) is None
+    assert waits.estimate() == 150
+    waits.set_stations(0)
+    assert waits.stations == 1 and waits.estimate() == 300
+
+
+def test_percentiles_over_the_recent_window():
+    waits = WaitTimeEstimator(samples=10)
+    assert waits.percentile(0.5) is None
+    for duration in range(100, 120):
+        waits.record_duration(duration)
+    # Only the last ten durations count
+    assert waits.percentile(0) == 110
+    assert waits.percentile(0.5) == 115
+    assert waits.percentile(1) == 119
+
+
+# Tills and kitchen screens moving lines at once leave nothing outstanding
+def test_concurrent_enter_and_leave():
+    waits = WaitTimeEstimator()
+    barrier = threading.Barrier(8)
+
+    def till(i):
+        barrier.wait()
+        for row in range(i * 1000, i * 1000 + 200):
+            waits.enter(row, 120, started=0)
+        for row in range(i * 1000, i * 1000 + 200):
+            waits.leave(row, finished=60)
+
+    tills = [threading.Thread(target=till, args=(i,)) for i in range(8)]
+    for thread in tills:
+        thread.start()
+    for thread in tills:
+        thread.join()
+    assert waits.outstanding == 0 and len(waits) == 0
+    assert waits.percentile(0.5) == 60
+
+
+# Placing an order queues its lines' prep time; marking it Ready takes it off again
+def test_orders_feed_the_shop_estimate(shop):
+    receipt = shop.place_order(OrderRequest('amy', [OrderLine('Latte', 'large', ['Extra milk']), OrderLine('Latte', 'small')]))
+    assert shop.wait_times.outstanding == prep_seconds('large', 1) + prep_seconds('small', 0)
+    shop.mark_order(receipt.order_number, 'Ready')
+    assert shop.wait_times.outstanding == 0 and shop.wait_times.percentile(0.5) is not None